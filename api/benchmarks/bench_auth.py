@@ -0,0 +1,58 @@
+"""
+Per-request JWT auth overhead, with and without the verified-token cache
+
+Runs the same dependency chain an authenticated route does
+(try_get_jwt_payload: decode, validate, revocation check) against one
+token, first clearing the cache before every call and then letting it
+warm. The revocation store is pointed at an empty in-memory table so
+only the auth work itself is measured.
+
+    cd api && python -m benchmarks.bench_auth
+"""
+
+import asyncio
+import os
+import time
+from datetime import datetime, timezone
+
+os.environ.setdefault("DATABASE_URL", "postgresql://localhost/unused")
+os.environ.setdefault("SIGNING_KEY", "benchmark-signing-key")
+
+from queries.user_queries import AccountOut  # noqa: E402
+from utils import authentication  # noqa: E402
+from utils.revocation import revocation_store  # noqa: E402
+
+ITERATIONS = 20_000
+
+
+class EmptyRevokedTokens:
+    async def get_revoked_since(self, since):
+        return [], datetime.now(timezone.utc)
+
+
+async def per_call_us(token: str, clear_cache: bool) -> float:
+    start = time.perf_counter()
+    for _ in range(ITERATIONS):
+        if clear_cache:
+            authentication.verified_tokens.clear()
+        payload = await authentication.try_get_jwt_payload(token)
+        assert payload is not None
+    return (time.perf_counter() - start) / ITERATIONS * 1_000_000
+
+
+async def main():
+    revocation_store.repo = EmptyRevokedTokens()
+    user = AccountOut(
+        id=1, username="bench", email="bench@example.com", password="x"
+    )
+    token = authentication.generate_jwt(user)
+
+    uncached = await per_call_us(token, clear_cache=True)
+    cached = await per_call_us(token, clear_cache=False)
+    print(f"uncached: {uncached:8.2f} us/request")
+    print(f"cached:   {cached:8.2f} us/request")
+    print(f"speedup:  {uncached / cached:8.1f}x")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
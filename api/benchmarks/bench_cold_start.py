@@ -0,0 +1,77 @@
+"""
+Cold start: fresh interpreter to first response
+
+Each run starts a new Python process (as a new uvicorn worker or Lambda
+container would), imports main and sends GET / through the ASGI app,
+timing the import and the first response separately. The lifespan
+isn't run, so no database is needed and pool warm-up isn't counted.
+
+    cd api && python -m benchmarks.bench_cold_start
+"""
+
+import json
+import os
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+
+RUNS = 10
+API_DIR = Path(__file__).resolve().parents[1]
+
+PROBE = """
+import asyncio, json, time
+start = time.perf_counter()
+import main
+imported = time.perf_counter()
+import httpx
+
+async def first_response():
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(
+        transport=transport, base_url="http://test"
+    ) as client:
+        return await client.get("/")
+
+response = asyncio.run(first_response())
+assert response.status_code == 200, response.status_code
+done = time.perf_counter()
+print(json.dumps({"import": imported - start, "total": done - start}))
+"""
+
+
+def run_once() -> dict:
+    env = dict(
+        os.environ,
+        DATABASE_URL=os.environ.get(
+            "DATABASE_URL", "postgresql://localhost/unused"
+        ),
+        SIGNING_KEY=os.environ.get("SIGNING_KEY", "benchmark-signing-key"),
+    )
+    result = subprocess.run(
+        [sys.executable, "-c", PROBE],
+        cwd=API_DIR,
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def main():
+    run_once()  # warm the OS file cache and __pycache__
+    runs = [run_once() for _ in range(RUNS)]
+    for key, label in [
+        ("import", "import main"),
+        ("total", "import to first response"),
+    ]:
+        times = [run[key] * 1000 for run in runs]
+        print(
+            f"{label:26} median {statistics.median(times):7.1f} ms  "
+            f"min {min(times):7.1f} ms"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""
+Import-time profile of main.py, eager vs LAZY_INIT
+
+Runs `python -X importtime -c "import main"` in fresh interpreters and
+reports the cumulative time of `import main` plus the top-level packages
+that cost the most, with and without LAZY_INIT. Run it before tagging a
+release and compare with the previous numbers to catch cold-start
+regressions; pass --save DIR to keep the raw -X importtime output.
+
+    cd api && python -m benchmarks.bench_import_time [--save DIR]
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+from collections import defaultdict
+from pathlib import Path
+
+RUNS = 7
+TOP = 12
+API_DIR = Path(__file__).resolve().parents[1]
+
+
+def profile(lazy: bool) -> str:
+    env = dict(
+        os.environ,
+        DATABASE_URL=os.environ.get(
+            "DATABASE_URL", "postgresql://localhost/unused"
+        ),
+        SIGNING_KEY=os.environ.get("SIGNING_KEY", "benchmark-signing-key"),
+        LAZY_INIT="1" if lazy else "",
+    )
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import main"],
+        cwd=API_DIR,
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return result.stderr
+
+
+def parse(output: str):
+    """
+    Yields (module, self_us, cumulative_us) for each line of -X importtime
+    """
+    for line in output.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        fields = line[len("import time:") :]  # noqa: E203
+        self_us, cumulative_us, module = fields.split("|")
+        yield module.strip(), int(self_us), int(cumulative_us)
+
+
+def main_import_ms(output: str) -> float:
+    for module, _, cumulative_us in parse(output):
+        if module == "main":
+            return cumulative_us / 1000
+    raise ValueError("import main missing from the profile")
+
+
+def top_packages(output: str):
+    totals = defaultdict(int)
+    for module, self_us, _ in parse(output):
+        totals[module.split(".")[0]] += self_us
+    return sorted(totals.items(), key=lambda item: item[1], reverse=True)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--save", type=Path, help="directory for raw output")
+    args = parser.parse_args()
+
+    profile(lazy=False)  # warm the OS file cache and __pycache__
+    for lazy in (False, True):
+        label = "LAZY_INIT" if lazy else "eager"
+        outputs = [profile(lazy) for _ in range(RUNS)]
+        times = [main_import_ms(output) for output in outputs]
+        print(
+            f"{label:10} import main median "
+            f"{statistics.median(times):7.1f} ms  min {min(times):7.1f} ms"
+        )
+        for package, self_us in top_packages(outputs[0])[:TOP]:
+            print(f"    {package:28} {self_us / 1000:7.1f} ms")
+        if args.save:
+            args.save.mkdir(parents=True, exist_ok=True)
+            (args.save / f"importtime-{label.lower()}.txt").write_text(
+                outputs[0]
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,160 @@
+"""
+Maintenance-log listing throughput by row decoding strategy
+
+Seeds one throwaway account with a vehicle and ROWS maintenance logs,
+then pages through them with the repository's list query and with the
+previous decoding path (SELECT *, positional result_to_dict, timezone
+conversion in Python, VehicleMaintenanceOut(**dict)), and with the
+repository query decoded through a validating class_row. All three run
+against the same pool so only query shape and row decoding differ.
+
+Needs a migrated, throwaway database:
+
+    cd api && DATABASE_URL=postgresql://localhost/drivestats_bench \\
+        python -m benchmarks.bench_list_decoding
+"""
+
+import asyncio
+import os
+import time
+import uuid
+from datetime import timezone
+
+from psycopg.rows import class_row
+
+from models.vehicle_maintenance import VehicleMaintenanceOut
+from queries import vehicle_maintenance
+from queries.pool import pool
+from queries.rows import model_row
+from queries.vehicle_maintenance import VehicleMaintenanceRepo
+from utils.pagination import MAX_PAGE_SIZE
+from utils.timezone import DEFAULT_TIMEZONE, get_zone
+
+ROWS = 20_000
+ROUNDS = 5
+
+
+async def seed() -> tuple:
+    name = f"bench{uuid.uuid4().hex[:12]}"
+    async with pool.connection() as conn:
+        cur = await conn.execute(
+            """
+                INSERT INTO accounts (username, password, email)
+                VALUES (%s, 'x', %s) RETURNING id
+                """,
+            [name, f"{name}@example.com"],
+        )
+        account_id = (await cur.fetchone())[0]
+        cur = await conn.execute(
+            """
+                INSERT INTO vehicles
+                  (vehicle_name, year, make, model, vin, mileage, about, user_id)
+                VALUES ('bench', 2020, 'make', 'model', 'vin', '1000', 'about', %s)
+                RETURNING id
+                """,
+            [account_id],
+        )
+        vehicle_id = (await cur.fetchone())[0]
+        await conn.execute(
+            """
+            INSERT INTO vehicle_maintenance
+              (vehicle_id, maintenance_type, mileage, cost, description, service_date)
+            SELECT %s, 'oil', n, 50, 'desc', DATE '2000-01-01' + n
+            FROM generate_series(1, %s) AS n
+            """,
+            [vehicle_id, ROWS],
+        )
+    return account_id, vehicle_id
+
+
+def legacy_row(result) -> VehicleMaintenanceOut:
+    zone = get_zone(DEFAULT_TIMEZONE)
+    return VehicleMaintenanceOut(
+        **{
+            "id": result[0],
+            "vehicle_id": result[1],
+            "maintenance_type": result[2],
+            "mileage": result[3],
+            "cost": result[4],
+            "description": result[5],
+            "service_date": result[6],
+            "created_date": result[7]
+            .replace(tzinfo=timezone.utc)
+            .astimezone(zone)
+            .date(),
+        }
+    )
+
+
+async def legacy_listing(vehicle_id: int) -> int:
+    rows, after = 0, None
+    async with pool.connection() as conn:
+        while True:
+            query = "SELECT * FROM vehicle_maintenance WHERE vehicle_id = %s"
+            params = [vehicle_id]
+            if after:
+                query += " AND (service_date, id) < (%s, %s)"
+                params += list(after)
+            query += " ORDER BY service_date DESC, id DESC LIMIT %s"
+            params.append(MAX_PAGE_SIZE)
+            cur = await conn.execute(query, params)
+            page = [legacy_row(result) for result in await cur.fetchall()]
+            rows += len(page)
+            if len(page) < MAX_PAGE_SIZE:
+                return rows
+            after = (page[-1].service_date, page[-1].id)
+
+
+async def repository_listing(vehicle_id: int) -> int:
+    repo = VehicleMaintenanceRepo()
+    rows, after = 0, None
+    while True:
+        page, after = await repo.get_all_maintenance_log_by_vehicle_id(
+            vehicle_id, MAX_PAGE_SIZE, after
+        )
+        rows += len(page)
+        if not after:
+            return rows
+
+
+async def rows_per_second(listing, vehicle_id: int) -> float:
+    await listing(vehicle_id)  # warm up
+    start = time.perf_counter()
+    rows = 0
+    for _ in range(ROUNDS):
+        rows += await listing(vehicle_id)
+    return rows / (time.perf_counter() - start)
+
+
+async def main():
+    await pool.open(wait=True)
+    account_id, vehicle_id = await seed()
+    try:
+        results = {
+            "positional dict": await rows_per_second(
+                legacy_listing, vehicle_id
+            )
+        }
+        vehicle_maintenance.model_row = class_row
+        results["class_row"] = await rows_per_second(
+            repository_listing, vehicle_id
+        )
+        vehicle_maintenance.model_row = model_row
+        results["model_row"] = await rows_per_second(
+            repository_listing, vehicle_id
+        )
+        baseline = results["positional dict"]
+        for name, rate in results.items():
+            print(f"{name:16} {rate:10,.0f} rows/s {rate / baseline:6.2f}x")
+    finally:
+        async with pool.connection() as conn:
+            await conn.execute(
+                "DELETE FROM accounts WHERE id = %s", [account_id]
+            )
+        await pool.close()
+
+
+if __name__ == "__main__":
+    if not os.environ.get("DATABASE_URL"):
+        raise SystemExit("DATABASE_URL must point at a throwaway database")
+    asyncio.run(main())
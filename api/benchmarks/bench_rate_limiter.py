@@ -0,0 +1,47 @@
+"""
+Rate limiter bookkeeping cost vs number of active clients
+
+Times hit() with N distinct keys in round-robin for slowapi's default
+(fixed window over MemoryStorage) and TokenBucketRateLimiter. Per-hit
+cost should stay flat as N grows.
+
+    cd api && python -m benchmarks.bench_rate_limiter
+"""
+
+import time
+
+from limits import parse
+from limits.storage import MemoryStorage
+from limits.strategies import FixedWindowRateLimiter
+
+from utils.token_bucket import TokenBucketRateLimiter
+
+HITS = 200_000
+LIMIT = parse("30/minute")
+
+
+def per_hit_us(strategy, clients: int) -> float:
+    keys = [f"user:{n}:free" for n in range(clients)]
+    for key in keys:
+        strategy.hit(LIMIT, key, "route")
+    start = time.perf_counter()
+    for n in range(HITS):
+        strategy.hit(LIMIT, keys[n % clients], "route")
+    return (time.perf_counter() - start) / HITS * 1e6
+
+
+def main():
+    for clients in (100, 10_000, 100_000):
+        fixed = per_hit_us(FixedWindowRateLimiter(MemoryStorage()), clients)
+        bucket = per_hit_us(
+            TokenBucketRateLimiter(MemoryStorage(), max_buckets=clients),
+            clients,
+        )
+        print(
+            f"{clients:>7} clients  fixed-window {fixed:5.2f} us/hit  "
+            f"token-bucket {bucket:5.2f} us/hit"
+        )
+
+
+if __name__ == "__main__":
+    main()
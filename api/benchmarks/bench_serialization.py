@@ -0,0 +1,87 @@
+"""
+Serialization cost of a 10k-row list response
+
+Renders the same page of VehicleMaintenanceOut rows three ways:
+
+- stdlib: what FastAPI did before, response_model validation then
+  jsonable_encoder then json.dumps (JSONResponse)
+- orjson default class: the same validation and jsonable_encoder pass,
+  rendered by FastJSONResponse (routes returning plain values)
+- direct FastJSONResponse: the list routes, models handed to orjson
+
+    cd api && python -m benchmarks.bench_serialization
+"""
+
+import time
+from datetime import date, timedelta
+from typing import List
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from pydantic import TypeAdapter
+
+from models.vehicle_maintenance import VehicleMaintenanceOut
+from utils.responses import FastJSONResponse
+
+ROWS = 10_000
+ROUNDS = 10
+
+response_model = TypeAdapter(List[VehicleMaintenanceOut])
+
+
+def stdlib(rows) -> bytes:
+    content = jsonable_encoder(response_model.validate_python(rows))
+    return JSONResponse(content).body
+
+
+def orjson_default_class(rows) -> bytes:
+    content = jsonable_encoder(response_model.validate_python(rows))
+    return FastJSONResponse(content).body
+
+
+def direct(rows) -> bytes:
+    return FastJSONResponse(rows).body
+
+
+def per_response_ms(render, rows) -> float:
+    render(rows)  # warm up
+    start = time.perf_counter()
+    for _ in range(ROUNDS):
+        render(rows)
+    return (time.perf_counter() - start) / ROUNDS * 1000
+
+
+def main():
+    rows = [
+        VehicleMaintenanceOut(
+            id=i,
+            vehicle_id=1,
+            maintenance_type="Oil change",
+            mileage=1000 + i,
+            cost=50,
+            description="Synthetic 5W-30, filter replaced",
+            service_date=date(2020, 1, 1) + timedelta(days=i % 1500),
+            created_date=date(2024, 1, 1),
+        )
+        for i in range(ROWS)
+    ]
+    assert direct(rows) == orjson_default_class(rows)
+
+    results = {
+        name: per_response_ms(render, rows)
+        for name, render in [
+            ("stdlib", stdlib),
+            ("orjson default class", orjson_default_class),
+            ("direct FastJSONResponse", direct),
+        ]
+    }
+    baseline = results["stdlib"]
+    for name, elapsed in results.items():
+        print(
+            f"{name:24} {elapsed:8.1f} ms/response "
+            f"{baseline / elapsed:6.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
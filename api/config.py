@@ -10,3 +10,13 @@ API_HOST = os.getenv("VITE_API_HOST", "").strip().lower().rstrip("/")
 
 # Define oauth2_scheme
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/auth/token")
+
+# Set by the Lambda runtime. Mangum runs the app there without the
+# lifespan (see main.py), so nothing is opened up front
+ON_LAMBDA = bool(os.getenv("AWS_LAMBDA_FUNCTION_NAME"))
+
+# Defer router imports and the database pool to the first request that
+# needs them, for Lambda cold starts (see utils/lazy_routers.py and
+# queries/pool.py). On by default on Lambda, LAZY_INIT=0 turns it off
+_lazy_init = os.getenv("LAZY_INIT", "1" if ON_LAMBDA else "")
+LAZY_INIT = _lazy_init.strip().lower() in ("1", "true", "yes")
@@ -1,19 +1,26 @@
 from fastapi import FastAPI, Request, HTTPException, Depends, Security
 from fastapi.security.api_key import APIKeyHeader
-from slowapi import Limiter, _rate_limit_exceeded_handler
-from slowapi.util import get_remote_address
+from slowapi import _rate_limit_exceeded_handler
 from slowapi.errors import RateLimitExceeded
 from fastapi.middleware.cors import CORSMiddleware
 from dotenv import load_dotenv
 from fastapi.openapi.docs import get_swagger_ui_html, get_redoc_html
-from pydantic_settings import BaseSettings
 import os
 from mangum import Mangum
+from contextlib import asynccontextmanager
+import asyncio
+import importlib
 import logging
-import subprocess
-
-# Set up logging
-logging.basicConfig(level=logging.INFO)
+from config import LAZY_INIT
+from utils.compression import CompressionMiddleware
+from utils.lazy_routers import LazyRouterMiddleware
+from utils.log import RequestIDMiddleware, configure_logging
+from utils.metrics import MetricsMiddleware, rate_limit_rejections, route_label
+from utils.rate_limiting import limiter
+from utils.responses import FastJSONResponse
+
+# Records are written to stdout by a background thread, see utils/log.py
+configure_logging()
 logger = logging.getLogger(__name__)
 
 # Try to load environment variables from different files
@@ -26,15 +33,75 @@ elif os.path.exists("api/.env"):
     load_dotenv("api/.env")
 
 
-class Settings(BaseSettings):
-    openapi_url: str = ""
-
-
-settings = Settings()
-
-app = FastAPI(docs_url=None, redoc_url=None, openapi_url="/openapi.json")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # The shared pool is opened once per worker and drained on shutdown
+    # so connections aren't leaked on restarts. Lambda never runs this
+    # (see handler below): its pool opens on first use, and the
+    # background tasks would only run while an invocation is in flight
+    from queries.invalidation import cache_invalidation
+    from queries.pool import open_pool, close_pool
+    from queries.schema import verify_schema
+    from utils.password_hashing import password_hashing_pool
+    from utils.rate_limiting import rate_limit_storage
+    from utils.revocation import revocation_store
+
+    if not LAZY_INIT:
+        await open_pool()
+        # Migrations run before deploy (see queries/schema.py), this is
+        # one cheap read to catch a worker started against an old schema.
+        # Lazy containers skip it rather than connect before they must,
+        # run `python -m queries.schema verify` in the deploy instead
+        await verify_schema()
+    background_tasks = [
+        asyncio.create_task(revocation_store.purge_periodically())
+    ]
+    if cache_invalidation.has_subscribers:
+        background_tasks.append(asyncio.create_task(cache_invalidation.run()))
+    # Only the database:// storage batches its counters to Postgres
+    syncs_rate_limits = hasattr(rate_limit_storage, "sync_periodically")
+    if syncs_rate_limits:
+        background_tasks.append(
+            asyncio.create_task(rate_limit_storage.sync_periodically())
+        )
+    yield
+    for task in background_tasks:
+        task.cancel()
+    if syncs_rate_limits:
+        # Hand the last batch of hits to the other workers
+        try:
+            await rate_limit_storage.sync()
+        except Exception as e:
+            logger.error(f"Final rate limit sync failed: {e}")
+    await close_pool()
+    password_hashing_pool.shutdown()
+
+
+app = FastAPI(
+    docs_url=None,
+    redoc_url=None,
+    openapi_url="/openapi.json",
+    lifespan=lifespan,
+    default_response_class=FastJSONResponse,
+)
 # app = FastAPI()
-handler = Mangum(app)
+# Mangum would run the whole lifespan around every invocation, closing
+# the pool and the bcrypt executor each time. Without it the pool opens
+# on the first checkout and lives as long as the container
+handler = Mangum(app, lifespan="off")
+
+# Every router with the path prefixes its routes live under. In LAZY_INIT
+# mode a router is only imported once a request matches one of them
+ROUTERS = {
+    "routers.vehicles": ("/vehicles",),
+    "routers.accounts": ("/users/", "/check/", "/account/", "/logout"),
+    "routers.auth": ("/api/auth/",),
+    "routers.bug_reports": ("/bug_report",),
+    "routers.newsletter": ("/api/subscribe-email",),
+    "routers.vehicle_maintenance": ("/api/vehicle-maintenance/",),
+    "routers.vehicle_stats": ("/vehicle_stats/",),
+    "routers.metrics": ("/metrics",),
+}
 
 # Set allowed origins
 origins = [
@@ -47,17 +114,30 @@ origins = [
     "http://localhost:8000",
 ]
 
+if LAZY_INIT:
+    app.add_middleware(LazyRouterMiddleware, routers=ROUTERS)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=origins,
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "Link", "ETag", "X-Request-ID"],
 )
+# Wraps everything but the metrics, so it sees the final body
+app.add_middleware(CompressionMiddleware)
+# Outside the others, so request latency includes all of them
+app.add_middleware(MetricsMiddleware)
+# Around everything, so every log line of the request carries its ID
+app.add_middleware(RequestIDMiddleware)
 
-limiter = Limiter(key_func=get_remote_address)
 app.state.limiter = limiter
-app.add_exception_handler(RateLimitExceeded, _rate_limit_exceeded_handler)
+
+
+@app.exception_handler(RateLimitExceeded)
+async def rate_limit_exceeded(request: Request, exc: RateLimitExceeded):
+    rate_limit_rejections.inc(request.method, route_label(request.scope))
+    return _rate_limit_exceeded_handler(request, exc)
 
 
 @app.get("/")
@@ -90,58 +170,6 @@ async def get_redoc_documentation(request: Request):
 
 
 # Include your routers here
-from routers import (
-    vehicles,
-    accounts,
-    auth,
-    bug_reports,
-    newsletter,
-    vehicle_maintenance,
-)
-
-app.include_router(vehicles.router)
-app.include_router(accounts.router)
-app.include_router(auth.router)
-app.include_router(bug_reports.router)
-app.include_router(newsletter.router)
-app.include_router(vehicle_maintenance.router)
-
-# After loading environment variables
-db_url = os.getenv("DATABASE_URL")
-logger.info(f"Database URL: {db_url}")
-
-# Run Flyway migrations
-try:
-    logger.info("Running database migrations...")
-    # Log the current directory for debugging
-    current_dir = os.path.dirname(os.path.abspath(__file__))
-    logger.info(f"Current directory: {current_dir}")
-
-    # Check if migrations directory exists
-    migrations_dir = os.path.join(current_dir, "migrations")
-    if os.path.exists(migrations_dir):
-        logger.info(f"Migrations directory found: {migrations_dir}")
-        # List migration files
-        migration_files = os.listdir(migrations_dir)
-        logger.info(f"Migration files: {migration_files}")
-    else:
-        logger.error(f"Migrations directory not found: {migrations_dir}")
-
-    # Run Flyway
-    result = subprocess.run(
-        ["flyway", "migrate", "-configFiles=flyway.conf"],
-        cwd=current_dir,
-        capture_output=True,
-        text=True,
-    )
-
-    # Log detailed output
-    logger.info(f"Flyway exit code: {result.returncode}")
-    logger.info(f"Flyway stdout: {result.stdout}")
-
-    if result.returncode == 0:
-        logger.info("Migrations completed successfully")
-    else:
-        logger.error(f"Migration failed: {result.stderr}")
-except Exception as e:
-    logger.error(f"Error running migrations: {str(e)}")
+if not LAZY_INIT:
+    for module_name in ROUTERS:
+        app.include_router(importlib.import_module(module_name).router)
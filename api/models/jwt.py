@@ -3,6 +3,9 @@ Pydantic Models for the JWT Payload
 """
 
 from pydantic import BaseModel
+from typing import Optional
+from utils.plans import DEFAULT_PLAN
+from utils.timezone import DEFAULT_TIMEZONE
 
 
 class JWTUserData(BaseModel):
@@ -15,6 +18,10 @@ class JWTUserData(BaseModel):
     id: int
     username: str
     email: str
+    # Tokens issued before per-user timezones fall back to the default
+    timezone: str = DEFAULT_TIMEZONE
+    # Rate limit tier, tokens issued before plans are on the free plan
+    plan: str = DEFAULT_PLAN
 
 
 # This represents the payload stored inside the JWT
@@ -26,3 +33,6 @@ class JWTPayload(BaseModel):
     user: JWTUserData
     sub: str
     exp: int
+    # Unique token id used for revocation, tokens issued before it was
+    # added don't carry one
+    jti: Optional[str] = None
@@ -1,7 +1,6 @@
 from pydantic import BaseModel
-from typing import Union
+from typing import List, Union
 from datetime import date
-import pytz
 
 
 class Error(BaseModel):
@@ -27,3 +26,13 @@ class VehicleMaintenanceOut(BaseModel):
     description: str
     service_date: date
     created_date: date
+
+
+class MaintenanceImportRowError(BaseModel):
+    row: int
+    error: str
+
+
+class MaintenanceImportResult(BaseModel):
+    imported: int
+    errors: List[MaintenanceImportRowError]
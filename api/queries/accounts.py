@@ -1,10 +1,15 @@
+import logging
 from pydantic import BaseModel, ValidationError
+from psycopg.rows import class_row
 from queries.pool import pool
+from queries.tracing import traced_repository
+from utils.plans import DEFAULT_PLAN
+from utils.timezone import DEFAULT_TIMEZONE
 from fastapi import HTTPException
 from typing import Optional
-from passlib.context import CryptContext
+from utils.authentication import hash_password, verify_password
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+logger = logging.getLogger(__name__)
 
 
 class AccountIn(BaseModel):
@@ -18,6 +23,8 @@ class AccountOut(BaseModel):
     username: str
     password: str
     email: str
+    timezone: str = DEFAULT_TIMEZONE
+    plan: str = DEFAULT_PLAN
 
 
 class CheckAccountOut(BaseModel):
@@ -48,34 +55,32 @@ class UpdatePasswordIn(BaseModel):
     new_password: str
 
 
+class UpdateTimezoneIn(BaseModel):
+    timezone: str
+
+
+ACCOUNT_COLUMNS = "id, username, password, email, timezone, plan"
+
+
+@traced_repository
 class AccountRepo:
-    def result_to_dict(self, result):
-        if result:
-            return {
-                "id": result[0],
-                "username": result[1],
-                "password": result[2],
-                "email": result[3],
-            }
-        else:
-            return None
-
-    def create_user(
+    async def create_user(
         self, account: AccountIn, hashed_password: str
     ) -> AccountOut:
         try:
-            with pool.connection() as conn:
-                with conn.cursor() as cur:
+            async with pool.connection() as conn:
+                async with conn.cursor(
+                    row_factory=class_row(AccountOut)
+                ) as cur:
                     lowercase_username = account.username.lower()
                     lowercase_email = account.email.lower()
-                    cur.execute(
-                        """
+                    await cur.execute(
+                        f"""
                         INSERT INTO accounts
                         (username, password, email)
                         VALUES
                         (%s, %s, %s)
-                        RETURNING
-                        id, username, password, email
+                        RETURNING {ACCOUNT_COLUMNS}
                         """,
                         [
                             lowercase_username,
@@ -83,94 +88,83 @@ class AccountRepo:
                             lowercase_email,
                         ],
                     )
-                    result = cur.fetchone()
+                    result = await cur.fetchone()
                     if result:
-                        result_dict = self.result_to_dict(result)
-                        return AccountOut(**result_dict)
+                        return result
                     else:
                         raise HTTPException(
                             status_code=500, detail="Failed to create account."
                         )
         except ValidationError as e:
-            print(f"Validation error: {e}")
-            print(f"Payload causing the error: {account}")
+            logger.warning(f"Invalid account for {account.username}: {e}")
             raise HTTPException(
                 status_code=422, detail=f"Validation error: {e}"
             )  # HTTP 422 Unprocessable Entity
         except Exception as ex:
-            print(f"Error creating account: {ex}")
+            logger.error(f"Error creating account: {ex}")
             raise HTTPException(
                 status_code=500, detail="Failed to create account."
             )
 
-    def get_single_user(self, username: str) -> Optional[AccountOut]:
-        with pool.connection() as conn:
-            with conn.cursor() as cur:
-                cur.execute(
-                    """
-                    SELECT *
+    async def get_single_user(self, username: str) -> Optional[AccountOut]:
+        async with pool.connection() as conn:
+            async with conn.cursor(row_factory=class_row(AccountOut)) as cur:
+                await cur.execute(
+                    f"""
+                    SELECT {ACCOUNT_COLUMNS}
                     FROM accounts
                     WHERE username = %s
                     """,
                     [username],
                 )
-                record = cur.fetchone()
-                if record:
-                    return AccountOut(
-                        id=record[0],
-                        username=record[1],
-                        password=record[2],
-                        email=record[3],
-                    )
-                else:
-                    return None
-
-    def check_single_user(self, username: str) -> Optional[CheckAccountOut]:
-        with pool.connection() as conn:
-            with conn.cursor() as cur:
-                cur.execute(
+                return await cur.fetchone()
+
+    async def check_single_user(
+        self, username: str
+    ) -> Optional[CheckAccountOut]:
+        async with pool.connection() as conn:
+            async with conn.cursor(
+                row_factory=class_row(CheckAccountOut)
+            ) as cur:
+                await cur.execute(
                     """
-                    SELECT *
+                    SELECT username, email
                     FROM accounts
                     WHERE username = %s
                     """,
                     [username],
                 )
-                record = cur.fetchone()
-                if record:
-                    return CheckAccountOut(
-                        username=record[1],
-                        email=record[3],
-                    )
-                else:
-                    return None
+                return await cur.fetchone()
 
-    def check_user_email(self, email: str) -> Optional[CheckEmail]:
-        with pool.connection() as conn:
-            with conn.cursor() as cur:
-                cur.execute(
+    async def check_user_email(self, email: str) -> Optional[CheckEmail]:
+        async with pool.connection() as conn:
+            async with conn.cursor(row_factory=class_row(CheckEmail)) as cur:
+                await cur.execute(
                     """
-                    SELECT *
+                    SELECT email
                     FROM accounts
                     WHERE email = %s
                     """,
                     [email],
                 )
-                record = cur.fetchone()
-                if record:
-                    return CheckEmail(
-                        email=record[3],
-                    )
-                else:
-                    return None
+                return await cur.fetchone()
 
-    def update_user_password(
+    async def update_user_password(
         self, username: str, current_password: str, new_password: str
     ) -> Optional[AccountOut]:
+        """
+        Changes a user's password after checking the current one
+
+        bcrypt runs on the password hashing pool between two short
+        queries, so no pooled connection is held while it works. The
+        UPDATE only applies if the stored hash is still the one we
+        verified against, which stops two concurrent changes from both
+        succeeding.
+        """
         try:
-            with pool.connection() as conn:
-                with conn.cursor() as cur:
-                    cur.execute(
+            async with pool.connection() as conn:
+                async with conn.cursor() as cur:
+                    await cur.execute(
                         """
                         SELECT id, password
                         FROM accounts
@@ -178,49 +172,66 @@ class AccountRepo:
                         """,
                         [username],
                     )
-                    result = cur.fetchone()
-                    if result:
-                        user_id, current_hashed_password = result
-                        if not pwd_context.verify(
-                            current_password, current_hashed_password
-                        ):
-                            raise HTTPException(
-                                status_code=403, detail="Invalid old password."
-                            )
-                        new_hashed_password = pwd_context.hash(new_password)
-                        cur.execute(
-                            """
-                            UPDATE accounts
-                            SET password = %s
-                            WHERE id = %s
-                            RETURNING id, username, password, email
-                            """,
-                            [new_hashed_password, user_id],
-                        )
-                        updated_record = cur.fetchone()
-                        if updated_record:
-                            return AccountOut(
-                                id=updated_record[0],
-                                username=updated_record[1],
-                                password=updated_record[2],
-                                email=updated_record[3],
-                            )
-                        else:
-                            raise HTTPException(
-                                status_code=500,
-                                detail="Failed to update password.",
-                            )
-                    else:
-                        raise HTTPException(
-                            status_code=404, detail="User not found."
-                        )
+                    result = await cur.fetchone()
+            if not result:
+                raise HTTPException(status_code=404, detail="User not found.")
+            user_id, current_hashed_password = result
+            if not await verify_password(
+                current_password, current_hashed_password
+            ):
+                raise HTTPException(
+                    status_code=403, detail="Invalid old password."
+                )
+            new_hashed_password = await hash_password(new_password)
+            async with pool.connection() as conn:
+                async with conn.cursor(
+                    row_factory=class_row(AccountOut)
+                ) as cur:
+                    await cur.execute(
+                        f"""
+                        UPDATE accounts
+                        SET password = %s
+                        WHERE id = %s AND password = %s
+                        RETURNING {ACCOUNT_COLUMNS}
+                        """,
+                        [
+                            new_hashed_password,
+                            user_id,
+                            current_hashed_password,
+                        ],
+                    )
+                    updated_record = await cur.fetchone()
+            if not updated_record:
+                raise HTTPException(
+                    status_code=409,
+                    detail="Password was changed by another request.",
+                )
+            return updated_record
+        except HTTPException:
+            raise
         except ValidationError as e:
-            print(f"Validation error: {e}")
+            logger.warning(f"Invalid password update: {e}")
             raise HTTPException(
                 status_code=422, detail=f"Validation error: {e}"
             )
         except Exception as e:
-            print(f"Error updating password: {e}")
+            logger.error(f"Error updating password: {e}")
             raise HTTPException(
                 status_code=500, detail="Failed to update password"
             )
+
+    async def update_user_timezone(
+        self, user_id: int, timezone: str
+    ) -> Optional[AccountOut]:
+        async with pool.connection() as conn:
+            async with conn.cursor(row_factory=class_row(AccountOut)) as cur:
+                await cur.execute(
+                    f"""
+                    UPDATE accounts
+                    SET timezone = %s
+                    WHERE id = %s
+                    RETURNING {ACCOUNT_COLUMNS}
+                    """,
+                    [timezone, user_id],
+                )
+                return await cur.fetchone()
@@ -1,47 +1,38 @@
+import logging
 from models.bug_reports import BugReportIn, BugReportOut, Error
-import pytz
+from queries.rows import model_row
+from utils.timezone import current_timezone, local_date_column
 from typing import Optional, Union
 from queries.pool import pool
+from queries.tracing import traced_repository
 from pydantic import ValidationError
 
+logger = logging.getLogger(__name__)
 
-class BugQueries:
-    def result_to_dict(self, result):
-        if result:
-            utc_time = result[5]
-            local_date = self.convert_to_pst_date(utc_time)
-            return {
-                "id": result[0],
-                "bug_title": result[1],
-                "bug_desc": result[2],
-                "bug_behavior": result[3],
-                "bug_rating": result[4],
-                "created_date": local_date,
-                "user_id": result[6],
-            }
-        else:
-            return None
 
-    def convert_to_pst_date(self, utc_time):
-        utc = pytz.utc
-        pst = pytz.timezone("America/Los_Angeles")
-        utc_dt = utc.localize(utc_time)
-        pst_dt = utc_dt.astimezone(pst)
-        return pst_dt.date()
+BUG_REPORT_COLUMNS = f"""
+    id, bug_title, bug_desc, bug_behavior, bug_rating, user_id,
+    {local_date_column("created_date")}
+"""
+
 
-    def create_bug_report(
+@traced_repository
+class BugQueries:
+    async def create_bug_report(
         self, bug_report_data: dict
     ) -> Optional[BugReportOut]:
         try:
-            with pool.connection() as conn:
-                with conn.cursor() as cur:
-                    cur.execute(
-                        """
+            async with pool.connection() as conn:
+                async with conn.cursor(
+                    row_factory=model_row(BugReportOut)
+                ) as cur:
+                    await cur.execute(
+                        f"""
                         INSERT INTO bug_report
                           (bug_title, bug_desc, bug_behavior, bug_rating, user_id)
                         VALUES
                           (%s, %s, %s, %s, %s)
-                        RETURNING id, bug_title, bug_desc, bug_behavior, bug_rating, created_date, user_id;
+                        RETURNING {BUG_REPORT_COLUMNS};
                         """,
                         [
                             bug_report_data["bug_title"],
@@ -49,13 +40,13 @@ class BugQueries:
                             bug_report_data["bug_behavior"],
                             bug_report_data["bug_rating"],
                             bug_report_data["user_id"],
+                            current_timezone(),
                         ],
                     )
-                    result = cur.fetchone()
+                    result = await cur.fetchone()
                     if result:
-                        result_dict = self.result_to_dict(result)
-                        return BugReportOut(**result_dict)
+                        return result
                     else:
                         return None
         except ValidationError as e:
-            print(f"Failed to create bug report due to: {e}")
+            logger.warning(f"Failed to create bug report due to: {e}")
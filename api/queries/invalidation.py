@@ -0,0 +1,107 @@
+"""
+Cross-worker cache invalidation over Postgres LISTEN/NOTIFY
+
+Triggers from V13__notify_cache_invalidation.sql send the keys a
+committed write touched on the cache_invalidation channel. Each worker
+runs CacheInvalidationListener.run() as a lifespan task on a dedicated
+connection (LISTEN needs one held open, so it's not taken from the
+pool) and hands every notification to the handlers subscribed to its
+table.
+
+Handlers get the list of keys, or None when they should drop everything
+they cache for the table. The trigger sends None when the key list was
+too big for one notification. The listener sends it itself whenever it
+(re)connects, since notifications sent while it wasn't listening are
+lost.
+
+Only caches private to the worker subscribe, a shared backend is
+already coherent. With no subscribers the lifespan doesn't start the
+listener at all.
+"""
+
+import asyncio
+import json
+import logging
+from collections import defaultdict
+from typing import Awaitable, Callable, Dict, List, Optional
+
+import psycopg
+
+from queries.pool import DATABASE_URL
+
+logger = logging.getLogger(__name__)
+
+CHANNEL = "cache_invalidation"
+RECONNECT_DELAY = 1.0
+MAX_RECONNECT_DELAY = 30.0
+
+Handler = Callable[[Optional[List]], Awaitable[None]]
+
+
+class CacheInvalidationListener:
+    def __init__(self, conninfo: str):
+        self.conninfo = conninfo
+        self._handlers: Dict[str, List[Handler]] = defaultdict(list)
+        self.received = 0
+
+    def subscribe(self, table: str, handler: Handler):
+        self._handlers[table].append(handler)
+
+    async def dispatch(self, payload: str):
+        try:
+            message = json.loads(payload)
+            table, keys = message["table"], message["keys"]
+        except (ValueError, KeyError, TypeError):
+            logger.warning(f"Ignoring malformed invalidation: {payload!r}")
+            return
+        self.received += 1
+        await self._call(table, keys)
+
+    async def _call(self, table: str, keys: Optional[List]):
+        for handler in self._handlers.get(table, []):
+            try:
+                await handler(keys)
+            except Exception as e:
+                logger.error(f"Invalidation handler for {table} failed: {e}")
+
+    async def _evict_everything(self):
+        for table in list(self._handlers):
+            await self._call(table, None)
+
+    @property
+    def has_subscribers(self) -> bool:
+        return bool(self._handlers)
+
+    async def run(self):
+        """
+        Background task started by the app lifespan, reconnects with
+        backoff until cancelled
+        """
+        delay = RECONNECT_DELAY
+        while True:
+            try:
+                async with await psycopg.AsyncConnection.connect(
+                    self.conninfo, autocommit=True
+                ) as conn:
+                    await conn.execute(f"LISTEN {CHANNEL}")
+                    # Anything cached before LISTEN took effect may have
+                    # missed a notification
+                    await self._evict_everything()
+                    delay = RECONNECT_DELAY
+                    logger.info(f"Listening for {CHANNEL} notifications")
+                    async for notify in conn.notifies():
+                        await self.dispatch(notify.payload)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(
+                    f"Invalidation listener lost its connection: {e}, "
+                    f"retrying in {delay:.0f}s"
+                )
+            # Until we're listening again caches fall back on their TTL
+            await self._evict_everything()
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, MAX_RECONNECT_DELAY)
+
+
+cache_invalidation = CacheInvalidationListener(DATABASE_URL)
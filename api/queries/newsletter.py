@@ -1,17 +1,19 @@
 from models.newsletter import NewsletterEmailIn, NewsletterEmailOut
 from typing import Optional
 from queries.pool import pool
+from queries.tracing import traced_repository
 import logging
 
 
+@traced_repository
 class NewsLetterEmails:
-    def store_subscriber_email(
+    async def store_subscriber_email(
         self, newsletter_email: NewsletterEmailIn
     ) -> Optional[NewsletterEmailOut]:
         try:
-            with pool.connection() as conn:
-                with conn.cursor() as cur:
-                    cur.execute(
+            async with pool.connection() as conn:
+                async with conn.cursor() as cur:
+                    await cur.execute(
                         """
                         INSERT INTO newsletter_subscribers (subscriber_email)
                         VALUES (%s)
@@ -19,7 +21,7 @@ class NewsLetterEmails:
                         """,
                         [newsletter_email.subscriber_email],
                     )
-                    result = cur.fetchone()
+                    result = await cur.fetchone()
                     if result:
                         return NewsletterEmailOut(
                             id=result[0], subscriber_email=result[1]
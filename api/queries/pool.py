@@ -1,5 +1,132 @@
-from psycopg_pool import ConnectionPool
+"""
+Shared Postgres connection pool
+
+Every repository in queries/ checks connections out of this one async
+pool, so a DB round trip yields the event loop instead of blocking it.
+It is created closed at import time and opened/drained by the FastAPI
+lifespan in main.py, so importing a queries module never touches the
+database.
+
+With LAZY_INIT the lifespan leaves it closed and the first checkout
+opens it, so a cold start that never queries doesn't connect at all.
+On Lambda no lifespan runs, so the first checkout always opens it and
+it stays open for the life of the container.
+"""
+
+import asyncio
+import logging
 import os
+import time
+from typing import Optional
+
+from psycopg import AsyncConnection
+from psycopg_pool import AsyncConnectionPool
+
+from config import LAZY_INIT, ON_LAMBDA
+from queries.tracing import TracingCursor, record_pool_wait
+from utils.metrics import pool_checkout
+
+logger = logging.getLogger(__name__)
+
+DATABASE_URL = os.environ.get("DATABASE_URL")
+if not DATABASE_URL:
+    raise ValueError("DATABASE_URL environment variable is not set")
+
+# Pool sizing is per worker, so max size x workers must stay below the
+# Postgres max_connections budget for the whole deployment.
+POOL_MIN_SIZE = int(os.environ.get("DB_POOL_MIN_SIZE", 1))
+POOL_MAX_SIZE = int(os.environ.get("DB_POOL_MAX_SIZE", 10))
+POOL_TIMEOUT = float(os.environ.get("DB_POOL_TIMEOUT", 30))
+POOL_MAX_LIFETIME = float(os.environ.get("DB_POOL_MAX_LIFETIME", 600))
+POOL_MAX_IDLE = float(os.environ.get("DB_POOL_MAX_IDLE", 300))
+POOL_WARMUP_TIMEOUT = float(os.environ.get("DB_POOL_WARMUP_TIMEOUT", 10))
+
+
+class LazyConnectionPool(AsyncConnectionPool):
+    """
+    Opens itself on the first checkout when created with lazy=True, and
+    records how long every checkout waited in db_pool_checkout_seconds
+    and the current query trace
+
+    Once closed it stays closed, a late checkout fails instead of
+    reconnecting. Only the lifespan's shutdown closes it, which never
+    runs on Lambda (see main.py), so a warm container keeps its pool
+    between invocations.
+    """
+
+    def __init__(self, *args, lazy: bool = False, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._open_on_checkout = lazy
+        self._open_lock: Optional[asyncio.Lock] = None
+
+    async def _open_lazily(self):
+        if self._open_lock is None:
+            self._open_lock = asyncio.Lock()
+        async with self._open_lock:
+            if self._open_on_checkout:
+                await self.open(wait=False)
+                self._open_on_checkout = False
+                logger.info("Database pool opened on first use")
+
+    async def getconn(
+        self, timeout: Optional[float] = None
+    ) -> AsyncConnection:
+        # connection() checks out through here too
+        if self._open_on_checkout:
+            await self._open_lazily()
+        start = time.perf_counter()
+        try:
+            return await super().getconn(timeout=timeout)
+        finally:
+            waited = time.perf_counter() - start
+            pool_checkout.observe(waited)
+            record_pool_wait(waited)
+
+    async def close(self, timeout: float = 5.0):
+        self._open_on_checkout = False
+        await super().close(timeout=timeout)
+
+
+pool = LazyConnectionPool(
+    DATABASE_URL,
+    min_size=POOL_MIN_SIZE,
+    max_size=POOL_MAX_SIZE,
+    timeout=POOL_TIMEOUT,
+    max_lifetime=POOL_MAX_LIFETIME,
+    max_idle=POOL_MAX_IDLE,
+    num_workers=2,
+    # Runs a cheap round trip on checkout so connections dropped by the
+    # server or a load balancer are replaced instead of handed to a route
+    check=AsyncConnectionPool.check_connection,
+    # Times every statement for queries/tracing.py
+    kwargs={"cursor_factory": TracingCursor},
+    open=False,
+    lazy=LAZY_INIT or ON_LAMBDA,
+)
+
+
+async def open_pool():
+    """
+    Opens the pool and waits until min_size connections are ready
+
+    A failed warm-up is logged rather than raised so the app can still
+    start and serve non-database routes while Postgres comes up.
+    """
+    await pool.open(wait=False)
+    try:
+        await pool.wait(timeout=POOL_WARMUP_TIMEOUT)
+        logger.info(
+            "Database pool ready (min_size=%s, max_size=%s)",
+            POOL_MIN_SIZE,
+            POOL_MAX_SIZE,
+        )
+    except Exception as e:
+        logger.error(f"Database pool warm-up failed: {e}")
 
 
-pool = ConnectionPool(conninfo=os.environ["DATABASE_URL"])
+async def close_pool():
+    """
+    Drains the pool, closing every connection it holds
+    """
+    await pool.close()
+    logger.info("Database pool closed")
@@ -0,0 +1,98 @@
+from typing import List, Sequence, Tuple
+from queries.pool import pool
+from queries.tracing import traced_repository
+
+# (key, count, expires_at as a unix timestamp)
+CounterRow = Tuple[str, int, float]
+
+
+@traced_repository
+class RateLimitCounterRepo:
+    """
+    Postgres side of the shared rate limit storage, see
+    utils/rate_limit_storage.py
+    """
+
+    async def add_hits(
+        self,
+        keys: Sequence[str],
+        amounts: Sequence[int],
+        expiries: Sequence[float],
+    ) -> List[CounterRow]:
+        """
+        Adds a batch of hits in one atomic upsert and returns each key's
+        new total
+
+        A key whose window has ended starts a new one, `expiries` is the
+        window length in seconds. Keys must be sorted so concurrent
+        batches lock rows in the same order.
+        """
+        async with pool.connection() as conn:
+            async with conn.cursor() as cur:
+                await cur.execute(
+                    """
+                    INSERT INTO rate_limit_counters (key, count, expires_at)
+                    SELECT key, amount, now() + make_interval(secs => expiry)
+                    FROM unnest(%s::text[], %s::int[], %s::float8[])
+                        AS hits(key, amount, expiry)
+                    ON CONFLICT (key) DO UPDATE SET
+                        count = CASE
+                            WHEN rate_limit_counters.expires_at <= now()
+                            THEN excluded.count
+                            ELSE rate_limit_counters.count + excluded.count
+                        END,
+                        expires_at = CASE
+                            WHEN rate_limit_counters.expires_at <= now()
+                            THEN excluded.expires_at
+                            ELSE rate_limit_counters.expires_at
+                        END
+                    RETURNING key, count, extract(epoch FROM expires_at)
+                    """,
+                    [list(keys), list(amounts), list(expiries)],
+                )
+                return [
+                    (key, count, float(expires_at))
+                    for key, count, expires_at in await cur.fetchall()
+                ]
+
+    async def get_counts(self, keys: Sequence[str]) -> List[CounterRow]:
+        """
+        Returns the current totals of the keys whose window is still open
+        """
+        async with pool.connection() as conn:
+            async with conn.cursor() as cur:
+                await cur.execute(
+                    """
+                    SELECT key, count, extract(epoch FROM expires_at)
+                    FROM rate_limit_counters
+                    WHERE key = ANY(%s) AND expires_at > now()
+                    """,
+                    [list(keys)],
+                )
+                return [
+                    (key, count, float(expires_at))
+                    for key, count, expires_at in await cur.fetchall()
+                ]
+
+    async def delete(self, keys: Sequence[str]) -> int:
+        async with pool.connection() as conn:
+            async with conn.cursor() as cur:
+                await cur.execute(
+                    "DELETE FROM rate_limit_counters WHERE key = ANY(%s)",
+                    [list(keys)],
+                )
+                return cur.rowcount
+
+    async def delete_all(self) -> int:
+        async with pool.connection() as conn:
+            async with conn.cursor() as cur:
+                await cur.execute("DELETE FROM rate_limit_counters")
+                return cur.rowcount
+
+    async def purge_expired(self) -> int:
+        async with pool.connection() as conn:
+            async with conn.cursor() as cur:
+                await cur.execute(
+                    "DELETE FROM rate_limit_counters WHERE expires_at <= now()"
+                )
+                return cur.rowcount
@@ -0,0 +1,76 @@
+from datetime import datetime
+from typing import List, Optional, Tuple
+from queries.pool import pool
+from queries.tracing import traced_repository
+
+
+@traced_repository
+class RevokedTokenRepo:
+    """
+    Postgres side of the token revocation store, see utils/revocation.py
+    """
+
+    async def revoke(self, jti: str, expires_at: datetime) -> bool:
+        """
+        Records a revoked token, returns False if it was already revoked
+        """
+        async with pool.connection() as conn:
+            async with conn.cursor() as cur:
+                await cur.execute(
+                    """
+                    INSERT INTO revoked_tokens (jti, expires_at)
+                    VALUES (%s, %s)
+                    ON CONFLICT (jti) DO NOTHING
+                    RETURNING jti
+                    """,
+                    [jti, expires_at],
+                )
+                return await cur.fetchone() is not None
+
+    async def is_revoked(self, jti: str) -> Optional[datetime]:
+        """
+        Returns the token's expiry if it is revoked and not yet expired
+        """
+        async with pool.connection() as conn:
+            async with conn.cursor() as cur:
+                await cur.execute(
+                    """
+                    SELECT expires_at FROM revoked_tokens
+                    WHERE jti = %s AND expires_at > now()
+                    """,
+                    [jti],
+                )
+                result = await cur.fetchone()
+                return result[0] if result else None
+
+    async def get_revoked_since(
+        self, since: Optional[datetime]
+    ) -> Tuple[List[str], datetime]:
+        """
+        Returns the unexpired jtis revoked after `since` (all of them when
+        since is None) and the database time to pass as the next `since`
+        """
+        query = """
+            SELECT jti, now() FROM revoked_tokens
+            WHERE expires_at > now()
+        """
+        params = []
+        if since is not None:
+            query += " AND revoked_at > %s"
+            params.append(since)
+        async with pool.connection() as conn:
+            async with conn.cursor() as cur:
+                await cur.execute(query, params)
+                results = await cur.fetchall()
+                if results:
+                    return [row[0] for row in results], results[0][1]
+                await cur.execute("SELECT now()")
+                return [], (await cur.fetchone())[0]
+
+    async def purge_expired(self) -> int:
+        async with pool.connection() as conn:
+            async with conn.cursor() as cur:
+                await cur.execute(
+                    "DELETE FROM revoked_tokens WHERE expires_at <= now()"
+                )
+                return cur.rowcount
@@ -0,0 +1,50 @@
+"""
+Row factory for decoding trusted rows straight into response models
+
+class_row builds each model with cls(**row), which runs full Pydantic
+validation on values Postgres has already typed for us. model_row fills
+the instance __dict__ directly instead, skipping validation (and the
+default handling that makes model_construct slower than validating).
+
+It's only safe when the SELECT list casts every column to the type the
+model declares (see the *_COLUMNS constants in the repositories). When
+the columns don't line up with the model's fields exactly it validates
+like class_row instead, so a missing or extra column still fails loudly.
+"""
+
+from typing import Any, Sequence, Type, TypeVar
+
+from psycopg.rows import BaseRowFactory, class_row
+from pydantic import BaseModel
+
+M = TypeVar("M", bound=BaseModel)
+
+_new = object.__new__
+_setattr = object.__setattr__
+
+
+def model_row(cls: Type[M]) -> BaseRowFactory[M]:
+    fields = set(cls.model_fields)
+
+    def model_row_(cursor):
+        if cursor.description is None:
+            return class_row(cls)(cursor)
+        names = [column.name for column in cursor.description]
+        if set(names) != fields or len(names) != len(fields):
+
+            def class_row__(values: Sequence[Any]) -> M:
+                return cls(**dict(zip(names, values)))
+
+            return class_row__
+
+        def model_row__(values: Sequence[Any]) -> M:
+            model = _new(cls)
+            _setattr(model, "__dict__", dict(zip(names, values)))
+            _setattr(model, "__pydantic_fields_set__", set(names))
+            _setattr(model, "__pydantic_extra__", None)
+            _setattr(model, "__pydantic_private__", None)
+            return model
+
+        return model_row__
+
+    return model_row_
@@ -0,0 +1,119 @@
+"""
+Schema migrations and the startup schema check
+
+Migrations are the Flyway scripts in api/sql/ and are applied by a
+one-shot step before the API starts (the flyway service in the compose
+files, or `python -m queries.schema migrate` from api/ where the Flyway
+CLI is installed), never from the app itself.
+
+At startup each worker only checks that the database is at
+EXPECTED_SCHEMA_VERSION, one indexed read of flyway_schema_history.
+SCHEMA_CHECK controls what a mismatch does:
+- warn (default): log an error and keep serving
+- strict: refuse to start
+- off: skip the query entirely
+
+Bump EXPECTED_SCHEMA_VERSION with every new V*.sql file.
+"""
+
+import logging
+import os
+import subprocess
+import sys
+from pathlib import Path
+from typing import Optional
+
+from psycopg import errors
+
+from queries.pool import POOL_WARMUP_TIMEOUT, pool
+
+logger = logging.getLogger(__name__)
+
+EXPECTED_SCHEMA_VERSION = 15
+SCHEMA_CHECK = os.environ.get("SCHEMA_CHECK", "warn").lower()
+
+API_DIR = Path(__file__).resolve().parents[1]
+
+
+class SchemaVersionError(RuntimeError):
+    pass
+
+
+async def get_schema_version() -> Optional[int]:
+    """
+    Returns the latest successfully applied Flyway version, or None if
+    Flyway has never run against this database
+    """
+    try:
+        async with pool.connection(timeout=POOL_WARMUP_TIMEOUT) as conn:
+            cur = await conn.execute("""
+                SELECT version FROM flyway_schema_history
+                WHERE success AND version IS NOT NULL
+                ORDER BY installed_rank DESC
+                LIMIT 1
+                """)
+            row = await cur.fetchone()
+    except errors.UndefinedTable:
+        return None
+    return int(row[0]) if row else None
+
+
+async def verify_schema(mode: str = SCHEMA_CHECK):
+    if mode == "off":
+        return
+    try:
+        version = await get_schema_version()
+    except Exception as e:
+        if mode == "strict":
+            raise
+        logger.error(f"Could not check the database schema version: {e}")
+        return
+    if version == EXPECTED_SCHEMA_VERSION:
+        logger.info(f"Database schema is at version {version}")
+        return
+    found = (
+        f"is at version {version}"
+        if version is not None
+        else "has no Flyway history"
+    )
+    message = (
+        f"Database schema {found}, this build expects "
+        f"{EXPECTED_SCHEMA_VERSION}. Run the Flyway migrations."
+    )
+    if mode == "strict":
+        raise SchemaVersionError(message)
+    logger.error(message)
+
+
+def migrate() -> int:
+    """
+    Applies api/sql/ with the Flyway CLI, using flyway.conf
+    """
+    result = subprocess.run(
+        ["flyway", "migrate", "-configFiles=flyway.conf"], cwd=API_DIR
+    )
+    return result.returncode
+
+
+async def _verify_command() -> int:
+    await pool.open(wait=True)
+    try:
+        await verify_schema("strict")
+    except SchemaVersionError as e:
+        print(e, file=sys.stderr)
+        return 1
+    finally:
+        await pool.close()
+    return 0
+
+
+if __name__ == "__main__":
+    import asyncio
+
+    command = sys.argv[1] if len(sys.argv) > 1 else None
+    if command == "migrate":
+        sys.exit(migrate())
+    elif command == "verify":
+        sys.exit(asyncio.run(_verify_command()))
+    print("Command: migrate|verify")
+    sys.exit(2)
@@ -0,0 +1,202 @@
+"""
+Query tracing and the slow-query log
+
+Every repository class is decorated with @traced_repository. Each call
+of a public coroutine method opens a QueryTrace in a contextvar, and
+the pool's TracingCursor and checkout (queries/pool.py) add to it:
+
+- every statement: its fingerprint (a short hash of the SQL with
+  whitespace collapsed, parameters are always bound separately so it's
+  stable), row count and execution time
+- time spent waiting for a pool connection
+
+The call's duration also goes to db_repository_call_seconds (see
+utils/metrics.py). The finished trace is logged at DEBUG on the
+queries.tracing logger.
+
+A statement slower than SLOW_QUERY_MS is logged at WARNING on
+queries.slow_query, with the fields under the record's slow_query
+attribute for structured handlers. SLOW_QUERY_EXPLAIN_RATE (0 to 1,
+default 0) samples slow SELECTs and re-runs them in the background with
+EXPLAIN (ANALYZE, BUFFERS) on another pooled connection, logging the
+plan. ANALYZE executes the query a second time, so keep the rate low.
+"""
+
+import asyncio
+import functools
+import hashlib
+import inspect
+import logging
+import os
+import random
+import time
+from contextvars import ContextVar
+from functools import lru_cache
+from typing import List, Optional, Set, Tuple
+
+from psycopg import AsyncCursor
+from psycopg.sql import Composable
+
+from utils.metrics import repository_calls
+
+logger = logging.getLogger(__name__)
+slow_query_logger = logging.getLogger("queries.slow_query")
+
+SLOW_QUERY_MS = float(os.environ.get("SLOW_QUERY_MS", 250))
+SLOW_QUERY_EXPLAIN_RATE = float(os.environ.get("SLOW_QUERY_EXPLAIN_RATE", 0))
+
+
+class QueryTrace:
+    __slots__ = ("method", "pool_wait", "queries")
+
+    def __init__(self, method: str):
+        self.method = method
+        self.pool_wait = 0.0
+        # (fingerprint, rows, seconds)
+        self.queries: List[Tuple[str, int, float]] = []
+
+
+current_trace: ContextVar[Optional[QueryTrace]] = ContextVar(
+    "current_trace", default=None
+)
+# Set inside the EXPLAIN task so its own statements aren't sampled again
+_explaining: ContextVar[bool] = ContextVar("explaining", default=False)
+# Keeps the background EXPLAIN tasks referenced until they finish
+_explain_tasks: Set[asyncio.Task] = set()
+
+
+@lru_cache(maxsize=1024)
+def normalize(sql: str) -> str:
+    return " ".join(sql.split())
+
+
+@lru_cache(maxsize=1024)
+def fingerprint(sql: str) -> str:
+    return hashlib.blake2b(normalize(sql).encode(), digest_size=6).hexdigest()
+
+
+def record_pool_wait(seconds: float):
+    trace = current_trace.get()
+    if trace is not None:
+        trace.pool_wait += seconds
+
+
+def _record_query(cursor: AsyncCursor, query, params, seconds: float):
+    if _explaining.get():
+        return
+    if isinstance(query, Composable):
+        query = query.as_string(cursor)
+    elif isinstance(query, bytes):
+        query = query.decode()
+    # The pool's health check
+    if not query.strip():
+        return
+    rows = cursor.rowcount
+    key = fingerprint(query)
+    trace = current_trace.get()
+    if trace is not None:
+        trace.queries.append((key, rows, seconds))
+    if seconds * 1000 < SLOW_QUERY_MS:
+        return
+
+    method = trace.method if trace is not None else None
+    slow_query_logger.warning(
+        f"Slow query in {method or 'an untraced call'}: "
+        f"{seconds * 1000:.0f} ms, {rows} rows [{key}]",
+        extra={
+            "slow_query": {
+                "method": method,
+                "fingerprint": key,
+                "duration_ms": round(seconds * 1000, 1),
+                "rows": rows,
+                "pool_wait_ms": (
+                    round(trace.pool_wait * 1000, 1) if trace else None
+                ),
+                "sql": normalize(query),
+            }
+        },
+    )
+    if (
+        SLOW_QUERY_EXPLAIN_RATE > 0
+        and normalize(query).upper().startswith("SELECT")
+        and random.random() < SLOW_QUERY_EXPLAIN_RATE
+    ):
+        task = asyncio.create_task(explain(query, params, key))
+        _explain_tasks.add(task)
+        task.add_done_callback(_explain_tasks.discard)
+
+
+async def explain(query: str, params, key: str):
+    """
+    Re-runs a slow SELECT under EXPLAIN (ANALYZE, BUFFERS) and logs the
+    plan, in a read-only transaction so it can't write anything
+    """
+    from queries.pool import pool
+
+    _explaining.set(True)
+    try:
+        async with pool.connection() as conn:
+            await conn.execute("SET TRANSACTION READ ONLY")
+            cur = await conn.execute(
+                f"EXPLAIN (ANALYZE, BUFFERS) {query}", params
+            )
+            plan = "\n".join(row[0] for row in await cur.fetchall())
+            await conn.rollback()
+    except Exception as e:
+        slow_query_logger.error(f"EXPLAIN of slow query [{key}] failed: {e}")
+        return
+    slow_query_logger.warning(
+        f"Plan for slow query [{key}]:\n{plan}",
+        extra={"slow_query": {"fingerprint": key, "plan": plan}},
+    )
+
+
+class TracingCursor(AsyncCursor):
+    """
+    The pool's cursor_factory, times every statement into the current
+    trace
+    """
+
+    async def execute(self, query, params=None, **kwargs):
+        start = time.perf_counter()
+        try:
+            return await super().execute(query, params, **kwargs)
+        finally:
+            _record_query(self, query, params, time.perf_counter() - start)
+
+
+def traced_repository(cls):
+    """
+    Class decorator tracing every public coroutine method of a
+    repository
+    """
+    for name, method in list(vars(cls).items()):
+        if name.startswith("_") or not inspect.iscoroutinefunction(method):
+            continue
+        setattr(cls, name, _traced(method, f"{cls.__name__}.{name}"))
+    return cls
+
+
+def _traced(method, label: str):
+    @functools.wraps(method)
+    async def traced(*args, **kwargs):
+        trace = QueryTrace(label)
+        token = current_trace.set(trace)
+        start = time.perf_counter()
+        try:
+            return await method(*args, **kwargs)
+        finally:
+            elapsed = time.perf_counter() - start
+            current_trace.reset(token)
+            repository_calls.observe(elapsed, label)
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug(
+                    f"{label} took {elapsed * 1000:.1f} ms "
+                    f"(pool wait {trace.pool_wait * 1000:.1f} ms): "
+                    + ", ".join(
+                        f"[{key}] {rows} rows {seconds * 1000:.1f} ms"
+                        for key, rows, seconds in trace.queries
+                    )
+                )
+
+    return traced
@@ -2,22 +2,20 @@
 Database Queries for Users
 """
 
-import os
+import logging
 import psycopg
-from psycopg_pool import ConnectionPool
 from psycopg.rows import class_row
 from typing import Optional
 from models.users import UserWithPw
 from utils.exceptions import UserDatabaseException
 from pydantic import BaseModel, ValidationError
 from fastapi import HTTPException
+from queries.pool import pool
+from queries.tracing import traced_repository
+from utils.plans import DEFAULT_PLAN
+from utils.timezone import DEFAULT_TIMEZONE
 
-
-DATABASE_URL = os.environ.get("DATABASE_URL")
-if not DATABASE_URL:
-    raise ValueError("DATABASE_URL environment variable is not set")
-
-pool = ConnectionPool(DATABASE_URL)
+logger = logging.getLogger(__name__)
 
 
 class AccountIn(BaseModel):
@@ -31,6 +29,8 @@ class AccountOut(BaseModel):
     username: str
     password: str
     email: str
+    timezone: str = DEFAULT_TIMEZONE
+    plan: str = DEFAULT_PLAN
 
 
 class CheckAccountOut(BaseModel):
@@ -51,6 +51,7 @@ class Error(BaseModel):
     message: str
 
 
+@traced_repository
 class UserQueries:
     """
     Class containing queries for the Users table
@@ -61,27 +62,18 @@ class UserQueries:
         # Here you can call any of the functions to query the DB
     """
 
-    def result_to_dict(self, result):
-        if result:
-            return {
-                "id": result[0],
-                "username": result[1],
-                "password": result[2],
-                "email": result[3],
-            }
-        else:
-            return None
-
-    def get_by_username(self, username: str) -> Optional[UserWithPw]:
+    async def get_by_username(self, username: str) -> Optional[UserWithPw]:
         """
         Gets a user from the database by username
 
         Returns None if the user isn't found
         """
         try:
-            with pool.connection() as conn:
-                with conn.cursor(row_factory=class_row(UserWithPw)) as cur:
-                    cur.execute(
+            async with pool.connection() as conn:
+                async with conn.cursor(
+                    row_factory=class_row(UserWithPw)
+                ) as cur:
+                    await cur.execute(
                         """
                             SELECT
                                 *
@@ -90,24 +82,26 @@ class UserQueries:
                             """,
                         [username],
                     )
-                    user = cur.fetchone()
+                    user = await cur.fetchone()
                     if not user:
                         return None
         except psycopg.Error as e:
-            print(e)
+            logger.error(f"Error getting user {username}: {e}")
             raise UserDatabaseException(f"Error getting user {username}")
         return user
 
-    def get_by_id(self, id: int) -> Optional[UserWithPw]:
+    async def get_by_id(self, id: int) -> Optional[UserWithPw]:
         """
         Gets a user from the database by user id
 
         Returns None if the user isn't found
         """
         try:
-            with pool.connection() as conn:
-                with conn.cursor(row_factory=class_row(UserWithPw)) as cur:
-                    cur.execute(
+            async with pool.connection() as conn:
+                async with conn.cursor(
+                    row_factory=class_row(UserWithPw)
+                ) as cur:
+                    await cur.execute(
                         """
                             SELECT
                                 *
@@ -116,16 +110,16 @@ class UserQueries:
                             """,
                         [id],
                     )
-                    user = cur.fetchone()
+                    user = await cur.fetchone()
                     if not user:
                         return None
         except psycopg.Error as e:
-            print(e)
+            logger.error(f"Error getting user with id {id}: {e}")
             raise UserDatabaseException(f"Error getting user with id {id}")
 
         return user
 
-    def create_user(
+    async def create_user(
         self, account_in: AccountIn, hashed_password: str
     ) -> AccountOut:
         """
@@ -134,16 +128,18 @@ class UserQueries:
         Raises a UserInsertionException if creating the user fails
         """
         try:
-            with pool.connection() as conn:
-                with conn.cursor() as cur:
-                    cur.execute(
+            async with pool.connection() as conn:
+                async with conn.cursor(
+                    row_factory=class_row(AccountOut)
+                ) as cur:
+                    await cur.execute(
                         """
                         INSERT INTO accounts
                         (username, password, email)
                         VALUES
                         (%s, %s, %s)
                         RETURNING
-                        id, username, password, email
+                        id, username, password, email, timezone, plan
                         """,
                         [
                             account_in.username,
@@ -151,22 +147,20 @@ class UserQueries:
                             account_in.email,
                         ],
                     )
-                    result = cur.fetchone()
+                    result = await cur.fetchone()
                     if result:
-                        result_dict = self.result_to_dict(result)
-                        return AccountOut(**result_dict)
+                        return result
                     else:
                         raise HTTPException(
                             status_code=500, detail="Failed to create account."
                         )
         except ValidationError as e:
-            print(f"Validation error: {e}")
-            print(f"Payload causing the error: {account_in}")
+            logger.warning(f"Invalid account for {account_in.username}: {e}")
             raise HTTPException(
                 status_code=422, detail=f"Validation error: {e}"
             )  # HTTP 422 Unprocessable Entity
         except Exception as ex:
-            print(f"Error creating account: {ex}")
+            logger.error(f"Error creating account: {ex}")
             raise HTTPException(
                 status_code=500, detail="Failed to create account."
             )
@@ -1,6 +1,7 @@
 from pydantic import BaseModel
 from typing import List
 from queries.pool import pool
+from queries.tracing import traced_repository
 
 
 class UserIn(BaseModel):
@@ -14,19 +15,20 @@ class UserOut(BaseModel):
     last: str
 
 
+@traced_repository
 class UserRepository:
-    def get_all(self) -> List[UserOut]:
+    async def get_all(self) -> List[UserOut]:
         try:
-            with pool.connection() as conn:
-                with conn.cursor() as cur:
-                    cur.execute(
+            async with pool.connection() as conn:
+                async with conn.cursor() as cur:
+                    await cur.execute(
                         """
                         SELECT *
                         FROM users
                         """
                     )
                     results = []
-                    for record in cur:
+                    async for record in cur:
                         user = UserOut(
                             userId=record[0], first=record[1], last=record[2]
                         )
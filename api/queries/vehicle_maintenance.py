@@ -1,53 +1,71 @@
+import logging
 from pydantic import BaseModel, ValidationError
-from typing import Optional
+from psycopg.rows import dict_row
+from queries.rows import model_row
+from typing import AsyncIterator, List, Optional, Tuple
 from fastapi import HTTPException
 from queries.pool import pool
+from queries.tracing import traced_repository
+from utils.pagination import DEFAULT_PAGE_SIZE, decode_cursor, paginate
 from datetime import date
-import pytz
+from utils.timezone import current_timezone, local_date_column
 from models.vehicle_maintenance import (
+    MaintenanceImportResult,
+    MaintenanceImportRowError,
     VehicleMaintenanceIn,
     VehicleMaintenanceOut,
 )
+from utils.exceptions import (
+    PermissionDeniedException,
+    RecordNotFoundException,
+)
+
+logger = logging.getLogger(__name__)
+
+# Rows pulled from the server-side cursor per network round trip
+EXPORT_ITERSIZE = 2000
+
+# Column order matches the rows import_maintenance_logs writes
+IMPORT_COPY = """
+    COPY vehicle_maintenance
+      (vehicle_id, maintenance_type, mileage, cost, description, service_date)
+    FROM STDIN
+"""
+
+
+def maintenance_columns(alias: str = "") -> str:
+    """
+    SELECT list matching VehicleMaintenanceOut, so rows decode straight
+    into it with model_row. cost is stored as numeric but exposed as int.
+    """
+    prefix = f"{alias}." if alias else ""
+    return f"""
+        {prefix}id, {prefix}vehicle_id, {prefix}maintenance_type,
+        {prefix}mileage, {prefix}cost::int AS cost, {prefix}description,
+        {prefix}service_date,
+        {local_date_column(f"{prefix}created_date", "created_date")}
+    """
+
 
+MAINTENANCE_COLUMNS = maintenance_columns()
 
+
+@traced_repository
 class VehicleMaintenanceRepo(BaseModel):
-    def result_to_dict(self, result):
-        if result:
-            utc_time = result[7]
-            local_date = self.convert_to_pst_date(utc_time)
-            return {
-                "id": result[0],
-                "vehicle_id": result[1],
-                "maintenance_type": result[2],
-                "mileage": result[3],
-                "cost": result[4],
-                "description": result[5],
-                "service_date": result[6],
-                "created_date": local_date,
-            }
-        else:
-            return None
-
-    def convert_to_pst_date(self, utc_time):
-        utc = pytz.utc
-        pst = pytz.timezone("America/Los_Angeles")
-        utc_dt = utc.localize(utc_time)
-        pst_dt = utc_dt.astimezone(pst)
-        return pst_dt.date()
-
-    def create_maintenance_log(
+    async def create_maintenance_log(
         self, maintenance: VehicleMaintenanceIn
     ) -> VehicleMaintenanceOut:
         try:
-            with pool.connection() as conn:
-                with conn.cursor() as cur:
-                    query = """
+            async with pool.connection() as conn:
+                async with conn.cursor(
+                    row_factory=model_row(VehicleMaintenanceOut)
+                ) as cur:
+                    query = f"""
                         INSERT INTO vehicle_maintenance
                           (vehicle_id, maintenance_type, mileage, cost, description, service_date)
                         VALUES
                           (%s, %s, %s, %s, %s, %s)
-                        RETURNING
-                          id, vehicle_id, maintenance_type, mileage, cost, description, service_date, created_date
+                        RETURNING {MAINTENANCE_COLUMNS}
                     """
                     values = [
                         maintenance.vehicle_id,
@@ -56,174 +74,346 @@ class VehicleMaintenanceRepo(BaseModel):
                         maintenance.cost,
                         maintenance.description,
                         maintenance.service_date,
+                        current_timezone(),
                     ]
 
-                    cur.execute(query, values)
-                    result = cur.fetchone()
+                    await cur.execute(query, values)
+                    result = await cur.fetchone()
                     if result:
-                        result_dict = self.result_to_dict(result)
-                        return VehicleMaintenanceOut(**result_dict)
+                        return result
                     else:
                         return None
         except Exception as ex:
-            print(f"Error creating vehicle maintenance: {ex}")
+            logger.error(f"Error creating vehicle maintenance: {ex}")
             raise HTTPException(
                 status_code=500, detail="Failed to add vehicle maintenance"
             )
 
-    def get_maintenance_log_by_vehicle_id(
+    async def import_maintenance_logs(
+        self, logs: List[Tuple[int, VehicleMaintenanceIn]], user_id: int
+    ) -> MaintenanceImportResult:
+        """
+        Bulk loads validated (row number, log) pairs with COPY
+
+        Every log must belong to one of user_id's vehicles. The ownership
+        check and the COPY share one transaction, and nothing is written
+        if any row points at a vehicle the user doesn't own.
+        """
+        vehicle_ids = sorted({log.vehicle_id for _, log in logs})
+        try:
+            async with pool.connection() as conn:
+                async with conn.transaction():
+                    async with conn.cursor() as cur:
+                        await cur.execute(
+                            """
+                            SELECT id FROM vehicles
+                            WHERE user_id = %s AND id = ANY(%s)
+                            """,
+                            [user_id, vehicle_ids],
+                        )
+                        owned = {row[0] for row in await cur.fetchall()}
+                        errors = [
+                            MaintenanceImportRowError(
+                                row=row,
+                                error=f"Vehicle ID {log.vehicle_id} does not exist or belongs to another user.",
+                            )
+                            for row, log in logs
+                            if log.vehicle_id not in owned
+                        ]
+                        if errors:
+                            return MaintenanceImportResult(
+                                imported=0, errors=errors
+                            )
+                        async with cur.copy(IMPORT_COPY) as copy:
+                            for _, log in logs:
+                                await copy.write_row(
+                                    (
+                                        log.vehicle_id,
+                                        log.maintenance_type,
+                                        log.mileage,
+                                        log.cost,
+                                        log.description,
+                                        log.service_date,
+                                    )
+                                )
+            return MaintenanceImportResult(imported=len(logs), errors=[])
+        except Exception as e:
+            logger.error(f"Error importing maintenance logs: {e}")
+            raise HTTPException(
+                status_code=500, detail="Failed to import maintenance logs"
+            )
+
+    async def get_maintenance_version(self, vehicle_id: int) -> Optional[int]:
+        """
+        Returns the vehicle's maintenance_version, the ETag input for its
+        log listing, or None if the vehicle doesn't exist
+        """
+        try:
+            async with pool.connection() as conn:
+                cur = await conn.execute(
+                    "SELECT maintenance_version FROM vehicles WHERE id = %s",
+                    (vehicle_id,),
+                )
+                row = await cur.fetchone()
+                return row[0] if row else None
+        except Exception as e:
+            logger.error(f"Exception occurred: {e}")
+            raise HTTPException(
+                status_code=500, detail="Internal Server Error"
+            )
+
+    async def get_maintenance_log_by_vehicle_id(
         self, vehicle_id: int
     ) -> Optional[VehicleMaintenanceOut]:
         try:
-            with pool.connection() as conn:
-                with conn.cursor() as cur:
-                    cur.execute(
-                        """
-                        SELECT * FROM vehicle_maintenance
+            async with pool.connection() as conn:
+                async with conn.cursor(
+                    row_factory=model_row(VehicleMaintenanceOut)
+                ) as cur:
+                    await cur.execute(
+                        f"""
+                        SELECT {MAINTENANCE_COLUMNS} FROM vehicle_maintenance
                         WHERE vehicle_id = %s
                         ORDER BY service_date DESC
                         LIMIT 1
                         """,
-                        (vehicle_id,),
+                        (current_timezone(), vehicle_id),
                     )
-                    result = cur.fetchone()
+                    result = await cur.fetchone()
                     if result is None:
                         raise HTTPException(
                             status_code=404,
                             detail=f"Vehicle maintenance log with Vehicle ID ({vehicle_id}) does not exist.",
                         )
-                    result_dict = self.result_to_dict(result)
-                    return VehicleMaintenanceOut(**result_dict)
+                    return result
         except Exception as e:
-            print(f"Exception occurred: {e}")
+            logger.error(f"Exception occurred: {e}")
             raise HTTPException(
                 status_code=500, detail="Internal Server Error"
             )
 
-    def get_all_maintenance_log_by_vehicle_id(
-        self, vehicle_id: int
-    ) -> Optional[list[VehicleMaintenanceOut]]:
+    async def get_all_maintenance_log_by_vehicle_id(
+        self,
+        vehicle_id: int,
+        limit: int = DEFAULT_PAGE_SIZE,
+        after: Optional[str] = None,
+    ) -> Tuple[List[VehicleMaintenanceOut], Optional[str]]:
+        """
+        Returns one page of a vehicle's logs, newest service first, plus
+        the cursor for the next page (None on the last page)
+        """
+        query = f"SELECT {MAINTENANCE_COLUMNS} FROM vehicle_maintenance WHERE vehicle_id = %s"
+        params = [current_timezone(), vehicle_id]
+        if after:
+            after_date, after_id = decode_cursor(
+                after, date.fromisoformat, int
+            )
+            query += " AND (service_date, id) < (%s, %s)"
+            params += [after_date, after_id]
+        query += " ORDER BY service_date DESC, id DESC LIMIT %s"
+        params.append(limit + 1)
         try:
-            with pool.connection() as conn:
-                with conn.cursor() as cur:
-                    cur.execute(
-                        """
-                        SELECT * FROM vehicle_maintenance
-                        WHERE vehicle_id = %s
-                        ORDER by service_date DESC
-                        """,
-                        (vehicle_id,),
+            async with pool.connection() as conn:
+                async with conn.cursor(
+                    row_factory=model_row(VehicleMaintenanceOut)
+                ) as cur:
+                    await cur.execute(query, params)
+                    logs = await cur.fetchall()
+                    return paginate(
+                        logs,
+                        limit,
+                        lambda log: (log.service_date.isoformat(), log.id),
                     )
-                    results = cur.fetchall()
-                    vehicles = [
-                        self.result_to_dict(result) for result in results
-                    ]
-                    return [
-                        VehicleMaintenanceOut(**vehicle)
-                        for vehicle in vehicles
-                    ]
         except Exception:
             raise HTTPException(
                 status_code=500, detail="Internal Server Error."
             )
 
-    def get_maintenance_log_by_log_id(
+    async def stream_maintenance_logs_by_user_id(
+        self, user_id: int
+    ) -> AsyncIterator[VehicleMaintenanceOut]:
+        """
+        Yields every maintenance log across all of a user's vehicles
+
+        Rows come from a server-side named cursor in EXPORT_ITERSIZE
+        batches, so memory stays flat however long the history is. The
+        pooled connection is held until the iteration finishes or the
+        generator is closed.
+        """
+        async with pool.connection() as conn:
+            async with conn.cursor(
+                name="maintenance_export",
+                row_factory=model_row(VehicleMaintenanceOut),
+            ) as cur:
+                cur.itersize = EXPORT_ITERSIZE
+                await cur.execute(
+                    f"""
+                    SELECT {maintenance_columns("vm")}
+                    FROM vehicle_maintenance vm
+                    JOIN vehicles v ON v.id = vm.vehicle_id
+                    WHERE v.user_id = %s
+                    ORDER BY vm.vehicle_id, vm.service_date DESC, vm.id DESC
+                    """,
+                    (current_timezone(), user_id),
+                )
+                async for log in cur:
+                    yield log
+
+    async def get_maintenance_log_by_log_id(
         self, maintenance_log_id: int
     ) -> Optional[VehicleMaintenanceOut]:
         try:
-            with pool.connection() as conn:
-                with conn.cursor() as cur:
-                    cur.execute(
-                        """
-                        SELECT * from vehicle_maintenance
+            async with pool.connection() as conn:
+                async with conn.cursor(
+                    row_factory=model_row(VehicleMaintenanceOut)
+                ) as cur:
+                    await cur.execute(
+                        f"""
+                        SELECT {MAINTENANCE_COLUMNS} from vehicle_maintenance
                         WHERE id = %s
                         """,
-                        (maintenance_log_id,),
+                        (current_timezone(), maintenance_log_id),
                     )
-                    result = cur.fetchone()
+                    result = await cur.fetchone()
                     if result is None:
                         raise HTTPException(
                             status_code=404,
                             detail=f"Maintenance log with ID ({id}) does not exist.",
                         )
-                    result_dict = self.result_to_dict(result)
-                    return VehicleMaintenanceOut(**result_dict)
+                    return result
         except Exception as e:
-            print(f"Exception occurred: {e}")
+            logger.error(f"Exception occurred: {e}")
             raise HTTPException(
                 status_code=500, detail="Internal Server Error"
             )
 
-    def delete_maintenance_log_by_id(
-        self, maintenance_log_id: int
-    ) -> Optional[VehicleMaintenanceOut]:
+    async def delete_maintenance_log_by_id(
+        self, maintenance_log_id: int, user_id: int
+    ) -> VehicleMaintenanceOut:
+        """
+        Deletes a maintenance log if its vehicle belongs to user_id
+
+        The ownership check and the delete run as a single statement.
+        Raises RecordNotFoundException if the log doesn't exist and
+        PermissionDeniedException if it belongs to another user's vehicle.
+        """
         try:
-            with pool.connection() as conn:
-                with conn.cursor() as cur:
-                    cur.execute(
-                        "DELETE FROM vehicle_maintenance WHERE id = %s RETURNING *",
-                        (maintenance_log_id,),
-                    )
-                    result = cur.fetchone()
-                    if result:
-                        result_dict = self.result_to_dict(result)
-                        return VehicleMaintenanceOut(**result_dict)
-                    else:
-                        print(
-                            f"Maintenance log ID {maintenance_log_id} does not exist."
+            async with pool.connection() as conn:
+                async with conn.cursor(row_factory=dict_row) as cur:
+                    await cur.execute(
+                        f"""
+                        WITH target AS (
+                          SELECT vm.id, v.user_id
+                          FROM vehicle_maintenance vm
+                          JOIN vehicles v ON v.id = vm.vehicle_id
+                          WHERE vm.id = %s
+                        ),
+                        deleted AS (
+                          DELETE FROM vehicle_maintenance vm
+                          USING target t
+                          WHERE vm.id = t.id AND t.user_id = %s
+                          RETURNING vm.*
                         )
-                        return None  # Return None if the record does not exist
+                        SELECT {maintenance_columns("d")}
+                        FROM target t
+                        LEFT JOIN deleted d ON d.id = t.id
+                        """,
+                        [maintenance_log_id, user_id, current_timezone()],
+                    )
+                    result = await cur.fetchone()
         except Exception as e:
-            print(
+            logger.error(
                 f"Error deleting maintenance log ID {maintenance_log_id}: {e}"
             )
             raise HTTPException(
                 status_code=500, detail="Internal Server Error during deletion"
             )
+        if result is None:
+            raise RecordNotFoundException(
+                f"Maintenance log ID {maintenance_log_id} does not exist."
+            )
+        if result["id"] is None:
+            raise PermissionDeniedException(
+                f"Maintenance log ID {maintenance_log_id} belongs to another user."
+            )
+        return VehicleMaintenanceOut(**result)
 
-    def update_maintenance_log_by_id(
-        self, maintenance_log_id: int, log_id: VehicleMaintenanceIn
-    ) -> Optional[VehicleMaintenanceOut]:
+    async def update_maintenance_log_by_id(
+        self,
+        maintenance_log_id: int,
+        log_id: VehicleMaintenanceIn,
+        user_id: int,
+    ) -> VehicleMaintenanceOut:
+        """
+        Updates a maintenance log if its vehicle belongs to user_id
+
+        The log's current vehicle and the vehicle it is being moved to
+        must both be owned by user_id. Ownership checks and the update run
+        as a single statement. Raises RecordNotFoundException if the log
+        doesn't exist and PermissionDeniedException if either vehicle
+        belongs to another user.
+        """
         try:
-            with pool.connection() as conn:
-                with conn.cursor() as cur:
-                    cur.execute(
-                        """
-                        UPDATE vehicle_maintenance
-                        SET
-                          vehicle_id = %s,
-                          maintenance_type = %s,
-                          mileage = %s,
-                          cost = %s,
-                          description = %s,
-                          service_date = %s
-                        WHERE id = %s
-                        RETURNING id, vehicle_id, maintenance_type, mileage, cost, description, service_date, created_date
+            async with pool.connection() as conn:
+                async with conn.cursor(row_factory=dict_row) as cur:
+                    await cur.execute(
+                        f"""
+                        WITH target AS (
+                          SELECT vm.id, v.user_id
+                          FROM vehicle_maintenance vm
+                          JOIN vehicles v ON v.id = vm.vehicle_id
+                          WHERE vm.id = %s
+                        ),
+                        updated AS (
+                          UPDATE vehicle_maintenance vm
+                          SET
+                            vehicle_id = %s,
+                            maintenance_type = %s,
+                            mileage = %s,
+                            cost = %s,
+                            description = %s,
+                            service_date = %s
+                          FROM target t
+                          WHERE vm.id = t.id
+                            AND t.user_id = %s
+                            AND EXISTS (
+                              SELECT 1 FROM vehicles nv
+                              WHERE nv.id = %s AND nv.user_id = %s
+                            )
+                          RETURNING vm.*
+                        )
+                        SELECT {maintenance_columns("u")}
+                        FROM target t
+                        LEFT JOIN updated u ON u.id = t.id
                         """,
                         [
+                            maintenance_log_id,
                             log_id.vehicle_id,
                             log_id.maintenance_type,
                             log_id.mileage,
                             log_id.cost,
                             log_id.description,
                             log_id.service_date,
-                            maintenance_log_id,  # This is the value for the WHERE clause
+                            user_id,
+                            log_id.vehicle_id,
+                            user_id,
+                            current_timezone(),
                         ],
                     )
-                    result = cur.fetchone()
-                    if result is not None:
-                        result_dict = self.result_to_dict(result)
-                        return VehicleMaintenanceOut(**result_dict)
-                    else:
-                        print(
-                            f"No maintenance log found with ID {maintenance_log_id}"
-                        )
-                        return None
-        except ValidationError as e:
-            print(f"Failed to update vehicle maintenance log: {e}")
-            return None
+                    result = await cur.fetchone()
         except Exception as e:
-            print(
+            logger.error(
                 f"Unexpected error while updating vehicle maintenance log: {e}"
             )
-            return None
+            raise HTTPException(
+                status_code=500, detail="Internal Server Error during update"
+            )
+        if result is None:
+            raise RecordNotFoundException(
+                f"Maintenance log ID {maintenance_log_id} does not exist."
+            )
+        if result["id"] is None:
+            raise PermissionDeniedException(
+                f"Maintenance log ID {maintenance_log_id} belongs to another user."
+            )
+        return VehicleMaintenanceOut(**result)
@@ -1,9 +1,16 @@
+import logging
 from pydantic import BaseModel, ValidationError
-from typing import Optional
+from queries.rows import model_row
+from typing import List, Optional, Tuple
 from fastapi import HTTPException
 from queries.pool import pool
+from queries.tracing import traced_repository
+from utils.exceptions import PermissionDeniedException
+from utils.pagination import DEFAULT_PAGE_SIZE, decode_cursor, paginate
 from datetime import date
-import pytz
+from utils.timezone import current_timezone, local_date_column
+
+logger = logging.getLogger(__name__)
 
 
 class Error(BaseModel):
@@ -42,42 +49,37 @@ class VehicleStatOut(BaseModel):
     last_update_timestamp: date
 
 
+# Named to match VehicleStatOut, rows are decoded straight into it with
+# model_row
+VEHICLE_STAT_COLUMNS = f"""
+    id,
+    vehicle_id,
+    last_oil_change,
+    last_tire_rotation,
+    last_tire_change,
+    last_air_filter,
+    last_brake_flush,
+    last_brake_rotor,
+    last_brake_pad,
+    last_coolant_flush,
+    last_transmission_fluid_flush,
+    last_cabin_filter_change,
+    last_wiper_blades_change,
+    {local_date_column("last_update_timestamp")}
+"""
+
+
+@traced_repository
 class VehicleStatRepository:
-    def result_to_dict(self, result):
-        if result:
-            utc_time = result[13]  # Ensure this index is correct
-            local_date = self.convert_to_pst_date(utc_time)
-            return {
-                "id": result[0],
-                "vehicle_id": result[1],
-                "last_oil_change": result[2],
-                "last_tire_rotation": result[3],
-                "last_tire_change": result[4],
-                "last_air_filter": result[5],
-                "last_brake_flush": result[6],
-                "last_brake_rotor": result[7],
-                "last_brake_pad": result[8],
-                "last_coolant_flush": result[9],
-                "last_transmission_fluid_flush": result[10],
-                "last_cabin_filter_change": result[11],
-                "last_wiper_blades_change": result[12],
-                "last_update_timestamp": local_date,
-            }
-        else:
-            return None
-
-    def convert_to_pst_date(self, utc_time):
-        utc = pytz.utc
-        pst = pytz.timezone("America/Los_Angeles")
-        utc_dt = utc.localize(utc_time)
-        pst_dt = utc_dt.astimezone(pst)
-        return pst_dt.date()
-
-    def create_vehicle_stat(self, vehicle: VehicleStatIn) -> VehicleStatOut:
+    async def create_vehicle_stat(
+        self, vehicle: VehicleStatIn
+    ) -> VehicleStatOut:
         try:
-            with pool.connection() as conn:
-                with conn.cursor() as cur:
-                    query = """
+            async with pool.connection() as conn:
+                async with conn.cursor(
+                    row_factory=model_row(VehicleStatOut)
+                ) as cur:
+                    query = f"""
                         INSERT INTO vehicle_stats
                           (vehicle_id,
                           last_oil_change,
@@ -93,21 +95,7 @@ class VehicleStatRepository:
                           last_wiper_blades_change)
                         VALUES
                           (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-                        RETURNING
-                        id,
-                        vehicle_id,
-                        last_oil_change,
-                        last_tire_rotation,
-                        last_tire_change,
-                        last_air_filter,
-                        last_brake_flush,
-                        last_brake_rotor,
-                        last_brake_pad,
-                        last_coolant_flush,
-                        last_transmission_fluid_flush,
-                        last_cabin_filter_change,
-                        last_wiper_blades_change,
-                        last_update_timestamp
+                        RETURNING {VEHICLE_STAT_COLUMNS}
                     """
                     values = [
                         vehicle.vehicle_id,
@@ -122,79 +110,170 @@ class VehicleStatRepository:
                         vehicle.last_transmission_fluid_flush,
                         vehicle.last_cabin_filter_change,
                         vehicle.last_wiper_blades_change,
+                        current_timezone(),
                     ]
 
-                    for i, value in enumerate(values):
-                        print(f"Value {i}: {value} (Type: {type(value)})")
-
-                    cur.execute(query, values)
-                    result = cur.fetchone()
+                    await cur.execute(query, values)
+                    result = await cur.fetchone()
                     if result:
-                        result_dict = self.result_to_dict(result)
-                        return VehicleStatOut(**result_dict)
+                        return result
                     else:
-                        print("No result found")
+                        logger.debug(
+                            "No stats row returned for vehicle %s",
+                            vehicle.vehicle_id,
+                        )
                         return None
         except ValidationError as e:
-            print(f"Validation error: {e}")
-            print(f"Payload causing the error: {vehicle}")
+            logger.warning(
+                f"Invalid stats for vehicle {vehicle.vehicle_id}: {e}"
+            )
             raise HTTPException(
                 status_code=422, detail=f"Validation error: {e}"
             )  # HTTP 422 Unprocessable Entity
         except Exception as ex:
-            print(f"Error creating vehicle stats: {ex}")
+            logger.error(f"Error creating vehicle stats: {ex}")
+            raise HTTPException(
+                status_code=500, detail="Failed to add vehicle stats"
+            )
+
+    async def create_vehicle_stats(
+        self, stats: List[VehicleStatIn], user_id: int
+    ) -> List[VehicleStatOut]:
+        """
+        Inserts a batch of vehicle stats with one multi-row INSERT
+
+        Every stat must be for one of user_id's vehicles. The ownership
+        check and the insert share one transaction, and a stat for any
+        other vehicle raises PermissionDeniedException with nothing
+        written. Stats come back in the order they were sent.
+        """
+        vehicle_ids = sorted({stat.vehicle_id for stat in stats})
+        rows = ", ".join(
+            ["(%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)"] * len(stats)
+        )
+        values = []
+        for stat in stats:
+            values += [
+                stat.vehicle_id,
+                stat.last_oil_change,
+                stat.last_tire_rotation,
+                stat.last_tire_change,
+                stat.last_air_filter,
+                stat.last_brake_flush,
+                stat.last_brake_rotor,
+                stat.last_brake_pad,
+                stat.last_coolant_flush,
+                stat.last_transmission_fluid_flush,
+                stat.last_cabin_filter_change,
+                stat.last_wiper_blades_change,
+            ]
+        values.append(current_timezone())
+        try:
+            async with pool.connection() as conn:
+                async with conn.transaction():
+                    async with conn.cursor() as cur:
+                        await cur.execute(
+                            """
+                            SELECT id FROM vehicles
+                            WHERE user_id = %s AND id = ANY(%s)
+                            """,
+                            [user_id, vehicle_ids],
+                        )
+                        owned = {row[0] for row in await cur.fetchall()}
+                        foreign = [i for i in vehicle_ids if i not in owned]
+                        if foreign:
+                            raise PermissionDeniedException(
+                                f"Vehicle IDs {foreign} do not exist or belong to another user."
+                            )
+                        cur.row_factory = model_row(VehicleStatOut)
+                        await cur.execute(
+                            f"""
+                            INSERT INTO vehicle_stats
+                              (vehicle_id,
+                              last_oil_change,
+                              last_tire_rotation,
+                              last_tire_change,
+                              last_air_filter,
+                              last_brake_flush,
+                              last_brake_rotor,
+                              last_brake_pad,
+                              last_coolant_flush,
+                              last_transmission_fluid_flush,
+                              last_cabin_filter_change,
+                              last_wiper_blades_change)
+                            VALUES
+                              {rows}
+                            RETURNING {VEHICLE_STAT_COLUMNS}
+                            """,
+                            values,
+                        )
+                        results = await cur.fetchall()
+                        # Serial ids are handed out in VALUES order
+                        return sorted(results, key=lambda stat: stat.id)
+        except PermissionDeniedException:
+            raise
+        except Exception as ex:
+            logger.error(f"Error creating vehicle stats batch: {ex}")
             raise HTTPException(
                 status_code=500, detail="Failed to add vehicle stats"
             )
 
-    def get_vehicle_stats_by_vehicle_id(
+    async def get_vehicle_stats_by_vehicle_id(
         self, vehicle_id: int
     ) -> Optional[VehicleStatOut]:
         try:
-            with pool.connection() as conn:
-                with conn.cursor() as cur:
-                    cur.execute(
-                        """
-                        SELECT * FROM vehicle_stats
+            async with pool.connection() as conn:
+                async with conn.cursor(
+                    row_factory=model_row(VehicleStatOut)
+                ) as cur:
+                    await cur.execute(
+                        f"""
+                        SELECT {VEHICLE_STAT_COLUMNS} FROM vehicle_stats
                         WHERE vehicle_id = %s
                         ORDER BY last_update_timestamp DESC
                         LIMIT 1
                         """,
-                        (vehicle_id,),
+                        (current_timezone(), vehicle_id),
                     )
-                    result = cur.fetchone()
+                    result = await cur.fetchone()
                     if result is None:
                         raise HTTPException(
                             status_code=404,
                             detail=f"Vehicle maintenance log with Vehicle ID ({vehicle_id}) does not exist.",
                         )
-                    result_dict = self.result_to_dict(result)
-                    return VehicleStatOut(**result_dict)
+                    return result
         except Exception as e:
-            print(f"Exception occurred: {e}")
+            logger.error(f"Exception occurred: {e}")
             raise HTTPException(
                 status_code=500, detail="Internal Server Error"
             )
 
-    def get_all_vehicle_stat_by_id(
-        self, vehicle_id: int
-    ) -> Optional[list[VehicleStatOut]]:
+    async def get_all_vehicle_stat_by_id(
+        self,
+        vehicle_id: int,
+        limit: int = DEFAULT_PAGE_SIZE,
+        after: Optional[str] = None,
+    ) -> Tuple[List[VehicleStatOut], Optional[str]]:
+        """
+        Returns one page of a vehicle's stats, newest first, plus the
+        cursor for the next page (None on the last page)
+        """
+        after_id = decode_cursor(after, int)[0] if after else None
+        query = f"SELECT {VEHICLE_STAT_COLUMNS} FROM vehicle_stats WHERE vehicle_id = %s"
+        params = [current_timezone(), vehicle_id]
+        if after_id is not None:
+            query += " AND id < %s"
+            params.append(after_id)
+        query += " ORDER BY id DESC LIMIT %s"
+        params.append(limit + 1)
         try:
-            with pool.connection() as conn:
-                with conn.cursor() as cur:
-                    cur.execute(
-                        """
-                        SELECT * FROM vehicle_stats
-                        WHERE vehicle_id = %s
-                        ORDER BY id DESC
-                        """,
-                        (vehicle_id,),
-                    )
-                    results = cur.fetchall()
-                    vehicles = [
-                        self.result_to_dict(result) for result in results
-                    ]
-                    return [VehicleStatOut(**vehicle) for vehicle in vehicles]
+            async with pool.connection() as conn:
+                async with conn.cursor(
+                    row_factory=model_row(VehicleStatOut)
+                ) as cur:
+                    await cur.execute(query, params)
+                    stats = await cur.fetchall()
+                    return paginate(stats, limit, lambda stat: (stat.id,))
         except Exception:
             raise HTTPException(
                 status_code=500, detail="Internal server error"
@@ -1,10 +1,20 @@
+import logging
+import orjson
 from pydantic import BaseModel, ValidationError
-from typing import Optional, List, Union
+from queries.rows import model_row
+from typing import Optional, List, Tuple, Union
 from fastapi import HTTPException
+from queries.invalidation import cache_invalidation
 from queries.pool import pool
-import pytz
+from queries.tracing import traced_repository
+from utils.pagination import DEFAULT_PAGE_SIZE, decode_cursor, paginate
+from utils.read_cache import ReadThroughCache
+from utils.responses import dumps
+from utils.timezone import current_timezone, local_date_column
 from datetime import date
 
+logger = logging.getLogger(__name__)
+
 
 class Error(BaseModel):
     message: Union[str, None] = None
@@ -34,44 +44,65 @@ class VehicleOut(BaseModel):
     created_date: date
 
 
-class VehicleRepository:
-    def result_to_dict(self, result):
-        if result:
-            utc_time = result[8]
-            local_date = self.convert_to_pst_date(utc_time)
-            return {
-                "id": result[0],
-                "vehicle_name": result[1],
-                "year": result[2],
-                "make": result[3],
-                "model": result[4],
-                "vin": result[5],
-                "mileage": result[6],
-                "about": result[7],
-                "created_date": local_date,
-                "user_id": result[9],
-            }
-        else:
-            return None
+# Named to match VehicleOut, rows are decoded straight into it with
+# model_row. Casts mirror the model: mileage is stored as varchar.
+VEHICLE_COLUMNS = f"""
+    id, vehicle_name, year, make, model, vin, mileage::int AS mileage,
+    about, user_id, {local_date_column("created_date")}
+"""
+
+
+def _dump_vehicle_page(page: Tuple[List[VehicleOut], Optional[str]]) -> bytes:
+    return dumps(page)
+
+
+def _load_vehicle_page(raw: bytes) -> Tuple[List[VehicleOut], Optional[str]]:
+    vehicles, next_cursor = orjson.loads(raw)
+    return [VehicleOut(**vehicle) for vehicle in vehicles], next_cursor
+
+
+vehicle_list_cache = ReadThroughCache(
+    "vehicle_lists", dumps=_dump_vehicle_page, loads=_load_vehicle_page
+)
+# The list ETag's (max row_version, count). Same name and backend as the
+# list cache, so it shares the per-user generation and every invalidation
+# of a user's pages drops it too
+vehicle_version_cache = ReadThroughCache(
+    vehicle_list_cache.name,
+    backend=vehicle_list_cache.backend,
+    dumps=orjson.dumps,
+    loads=lambda raw: tuple(orjson.loads(raw)),
+)
+
+
+async def _evict_vehicle_lists(user_ids: Optional[List[int]]):
+    if user_ids is None:
+        await vehicle_list_cache.clear()
+        return
+    for user_id in user_ids:
+        await vehicle_list_cache.invalidate(str(user_id))
 
-    def convert_to_pst_date(self, utc_time):
-        utc = pytz.utc
-        pst = pytz.timezone("America/Los_Angeles")
-        utc_dt = utc.localize(utc_time)
-        pst_dt = utc_dt.astimezone(pst)
-        return pst_dt.date()
 
-    def create_vehicle(self, vehicle_data: dict) -> Optional[VehicleOut]:
+# Writes made by other workers arrive as NOTIFYs on the vehicles table
+if not vehicle_list_cache.backend.shared:
+    cache_invalidation.subscribe("vehicles", _evict_vehicle_lists)
+
+
+@traced_repository
+class VehicleRepository:
+    async def create_vehicle(self, vehicle_data: dict) -> Optional[VehicleOut]:
         try:
-            with pool.connection() as conn:
-                with conn.cursor() as cur:
-                    cur.execute(
-                        """
+            async with pool.connection() as conn:
+                async with conn.cursor(
+                    row_factory=model_row(VehicleOut)
+                ) as cur:
+                    await cur.execute(
+                        f"""
                         INSERT INTO vehicles
                           (vehicle_name, year, make, model, vin, mileage, about, user_id)
                         VALUES
                           (%s, %s, %s, %s, %s, %s, %s, %s)
-                        RETURNING id, vehicle_name, year, make, model, vin, mileage, about, created_date, user_id;
+                        RETURNING {VEHICLE_COLUMNS};
                         """,
                         [
                             vehicle_data["vehicle_name"],
@@ -82,82 +113,234 @@ class VehicleRepository:
                             vehicle_data["mileage"],
                             vehicle_data["about"],
                             vehicle_data["user_id"],
+                            current_timezone(),
                         ],
                     )
-                    result = cur.fetchone()
-                    if result:
-                        result_dict = self.result_to_dict(result)
-                        return VehicleOut(**result_dict)
-                    else:
-                        print("No result found")
-                        return None
+                    result = await cur.fetchone()
+            if result:
+                await vehicle_list_cache.invalidate(str(result.user_id))
+                return result
+            else:
+                logger.debug(
+                    "No vehicle returned for user %s", vehicle_data["user_id"]
+                )
+                return None
         except ValidationError as e:
-            print(f"Failed to create vehicle: {e}")
+            logger.warning(f"Failed to create vehicle: {e}")
             return None
 
-    def get_vehicle_by_id(self, vehicle_id: int) -> Optional[VehicleOut]:
+    async def create_vehicles(
+        self, vehicles: List[VehicleIn], user_id: int
+    ) -> List[VehicleOut]:
+        """
+        Inserts a batch of vehicles for user_id with one multi-row INSERT,
+        so the whole batch is a single round trip and commits or fails as
+        a unit. Vehicles come back in the order they were sent.
+        """
+        rows = ", ".join(["(%s, %s, %s, %s, %s, %s, %s, %s)"] * len(vehicles))
+        values = []
+        for vehicle in vehicles:
+            values += [
+                vehicle.vehicle_name,
+                vehicle.year,
+                vehicle.make,
+                vehicle.model,
+                vehicle.vin,
+                vehicle.mileage,
+                vehicle.about,
+                user_id,
+            ]
+        values.append(current_timezone())
+        try:
+            async with pool.connection() as conn:
+                async with conn.cursor(
+                    row_factory=model_row(VehicleOut)
+                ) as cur:
+                    await cur.execute(
+                        f"""
+                        INSERT INTO vehicles
+                          (vehicle_name, year, make, model, vin, mileage, about, user_id)
+                        VALUES
+                          {rows}
+                        RETURNING {VEHICLE_COLUMNS};
+                        """,
+                        values,
+                    )
+                    results = await cur.fetchall()
+        except Exception as e:
+            logger.error(f"Failed to create vehicles: {e}")
+            raise HTTPException(
+                status_code=500, detail="Failed to create vehicles"
+            )
+        await vehicle_list_cache.invalidate(str(user_id))
+        # Serial ids are handed out in VALUES order
+        return sorted(results, key=lambda vehicle: vehicle.id)
+
+    async def get_vehicle_by_id(self, vehicle_id: int) -> Optional[VehicleOut]:
         try:
-            with pool.connection() as conn:
-                with conn.cursor() as cur:
-                    cur.execute(
-                        "SELECT * FROM vehicles WHERE id = %s", (vehicle_id,)
+            async with pool.connection() as conn:
+                async with conn.cursor(
+                    row_factory=model_row(VehicleOut)
+                ) as cur:
+                    await cur.execute(
+                        f"SELECT {VEHICLE_COLUMNS} FROM vehicles WHERE id = %s",
+                        (current_timezone(), vehicle_id),
                     )
-                    result = cur.fetchone()
-                    if result is None:
-                        return None
-                    result_dict = self.result_to_dict(result)
-                    return VehicleOut(**result_dict)
+                    return await cur.fetchone()
+        except Exception as ex:
+            logger.error(f"Error getting vehicle ID {vehicle_id}: {ex}")
+            raise HTTPException(
+                status_code=500, detail="Internal server error"
+            )
+
+    async def get_vehicle_version(
+        self, vehicle_id: int
+    ) -> Optional[Tuple[int, int]]:
+        """
+        Returns (user_id, row_version) for a vehicle, the ETag input for
+        GET /vehicles/{vehicle_id}, or None if it doesn't exist
+        """
+        try:
+            async with pool.connection() as conn:
+                cur = await conn.execute(
+                    "SELECT user_id, row_version FROM vehicles WHERE id = %s",
+                    (vehicle_id,),
+                )
+                return await cur.fetchone()
+        except Exception as ex:
+            logger.error(
+                f"Error getting version of vehicle ID {vehicle_id}: {ex}"
+            )
+            raise HTTPException(
+                status_code=500, detail="Internal server error"
+            )
+
+    async def get_user_vehicles_version(self, user_id: int) -> Tuple[int, int]:
+        """
+        Returns (max row_version, vehicle count) for a user's vehicles.
+        Every insert or update raises the max and every delete lowers the
+        count, so together they change whenever the list does.
+
+        Cached alongside the user's pages, so a warm conditional GET
+        doesn't touch Postgres
+        """
+        return await vehicle_version_cache.get_or_load(
+            str(user_id),
+            "version",
+            lambda: self._fetch_user_vehicles_version(user_id),
+        )
+
+    async def _fetch_user_vehicles_version(
+        self, user_id: int
+    ) -> Tuple[int, int]:
+        try:
+            async with pool.connection() as conn:
+                cur = await conn.execute(
+                    """
+                    SELECT coalesce(max(row_version), 0), count(*)
+                    FROM vehicles WHERE user_id = %s
+                    """,
+                    (user_id,),
+                )
+                return await cur.fetchone()
         except Exception as ex:
-            print(f"Error getting vehicle ID {vehicle_id}: {ex}")
+            logger.error(
+                f"Error getting vehicles version of USER ID {user_id}: {ex}"
+            )
             raise HTTPException(
                 status_code=500, detail="Internal server error"
             )
 
-    def get_all_vehicles(self) -> Optional[list[VehicleOut]]:
+    async def get_all_vehicles(
+        self, limit: int = DEFAULT_PAGE_SIZE, after: Optional[str] = None
+    ) -> Tuple[List[VehicleOut], Optional[str]]:
+        """
+        Returns one page of vehicles ordered by id, plus the cursor for
+        the next page (None on the last page)
+        """
+        after_id = decode_cursor(after, int)[0] if after else None
+        query = f"SELECT {VEHICLE_COLUMNS} FROM vehicles"
+        params = [current_timezone()]
+        if after_id is not None:
+            query += " WHERE id > %s"
+            params.append(after_id)
+        query += " ORDER BY id LIMIT %s"
+        params.append(limit + 1)
         try:
-            with pool.connection() as conn:
-                with conn.cursor() as cur:
-                    cur.execute("SELECT * FROM vehicles")
-                    results = cur.fetchall()
-                    vehicles = [
-                        self.result_to_dict(result) for result in results
-                    ]
-                    return [VehicleOut(**vehicle) for vehicle in vehicles]
+            async with pool.connection() as conn:
+                async with conn.cursor(
+                    row_factory=model_row(VehicleOut)
+                ) as cur:
+                    await cur.execute(query, params)
+                    vehicles = await cur.fetchall()
+                    return paginate(vehicles, limit, lambda v: (v.id,))
         except Exception:
             raise HTTPException(
                 status_code=500, detail="Internal server error"
             )
 
-    def get_vehicles_by_user_id(self, user_id: int) -> List[VehicleOut]:
+    async def get_vehicles_by_user_id(
+        self,
+        user_id: int,
+        limit: int = DEFAULT_PAGE_SIZE,
+        after: Optional[str] = None,
+    ) -> Tuple[List[VehicleOut], Optional[str]]:
+        """
+        Returns one page of a user's vehicles ordered by id, plus the
+        cursor for the next page (None on the last page)
+
+        Pages are served from vehicle_list_cache, writes below invalidate
+        the owner's pages
+        """
+        return await vehicle_list_cache.get_or_load(
+            str(user_id),
+            f"{current_timezone()}:{limit}:{after or ''}",
+            lambda: self._fetch_vehicles_by_user_id(user_id, limit, after),
+        )
+
+    async def _fetch_vehicles_by_user_id(
+        self, user_id: int, limit: int, after: Optional[str]
+    ) -> Tuple[List[VehicleOut], Optional[str]]:
+        after_id = decode_cursor(after, int)[0] if after else None
+        query = f"SELECT {VEHICLE_COLUMNS} FROM vehicles WHERE user_id = %s"
+        params = [current_timezone(), user_id]
+        if after_id is not None:
+            query += " AND id > %s"
+            params.append(after_id)
+        query += " ORDER BY id LIMIT %s"
+        params.append(limit + 1)
         try:
-            with pool.connection() as conn:
-                with conn.cursor() as cur:
-                    cur.execute(
-                        "SELECT * FROM vehicles WHERE user_id = %s", (user_id,)
-                    )
-                    results = cur.fetchall()
-                    if not results:
+            async with pool.connection() as conn:
+                async with conn.cursor(
+                    row_factory=model_row(VehicleOut)
+                ) as cur:
+                    await cur.execute(query, params)
+                    vehicles = await cur.fetchall()
+                    if not vehicles:
                         # Log and return an empty list instead of raising an HTTPException
-                        print(f"No vehicles found for USER ID {user_id}.")
-                        return []
-                    return [
-                        VehicleOut(**self.result_to_dict(result))
-                        for result in results
-                    ]
+                        logger.debug(
+                            "No vehicles found for USER ID %s", user_id
+                        )
+                        return [], None
+                    return paginate(vehicles, limit, lambda v: (v.id,))
         except Exception as ex:
-            print(f"Error fetching vehicles for user_id {user_id}: {ex}")
+            logger.error(
+                f"Error fetching vehicles for user_id {user_id}: {ex}"
+            )
             raise HTTPException(
                 status_code=500, detail="Internal server error"
             )
 
-    def update_vehicle(
+    async def update_vehicle(
         self, vehicle_id: int, vehicle: VehicleIn
     ) -> Optional[VehicleOut]:
         try:
-            with pool.connection() as conn:
-                with conn.cursor() as cur:
-                    cur.execute(
-                        """
+            async with pool.connection() as conn:
+                async with conn.cursor(
+                    row_factory=model_row(VehicleOut)
+                ) as cur:
+                    await cur.execute(
+                        f"""
                         UPDATE vehicles
                         SET
                           vehicle_name = %s,
@@ -168,7 +351,7 @@ class VehicleRepository:
                           mileage = %s,
                           about = %s
                         WHERE id = %s
-                        RETURNING id, vehicle_name, year, make, model, vin, mileage, about, created_date, user_id;
+                        RETURNING {VEHICLE_COLUMNS};
                         """,
                         [
                             vehicle.vehicle_name,
@@ -179,37 +362,40 @@ class VehicleRepository:
                             vehicle.mileage,
                             vehicle.about,
                             vehicle_id,
+                            current_timezone(),
                         ],
                     )
-                    result = cur.fetchone()
-                    if result is not None:
-                        result_dict = self.result_to_dict(result)
-                        return VehicleOut(**result_dict)
-                    else:
-                        print(f"No vehicle found with ID {vehicle_id}")
-                        return None
+                    result = await cur.fetchone()
+            if result is not None:
+                await vehicle_list_cache.invalidate(str(result.user_id))
+                return result
+            else:
+                logger.debug("No vehicle found with ID %s", vehicle_id)
+                return None
         except ValidationError as e:
-            print(f"Failed to update vehicle: {e}")
+            logger.warning(f"Failed to update vehicle: {e}")
             return None
         except Exception as e:
-            print(f"Unexpected error while updating vehicle: {e}")
+            logger.error(f"Unexpected error while updating vehicle: {e}")
             return None
 
-    def delete_vehicle(self, vehicle_id: int) -> Optional[VehicleOut]:
+    async def delete_vehicle(self, vehicle_id: int) -> Optional[VehicleOut]:
         try:
-            with pool.connection() as conn:
-                with conn.cursor() as cur:
-                    cur.execute(
-                        "DELETE FROM vehicles WHERE id = %s RETURNING *",
-                        (vehicle_id,),
+            async with pool.connection() as conn:
+                async with conn.cursor(
+                    row_factory=model_row(VehicleOut)
+                ) as cur:
+                    await cur.execute(
+                        f"DELETE FROM vehicles WHERE id = %s RETURNING {VEHICLE_COLUMNS}",
+                        (vehicle_id, current_timezone()),
                     )
-                    result = cur.fetchone()
-                    if result:
-                        result_dict = self.result_to_dict(result)
-                        return VehicleOut(**result_dict)
-                    else:
-                        print(f"Vehicle ID {vehicle_id} does not exist.")
-                        return None
+                    result = await cur.fetchone()
+            if result:
+                await vehicle_list_cache.invalidate(str(result.user_id))
+                return result
+            else:
+                logger.debug("Vehicle ID %s does not exist.", vehicle_id)
+                return None
         except Exception:
-            print(f"Error deleting vehicle ID {vehicle_id}")
+            logger.exception(f"Error deleting vehicle ID {vehicle_id}")
             return None
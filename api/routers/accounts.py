@@ -14,16 +14,24 @@ from queries.accounts import (
     CheckAccountOut,
     CheckEmail,
     UpdatePasswordIn,
+    UpdateTimezoneIn,
 )
 from typing import Optional
-from utils.authentication import try_get_jwt_user_data
+from utils.authentication import (
+    generate_jwt,
+    get_jwt_token,
+    try_get_jwt_payload,
+    try_get_jwt_user_data,
+    verified_tokens,
+)
+from utils.revocation import revocation_store
+from utils.timezone import is_valid_timezone
 from config import oauth2_scheme
-from models.jwt import JWTUserData
-from main import limiter
+from models.jwt import JWTPayload, JWTUserData
+from utils.rate_limiting import limiter
 
 
 router = APIRouter(tags=["Accounts"])
-blacklisted_tokens = set()
 
 
 class DuplicateAccountError(Exception):
@@ -35,13 +43,13 @@ class DuplicateAccountError(Exception):
     response_model=Optional[AccountOut],
 )
 @limiter.limit("10/minute")
-def get_single_user(
+async def get_single_user(
     request: Request,
     username: str,
     response: Response,
     repo: AccountRepo = Depends(),
 ) -> AccountOut:
-    user = repo.get_single_user(username)
+    user = await repo.get_single_user(username)
     if user:
         return user
     else:
@@ -53,12 +61,12 @@ def get_single_user(
     response_model=Optional[CheckAccountOut],
 )
 @limiter.limit("10/minute")
-def check_single_user(
+async def check_single_user(
     request: Request,
     username: str,
     repo: AccountRepo = Depends(),
 ) -> CheckAccountOut:
-    user = repo.check_single_user(username)
+    user = await repo.check_single_user(username)
     if user:
         return user
     else:
@@ -70,12 +78,12 @@ def check_single_user(
     response_model=Optional[CheckEmail],
 )
 @limiter.limit("10/minute")
-def check_user_email(
+async def check_user_email(
     request: Request,
     email: str,
     repo: AccountRepo = Depends(),
 ) -> CheckEmail:
-    current_email = repo.check_user_email(email)
+    current_email = await repo.check_user_email(email)
     if current_email:
         return current_email
     else:
@@ -105,7 +113,7 @@ async def update_password(
         )
 
     # Proceed to update the password
-    updated_account = repo.update_user_password(
+    updated_account = await repo.update_user_password(
         username=update_password_data.username,
         current_password=update_password_data.current_password,
         new_password=update_password_data.new_password,
@@ -113,23 +121,74 @@ async def update_password(
     return updated_account
 
 
-def is_token_blacklisted(token: str):
-    return token in blacklisted_tokens
+@router.put(
+    "/account/timezone",
+    dependencies=[Depends(oauth2_scheme)],
+)
+@limiter.limit("10/minute")
+async def update_timezone(
+    request: Request,
+    response: Response,
+    update_timezone_data: UpdateTimezoneIn,
+    current_user: JWTUserData = Depends(try_get_jwt_user_data),
+    repo: AccountRepo = Depends(),
+):
+    if not current_user:
+        raise HTTPException(status_code=401, detail="Unauthorized")
+    if not is_valid_timezone(update_timezone_data.timezone):
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail=f"Unknown timezone {update_timezone_data.timezone}",
+        )
+
+    account = await repo.update_user_timezone(
+        current_user.id, update_timezone_data.timezone
+    )
+    if not account:
+        raise HTTPException(status_code=404, detail="User not found.")
+
+    # The timezone travels in the token, so hand back one that carries
+    # the new value
+    token = generate_jwt(account)
+    if request.cookies.get("fast_api_token"):
+        response.set_cookie(
+            key="fast_api_token",
+            value=token,
+            httponly=True,
+            samesite="lax",
+            secure=request.url.scheme == "https",
+        )
+    return {
+        "timezone": account.timezone,
+        "access_token": token,
+        "token_type": "bearer",
+    }
 
 
 @router.post(
     "/logout",
-    dependencies=[
-        Depends(try_get_jwt_user_data),
-        Depends(oauth2_scheme),
-    ],
+    dependencies=[Depends(oauth2_scheme)],
 )
-async def user_logout(token: str):
-    if is_token_blacklisted(token):
+async def user_logout(
+    token: Optional[str] = Depends(get_jwt_token),
+    payload: Optional[JWTPayload] = Depends(try_get_jwt_payload),
+):
+    # Revoked tokens don't decode, so a second logout lands here too
+    if not payload:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Token invalid or already revoked",
+        )
+    if not payload.jti:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="This token predates revocation support, sign in again",
+        )
+    revoked = await revocation_store.revoke(payload.jti, payload.exp)
+    verified_tokens.pop(token)
+    if not revoked:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Token already revoked",
         )
-    else:
-        blacklisted_tokens.add(token)
-        return {"message": "Logout successful"}
+    return {"message": "Logout successful"}
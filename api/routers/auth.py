@@ -11,7 +11,7 @@ from queries.user_queries import UserQueries
 from models.users import UserRequest, UserResponse
 from queries.accounts import AccountRepo
 from config import oauth2_scheme
-from main import limiter
+from utils.rate_limiting import limiter
 from utils.exceptions import UserDatabaseException
 from utils.authentication import (
     try_get_jwt_user_data,
@@ -32,10 +32,10 @@ async def signup(
     queries: UserQueries = Depends(),
 ) -> UserResponse:
     new_user.username = new_user.username.lower()
-    hashed_password = hash_password(new_user.password)
+    hashed_password = await hash_password(new_user.password)
 
     try:
-        user = queries.create_user(new_user, hashed_password)
+        user = await queries.create_user(new_user, hashed_password)
     except UserDatabaseException as e:
         print(e)
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED)
@@ -61,8 +61,10 @@ async def login_for_access_token(
     form_data: OAuth2PasswordRequestForm = Depends(),
     repo: AccountRepo = Depends(),
 ):
-    user = repo.get_single_user(form_data.username)
-    if not user or not verify_password(form_data.password, user.password):
+    user = await repo.get_single_user(form_data.username)
+    if not user or not await verify_password(
+        form_data.password, user.password
+    ):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect username or password",
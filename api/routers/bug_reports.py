@@ -10,7 +10,7 @@ from pydantic import ValidationError
 from utils.authentication import try_get_jwt_user_data
 from models.jwt import JWTUserData
 from config import oauth2_scheme
-from main import limiter
+from utils.rate_limiting import limiter
 
 tags_metadata = [
     {
@@ -28,7 +28,7 @@ router = APIRouter(tags=["Bug Reports"])
     dependencies=[Depends(oauth2_scheme)],
 )
 @limiter.limit("3/minute")
-def create_bug_report(
+async def create_bug_report(
     request: Request,
     bug_report: BugReportIn,
     repo: BugQueries = Depends(),
@@ -41,7 +41,7 @@ def create_bug_report(
     bug_report_data["user_id"] = current_user.id
 
     try:
-        created_bug_report = repo.create_bug_report(bug_report_data)
+        created_bug_report = await repo.create_bug_report(bug_report_data)
         if create_bug_report:
             return created_bug_report
         else:
@@ -0,0 +1,176 @@
+"""
+/metrics in the Prometheus text format, see utils/metrics.py
+
+Scrapes must send `Authorization: Bearer <METRICS_TOKEN>`, the numbers
+include per-route traffic and pool internals. Without METRICS_TOKEN set
+the endpoint answers 404, so a deployment that never configured it
+doesn't publish them.
+"""
+
+import hmac
+import os
+import sys
+
+from fastapi import APIRouter, HTTPException, Request, status
+from fastapi.responses import PlainTextResponse
+
+from utils.metrics import registry, single
+
+METRICS_TOKEN = os.environ.get("METRICS_TOKEN")
+
+router = APIRouter(tags=["Metrics"])
+
+# psycopg_pool get_stats() key -> (metric, type, help). Only keys with a
+# non-zero value are reported by the pool, missing ones are 0
+POOL_STATS = {
+    "pool_size": ("db_pool_connections", "gauge", "Connections open"),
+    "pool_available": (
+        "db_pool_connections_idle",
+        "gauge",
+        "Connections idle in the pool",
+    ),
+    "pool_max": ("db_pool_max_connections", "gauge", "Pool max_size"),
+    "requests_waiting": (
+        "db_pool_requests_waiting",
+        "gauge",
+        "Checkouts currently waiting for a connection",
+    ),
+    "requests_num": (
+        "db_pool_requests_total",
+        "counter",
+        "Connections requested from the pool",
+    ),
+    "requests_queued": (
+        "db_pool_requests_queued_total",
+        "counter",
+        "Checkouts that had to wait for a connection",
+    ),
+    "requests_wait_ms": (
+        "db_pool_requests_wait_milliseconds_total",
+        "counter",
+        "Total time checkouts spent waiting",
+    ),
+    "requests_errors": (
+        "db_pool_requests_errors_total",
+        "counter",
+        "Checkouts that timed out or failed",
+    ),
+    "usage_ms": (
+        "db_pool_usage_milliseconds_total",
+        "counter",
+        "Total time connections were checked out",
+    ),
+    "connections_num": (
+        "db_pool_connects_total",
+        "counter",
+        "Connections opened to Postgres",
+    ),
+    "connections_errors": (
+        "db_pool_connect_errors_total",
+        "counter",
+        "Failed attempts to open a connection",
+    ),
+    "connections_lost": (
+        "db_pool_connections_lost_total",
+        "counter",
+        "Connections found broken on checkout",
+    ),
+}
+
+
+@registry.collector
+def collect_pool_stats():
+    # Imported on scrape, like the other collectors, so importing this
+    # router stays cheap under LAZY_INIT
+    from queries.pool import pool
+
+    stats = pool.get_stats()
+    for key, (name, kind, help) in POOL_STATS.items():
+        yield single(name, kind, help, stats.get(key, 0))
+    in_use = stats.get("pool_size", 0) - stats.get("pool_available", 0)
+    yield single(
+        "db_pool_connections_in_use",
+        "gauge",
+        "Connections checked out",
+        in_use,
+    )
+
+
+@registry.collector
+def collect_worker_stats():
+    from utils.password_hashing import password_hashing_pool
+    from utils.rate_limiting import limiter, rate_limit_storage
+
+    hashing = password_hashing_pool.stats()
+    yield single(
+        "password_hashing_pending",
+        "gauge",
+        "bcrypt calls queued or running",
+        hashing["pending"],
+    )
+    yield single(
+        "password_hashing_completed_total",
+        "counter",
+        "bcrypt calls finished",
+        hashing["completed"],
+    )
+    yield single(
+        "password_hashing_rejected_total",
+        "counter",
+        "bcrypt calls turned away with a 503",
+        hashing["rejected"],
+    )
+
+    strategy = getattr(limiter.limiter, "strategy", None)
+    if hasattr(strategy, "__len__"):
+        yield single(
+            "rate_limit_buckets", "gauge", "Token buckets held", len(strategy)
+        )
+    if hasattr(rate_limit_storage, "sync_errors"):
+        yield single(
+            "rate_limit_sync_errors_total",
+            "counter",
+            "Failed rate limit counter syncs",
+            rate_limit_storage.sync_errors,
+        )
+
+
+@registry.collector
+def collect_log_stats():
+    from utils.log import log_queue_handler, log_sampling
+
+    yield "log_records_dropped_total", "counter", "Log records not written", [
+        ("", {"reason": "queue_full"}, log_queue_handler.dropped),
+        ("", {"reason": "sampled"}, log_sampling.dropped),
+    ]
+
+
+@registry.collector
+def collect_cache_stats():
+    # Only once the vehicles queries are loaded, rather than import them
+    # just to report an empty cache
+    vehicles = sys.modules.get("queries.vehicles")
+    if vehicles is None:
+        return
+    cache = vehicles.vehicle_list_cache
+    stats = cache.stats()
+    for key in ("hits", "misses", "invalidations", "errors"):
+        yield single(
+            f"read_cache_{key}_total",
+            "counter",
+            f"Read cache {key}",
+            stats[key],
+            cache=cache.name,
+        )
+
+
+@router.get("/metrics", include_in_schema=False)
+async def metrics(request: Request):
+    if not METRICS_TOKEN:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND)
+    supplied = request.headers.get("authorization", "")
+    if not hmac.compare_digest(supplied, f"Bearer {METRICS_TOKEN}"):
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED)
+    return PlainTextResponse(
+        registry.render(), media_type="text/plain; version=0.0.4"
+    )
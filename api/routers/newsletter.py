@@ -12,7 +12,7 @@ from pydantic import ValidationError
 from utils.authentication import try_get_jwt_user_data
 from models.jwt import JWTUserData
 from config import oauth2_scheme
-from main import limiter
+from utils.rate_limiting import limiter
 
 tags_metadata = [
     {
@@ -29,13 +29,13 @@ router = APIRouter(tags=["Newsletter Subscriber List"], prefix="/api")
     response_model=Union[NewsletterEmailOut, Error],
 )
 @limiter.limit("1/minute")
-def store_subscriber_email(
+async def store_subscriber_email(
     request: Request,
     subscriber_email: NewsletterEmailIn,
     repo: NewsLetterEmails = Depends(),
 ):
     try:
-        stored_email = repo.store_subscriber_email(subscriber_email)
+        stored_email = await repo.store_subscriber_email(subscriber_email)
         if stored_email:
             return stored_email
         raise HTTPException(
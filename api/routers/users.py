@@ -10,4 +10,4 @@ router = APIRouter()
 
 @router.get("/users", response_model=List[UserOut])
 async def get_users(users: UserRepository = Depends()):
-    return users.get_all()
+    return await users.get_all()
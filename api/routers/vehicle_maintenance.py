@@ -1,24 +1,41 @@
 from fastapi import (
     APIRouter,
     Depends,
+    Query,
     Response,
     HTTPException,
     status,
     Request,
+    UploadFile,
 )
-from typing import Union, List
+from typing import AsyncIterator, List, Literal, Optional, Union
+from fastapi.responses import StreamingResponse
 from queries.vehicle_maintenance import (
+    MaintenanceImportResult,
+    MaintenanceImportRowError,
     VehicleMaintenanceIn,
     VehicleMaintenanceOut,
     VehicleMaintenanceRepo,
 )
-from queries.vehicles import VehicleRepository
 from pydantic import ValidationError, BaseModel
 from config import oauth2_scheme
 from models.jwt import JWTUserData
 from utils.authentication import try_get_jwt_user_data
-from main import limiter
-
+from utils.exceptions import (
+    PermissionDeniedException,
+    RecordNotFoundException,
+)
+from utils.pagination import (
+    DEFAULT_PAGE_SIZE,
+    MAX_PAGE_SIZE,
+    set_next_page_headers,
+)
+from utils.etag import etag_matches, make_etag, not_modified, set_etag
+from utils.responses import FastJSONResponse
+from utils.rate_limiting import limiter
+import csv
+import io
+import json
 
 tags_metadata = [
     {
@@ -27,8 +44,13 @@ tags_metadata = [
     },
 ]
 
+# Every route returns dates, try_get_jwt_user_data renders them in the
+# caller's timezone. FastAPI runs it once per request even when the
+# route depends on it too
 router = APIRouter(
-    tags=["Vehicles Maintenance"], prefix="/api/vehicle-maintenance"
+    tags=["Vehicles Maintenance"],
+    prefix="/api/vehicle-maintenance",
+    dependencies=[Depends(try_get_jwt_user_data)],
 )
 
 
@@ -42,7 +64,7 @@ class Error(BaseModel):
     dependencies=[Depends(oauth2_scheme)],
 )
 @limiter.limit("5/minute")
-def create_maintenance_log(
+async def create_maintenance_log(
     request: Request,
     vehicle: VehicleMaintenanceIn,
     response: Response,
@@ -52,7 +74,7 @@ def create_maintenance_log(
     if not current_user:
         return HTTPException(status_code=401, detail="Unauthorized")
     try:
-        create_maintenance_log = repo.create_maintenance_log(vehicle)
+        create_maintenance_log = await repo.create_maintenance_log(vehicle)
         if create_maintenance_log:
             return create_maintenance_log
         else:
@@ -65,13 +87,97 @@ def create_maintenance_log(
         raise HTTPException(status_code=500, detail=str(e))
 
 
+MAX_IMPORT_ROWS = 50_000
+
+
+def _parse_import_records(upload: UploadFile, raw: bytes) -> list:
+    """
+    Turns an uploaded CSV (with a header row) or JSON array into a list
+    of dicts, one per maintenance log
+    """
+    text = raw.decode("utf-8-sig")
+    filename = (upload.filename or "").lower()
+    if filename.endswith(".csv") or upload.content_type == "text/csv":
+        return list(csv.DictReader(io.StringIO(text)))
+    records = json.loads(text)
+    if not isinstance(records, list):
+        raise ValueError("JSON uploads must be an array of objects")
+    return records
+
+
+def _validate_import_records(records: list):
+    """
+    Validates every record, collecting errors instead of stopping at the
+    first one. Row numbers are 1-based and skip the CSV header.
+    """
+    logs, errors = [], []
+    for row, record in enumerate(records, start=1):
+        try:
+            logs.append((row, VehicleMaintenanceIn.model_validate(record)))
+        except ValidationError as e:
+            details = "; ".join(
+                f"{'.'.join(map(str, err['loc'])) or 'row'}: {err['msg']}"
+                for err in e.errors()
+            )
+            errors.append(MaintenanceImportRowError(row=row, error=details))
+    return logs, errors
+
+
+@router.post(
+    "/import",
+    response_model=MaintenanceImportResult,
+    dependencies=[Depends(oauth2_scheme)],
+)
+@limiter.limit("5/minute")
+async def import_maintenance_logs(
+    request: Request,
+    response: Response,
+    file: UploadFile,
+    maintenance_repo: VehicleMaintenanceRepo = Depends(),
+    current_user: JWTUserData = Depends(try_get_jwt_user_data),
+) -> MaintenanceImportResult:
+    """
+    Imports a CSV or JSON array of maintenance logs in one transaction
+
+    The whole file is rejected with a 422 and per-row errors if any row
+    fails validation or references another user's vehicle.
+    """
+    if not current_user:
+        raise HTTPException(status_code=401, detail="Unauthorized")
+
+    try:
+        records = _parse_import_records(file, await file.read())
+    except (ValueError, csv.Error) as e:
+        raise HTTPException(
+            status_code=400, detail=f"Could not parse upload: {e}"
+        )
+    if not records:
+        raise HTTPException(status_code=400, detail="Upload has no rows")
+    if len(records) > MAX_IMPORT_ROWS:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Uploads are limited to {MAX_IMPORT_ROWS} rows",
+        )
+
+    logs, errors = _validate_import_records(records)
+    if errors:
+        result = MaintenanceImportResult(imported=0, errors=errors)
+    else:
+        result = await maintenance_repo.import_maintenance_logs(
+            logs, current_user.id
+        )
+    if result.errors:
+        response.status_code = status.HTTP_422_UNPROCESSABLE_ENTITY
+    return result
+
+
 @router.get(
     "/maintenance-log/{vehicle_id}",
     response_model=Union[VehicleMaintenanceOut, Error],
     dependencies=[Depends(oauth2_scheme)],
 )
 @limiter.limit("10/minute")
-def retrieve_vehicle_maintenance_log_by_vehicle_id(
+async def retrieve_vehicle_maintenance_log_by_vehicle_id(
     request: Request,
     response: Response,
     vehicle_id: int,
@@ -79,7 +185,7 @@ def retrieve_vehicle_maintenance_log_by_vehicle_id(
 ) -> Union[VehicleMaintenanceOut, Error]:
     try:
         vehicle_maintenance_log = (
-            vehicle_repo.get_maintenance_log_by_vehicle_id(vehicle_id)
+            await vehicle_repo.get_maintenance_log_by_vehicle_id(vehicle_id)
         )
         if not vehicle_maintenance_log:
             response.status_code = status.HTTP_404_NOT_FOUND
@@ -113,17 +219,33 @@ def retrieve_vehicle_maintenance_log_by_vehicle_id(
     dependencies=[Depends(oauth2_scheme)],
 )
 @limiter.limit("20/minute")
-def retrieve_all_vehicle_maintenance_logs_by_vehicle_id(
+async def retrieve_all_vehicle_maintenance_logs_by_vehicle_id(
     request: Request,
     response: Response,
     vehicle_id: int,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    after: Optional[str] = None,
     vehicle_repo: VehicleMaintenanceRepo = Depends(),
 ) -> List[VehicleMaintenanceOut] | None:
     try:
-        vehicle_maintenance_log = (
-            vehicle_repo.get_all_maintenance_log_by_vehicle_id(vehicle_id)
+        version = await vehicle_repo.get_maintenance_version(vehicle_id)
+        etag = make_etag(request, version)
+        if etag_matches(request, etag):
+            return not_modified(etag)
+        vehicle_maintenance_log, next_cursor = (
+            await vehicle_repo.get_all_maintenance_log_by_vehicle_id(
+                vehicle_id, limit, after
+            )
         )
-        return vehicle_maintenance_log
+        # Rows are already VehicleMaintenanceOut, skip response_model
+        # re-validation
+        page = FastJSONResponse(vehicle_maintenance_log)
+        set_next_page_headers(request, page, next_cursor)
+        set_etag(page, etag)
+        return page
+    except HTTPException:
+        # Bad cursors (400) and repository failures already carry a status
+        raise
     except Exception as e:
         print(
             f"Failed to grab vehicle ID {vehicle_id} maintenance log due to: {e}"
@@ -132,20 +254,86 @@ def retrieve_all_vehicle_maintenance_logs_by_vehicle_id(
         return None
 
 
+EXPORT_CSV_COLUMNS = list(VehicleMaintenanceOut.model_fields)
+EXPORT_CHUNK_SIZE = 64 * 1024
+
+
+async def _ndjson_lines(
+    logs: AsyncIterator[VehicleMaintenanceOut],
+) -> AsyncIterator[str]:
+    buffer = []
+    size = 0
+    async for log in logs:
+        line = log.model_dump_json() + "\n"
+        buffer.append(line)
+        size += len(line)
+        if size >= EXPORT_CHUNK_SIZE:
+            yield "".join(buffer)
+            buffer, size = [], 0
+    if buffer:
+        yield "".join(buffer)
+
+
+async def _csv_lines(
+    logs: AsyncIterator[VehicleMaintenanceOut],
+) -> AsyncIterator[str]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(EXPORT_CSV_COLUMNS)
+    async for log in logs:
+        writer.writerow(
+            [getattr(log, column) for column in EXPORT_CSV_COLUMNS]
+        )
+        if buffer.tell() >= EXPORT_CHUNK_SIZE:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+@router.get(
+    "/export",
+    response_class=StreamingResponse,
+    dependencies=[Depends(oauth2_scheme)],
+)
+@limiter.limit("5/minute")
+async def export_maintenance_history(
+    request: Request,
+    format: Literal["ndjson", "csv"] = "ndjson",
+    maintenance_repo: VehicleMaintenanceRepo = Depends(),
+    current_user: JWTUserData = Depends(try_get_jwt_user_data),
+) -> StreamingResponse:
+    if not current_user:
+        raise HTTPException(status_code=401, detail="Unauthorized")
+
+    logs = maintenance_repo.stream_maintenance_logs_by_user_id(current_user.id)
+    if format == "csv":
+        body, media_type = _csv_lines(logs), "text/csv"
+    else:
+        body, media_type = _ndjson_lines(logs), "application/x-ndjson"
+    return StreamingResponse(
+        body,
+        media_type=media_type,
+        headers={
+            "Content-Disposition": f'attachment; filename="maintenance-history.{format}"'
+        },
+    )
+
+
 @router.get(
     "/maintenance-log/detail/{maintenance_id}",
     response_model=Union[VehicleMaintenanceOut, Error],
     dependencies=[Depends(oauth2_scheme)],
 )
 @limiter.limit("30/minute")
-def retrieve_maintenance_log_by_maintenance_id(
+async def retrieve_maintenance_log_by_maintenance_id(
     request: Request,
     response: Response,
     maintenance_id: int,
     vehicle_repo: VehicleMaintenanceRepo = Depends(),
 ) -> Union[VehicleMaintenanceOut, Error]:
     try:
-        maintenance_log_id = vehicle_repo.get_maintenance_log_by_log_id(
+        maintenance_log_id = await vehicle_repo.get_maintenance_log_by_log_id(
             maintenance_id
         )
         if not maintenance_log_id:
@@ -184,52 +372,27 @@ async def delete_maintenance_log_id(
     response: Response,
     maintenance_id: int,
     maintenance_repo: VehicleMaintenanceRepo = Depends(),
-    vehicle_repo: VehicleRepository = Depends(),
     current_user: JWTUserData = Depends(try_get_jwt_user_data),
 ) -> Union[VehicleMaintenanceOut, Error]:
     if not current_user:
         raise HTTPException(status_code=401, detail="Unauthorized")
 
-    # Retrieve the maintenance log details
-    existing_maintenance_log = maintenance_repo.get_maintenance_log_by_log_id(
-        maintenance_id
-    )
-
-    if existing_maintenance_log is None:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail=f"Maintenance log with ID {maintenance_id} not found",
+    try:
+        return await maintenance_repo.delete_maintenance_log_by_id(
+            maintenance_id, current_user.id
         )
-
-    # Now retrieve the vehicle associated with this maintenance log
-    vehicle = vehicle_repo.get_vehicle_by_id(
-        existing_maintenance_log.vehicle_id
-    )
-
-    if vehicle is None:
+    except RecordNotFoundException:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
-            detail=f"Vehicle with ID {existing_maintenance_log.vehicle_id} not found",
+            detail=f"Maintenance log with ID {maintenance_id} not found",
         )
-
-    # Check if the current user is the owner of the vehicle
-    if vehicle.user_id != current_user.id:
+    except PermissionDeniedException:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="You do not have permission to delete this maintenance log, please submit a bug report if this is an error.",
         )
-
-    try:
-        deleted_maintenance_log = (
-            maintenance_repo.delete_maintenance_log_by_id(maintenance_id)
-        )
-        if deleted_maintenance_log:
-            return deleted_maintenance_log
-        else:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail=f"Maintenance log with ID {maintenance_id} does not exist.",
-            )
+    except HTTPException:
+        raise
     except Exception as e:
         print(
             f"Failed to delete maintenance log ID {maintenance_id} due to an error: {e}"
@@ -253,54 +416,27 @@ async def update_maintenance_log(
     maintenance_log_id: int,
     maintenance_log: VehicleMaintenanceIn,
     maintenance_repo: VehicleMaintenanceRepo = Depends(),
-    vehicle_repo: VehicleRepository = Depends(),
     current_user: JWTUserData = Depends(try_get_jwt_user_data),
 ) -> Union[VehicleMaintenanceOut, Error]:
     if not current_user:
         raise HTTPException(status_code=401, detail="Unauthorized")
 
-        # Retrieve the maintenance log details
-    existing_maintenance_log = maintenance_repo.get_maintenance_log_by_log_id(
-        maintenance_log_id
-    )
-
-    if existing_maintenance_log is None:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail=f"Maintenance log with ID {maintenance_log_id} not found",
+    try:
+        return await maintenance_repo.update_maintenance_log_by_id(
+            maintenance_log_id, maintenance_log, current_user.id
         )
-
-    # Now retrieve the vehicle associated with this maintenance log
-    vehicle = vehicle_repo.get_vehicle_by_id(
-        existing_maintenance_log.vehicle_id
-    )
-
-    if vehicle is None:
+    except RecordNotFoundException:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
-            detail=f"Vehicle with ID {existing_maintenance_log.vehicle_id} not found",
+            detail=f"Maintenance log with ID {maintenance_log_id} not found",
         )
-
-    # Check if the current user is the owner of the vehicle
-    if vehicle.user_id != current_user.id:
+    except PermissionDeniedException:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="You do not have permission to edit this maintenance log, please submit a bug report if this is an error.",
         )
-
-    try:
-        current_maintenance_log = (
-            maintenance_repo.update_maintenance_log_by_id(
-                maintenance_log_id, maintenance_log
-            )
-        )
-        if current_maintenance_log:
-            return current_maintenance_log
-        else:
-            raise HTTPException(
-                status_code=404,
-                detail=f"Maintenance Log ID {maintenance_log_id} not found.",
-            )
+    except HTTPException:
+        raise
     except ValidationError as e:
         raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
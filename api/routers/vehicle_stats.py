@@ -1,12 +1,14 @@
 from fastapi import (
     APIRouter,
+    Body,
     Depends,
+    Query,
     Response,
     HTTPException,
     status,
     Request,
 )
-from typing import Union, List
+from typing import Optional, Union, List
 from queries.vehicle_stats import (
     VehicleStatIn,
     VehicleStatRepository,
@@ -16,7 +18,14 @@ from pydantic import ValidationError, BaseModel
 from config import oauth2_scheme
 from models.jwt import JWTUserData
 from utils.authentication import try_get_jwt_user_data
-from main import limiter
+from utils.exceptions import PermissionDeniedException
+from utils.pagination import (
+    DEFAULT_PAGE_SIZE,
+    MAX_PAGE_SIZE,
+    set_next_page_headers,
+)
+from utils.responses import FastJSONResponse
+from utils.rate_limiting import limiter
 
 
 tags_metadata = [
@@ -26,20 +35,54 @@ tags_metadata = [
     },
 ]
 
-router = APIRouter(tags=["Vehicles Statistics"])
+# Sets the caller's timezone for last_update_timestamp, see
+# routers/vehicle_maintenance.py
+router = APIRouter(
+    tags=["Vehicles Statistics"],
+    dependencies=[Depends(try_get_jwt_user_data)],
+)
+
+MAX_BATCH_SIZE = 100
 
 
 class Error(BaseModel):
     message: str
 
 
+# Registered ahead of /vehicle_stats/{vehicle_id} so "batch" isn't parsed
+# as a vehicle id
+@router.post(
+    "/vehicle_stats/batch",
+    response_model=List[VehicleStatOut],
+    dependencies=[Depends(oauth2_scheme)],
+)
+@limiter.limit("5/minute")
+async def create_vehicle_stats(
+    request: Request,
+    stats: List[VehicleStatIn] = Body(
+        ..., min_length=1, max_length=MAX_BATCH_SIZE
+    ),
+    repo: VehicleStatRepository = Depends(),
+    current_user: JWTUserData = Depends(try_get_jwt_user_data),
+) -> List[VehicleStatOut]:
+    if not current_user:
+        raise HTTPException(status_code=401, detail="Unauthorized")
+    try:
+        return await repo.create_vehicle_stats(stats, current_user.id)
+    except PermissionDeniedException:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="You do not have permission to add stats to one or more of these vehicles.",
+        )
+
+
 @router.post(
     "/vehicle_stats/{vehicle_id}",
     response_model=Union[VehicleStatOut, Error],
     dependencies=[Depends(oauth2_scheme)],
 )
 @limiter.limit("5/minute")
-def create_vehicle_stat(
+async def create_vehicle_stat(
     request: Request,
     vehicle: VehicleStatIn,
     response: Response,
@@ -49,7 +92,7 @@ def create_vehicle_stat(
     if not current_user:
         return HTTPException(status_code=401, detail="Unauthorized")
     try:
-        create_vehicle_stat = repo.create_vehicle_stat(vehicle)
+        create_vehicle_stat = await repo.create_vehicle_stat(vehicle)
         if create_vehicle_stat:
             return create_vehicle_stat
         else:
@@ -76,7 +119,9 @@ async def get_vehicle_stat_by_id(
     vehicle_repo: VehicleStatRepository = Depends(),
 ) -> Union[VehicleStatOut, Error]:
     try:
-        vehicle_stat = vehicle_repo.get_vehicle_stats_by_vehicle_id(vehicle_id)
+        vehicle_stat = await vehicle_repo.get_vehicle_stats_by_vehicle_id(
+            vehicle_id
+        )
         if not vehicle_stat:
             response.status_code = status.HTTP_404_NOT_FOUND
             return Error(
@@ -113,11 +158,24 @@ async def get_all_vehicles_stat_by_id(
     request: Request,
     response: Response,
     vehicle_id: int,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    after: Optional[str] = None,
     vehicle_repo: VehicleStatRepository = Depends(),
 ) -> List[VehicleStatOut] | None:
     try:
-        vehicle_stats = vehicle_repo.get_all_vehicle_stat_by_id(vehicle_id)
-        return vehicle_stats
+        vehicle_stats, next_cursor = (
+            await vehicle_repo.get_all_vehicle_stat_by_id(
+                vehicle_id, limit, after
+            )
+        )
+        # Rows are already VehicleStatOut, skip response_model
+        # re-validation
+        page = FastJSONResponse(vehicle_stats)
+        set_next_page_headers(request, page, next_cursor)
+        return page
+    except HTTPException:
+        # Bad cursors (400) and repository failures already carry a status
+        raise
     except Exception as e:
         print(f"failed to grab all vehicle stats due to an error: {e}")
         response.status_code = status.HTTP_500_INTERNAL_SERVER_ERROR
@@ -1,19 +1,28 @@
 from fastapi import (
     APIRouter,
+    Body,
     Depends,
+    Query,
     Response,
     HTTPException,
     status,
     Request,
 )
-from typing import Union, List
+from typing import Optional, Union, List
 from queries.vehicles import VehicleIn, VehicleRepository, VehicleOut, Error
 from fastapi.responses import JSONResponse
 from pydantic import ValidationError
 from utils.authentication import try_get_jwt_user_data
 from models.jwt import JWTUserData
 from config import oauth2_scheme
-from main import limiter
+from utils.pagination import (
+    DEFAULT_PAGE_SIZE,
+    MAX_PAGE_SIZE,
+    set_next_page_headers,
+)
+from utils.etag import etag_matches, make_etag, not_modified, set_etag
+from utils.responses import FastJSONResponse
+from utils.rate_limiting import limiter
 
 
 tags_metadata = [
@@ -24,6 +33,8 @@ tags_metadata = [
 ]
 router = APIRouter(tags=["Vehicles"])
 
+MAX_BATCH_SIZE = 100
+
 
 @router.post(
     "/vehicles",
@@ -31,7 +42,7 @@ router = APIRouter(tags=["Vehicles"])
     dependencies=[Depends(oauth2_scheme)],
 )
 @limiter.limit("5/minute")
-def create_vehicle(
+async def create_vehicle(
     request: Request,
     vehicle: VehicleIn,
     repo: VehicleRepository = Depends(),
@@ -46,7 +57,7 @@ def create_vehicle(
 
     try:
         # Pass vehicle_data as a dictionary to the repository method
-        created_vehicle = repo.create_vehicle(vehicle_data)
+        created_vehicle = await repo.create_vehicle(vehicle_data)
         if created_vehicle:
             return created_vehicle
         else:
@@ -59,6 +70,25 @@ def create_vehicle(
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@router.post(
+    "/vehicles/batch",
+    response_model=List[VehicleOut],
+    dependencies=[Depends(oauth2_scheme)],
+)
+@limiter.limit("5/minute")
+async def create_vehicles(
+    request: Request,
+    vehicles: List[VehicleIn] = Body(
+        ..., min_length=1, max_length=MAX_BATCH_SIZE
+    ),
+    repo: VehicleRepository = Depends(),
+    current_user: JWTUserData = Depends(try_get_jwt_user_data),
+) -> List[VehicleOut]:
+    if not current_user:
+        raise HTTPException(status_code=401, detail="Unauthorized")
+    return await repo.create_vehicles(vehicles, current_user.id)
+
+
 @router.get(
     "/vehicles/{vehicle_id}",
     response_model=VehicleOut,
@@ -74,7 +104,14 @@ async def get_vehicle_by_id(
 ) -> VehicleOut:
     if not current_user:
         raise HTTPException(status_code=401, detail="Unauthorized")
-    vehicle = vehicle_repo.get_vehicle_by_id(vehicle_id)
+    # Only the owner gets a tag, everyone else falls through to the 403
+    version = await vehicle_repo.get_vehicle_version(vehicle_id)
+    if version is not None and version[0] == current_user.id:
+        etag = make_etag(request, version[1])
+        if etag_matches(request, etag):
+            return not_modified(etag)
+        set_etag(response, etag)
+    vehicle = await vehicle_repo.get_vehicle_by_id(vehicle_id)
     if vehicle is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -96,8 +133,11 @@ async def get_vehicle_by_id(
     dependencies=[Depends(oauth2_scheme)],
 )
 @limiter.limit("20/minute")
-def list_vehicles(
+async def list_vehicles(
     request: Request,
+    response: Response,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    after: Optional[str] = None,
     repo: VehicleRepository = Depends(),
     current_user: JWTUserData = Depends(try_get_jwt_user_data),
 ):
@@ -105,13 +145,25 @@ def list_vehicles(
         raise HTTPException(status_code=401, detail="Unauthorized")
 
     try:
-        vehicles = repo.get_vehicles_by_user_id(current_user.id)
+        version = await repo.get_user_vehicles_version(current_user.id)
+        etag = make_etag(request, *version)
+        if etag_matches(request, etag):
+            return not_modified(etag)
+        vehicles, next_cursor = await repo.get_vehicles_by_user_id(
+            current_user.id, limit, after
+        )
         if not vehicles:  # Check if the vehicle list is empty
             return JSONResponse(
                 status_code=200,
                 content={"message": "No vehicles in the garage"},
             )
-        return vehicles
+        # Rows are already VehicleOut, skip response_model re-validation
+        page = FastJSONResponse(vehicles)
+        set_next_page_headers(request, page, next_cursor)
+        set_etag(page, etag)
+        return page
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -133,7 +185,7 @@ async def update_vehicle(
     if not current_user:
         raise HTTPException(status_code=401, detail="Unauthorized")
 
-    existing_vehicle = vehicle_repo.get_vehicle_by_id(vehicle_id)
+    existing_vehicle = await vehicle_repo.get_vehicle_by_id(vehicle_id)
 
     if existing_vehicle is None:
         raise HTTPException(
@@ -147,7 +199,9 @@ async def update_vehicle(
             detail="You do not have permission to update this vehicle.",
         )
     try:
-        updated_vehicle = vehicle_repo.update_vehicle(vehicle_id, vehicle)
+        updated_vehicle = await vehicle_repo.update_vehicle(
+            vehicle_id, vehicle
+        )
         if updated_vehicle:
             return updated_vehicle
         else:
@@ -180,7 +234,7 @@ async def delete_vehicle(
 ) -> Union[VehicleOut, Error]:
     if not current_user:
         raise HTTPException(status_code=401, detail="Unauthorized")
-    existing_vehicle = vehicle_repo.get_vehicle_by_id(vehicle_id)
+    existing_vehicle = await vehicle_repo.get_vehicle_by_id(vehicle_id)
 
     if existing_vehicle is None:
         raise HTTPException(
@@ -195,7 +249,7 @@ async def delete_vehicle(
             detail="You do not have permission to delete this vehicle.",
         )
     try:
-        deleted_vehicle = vehicle_repo.delete_vehicle(vehicle_id)
+        deleted_vehicle = await vehicle_repo.delete_vehicle(vehicle_id)
         if deleted_vehicle:
             return deleted_vehicle
         else:
@@ -223,14 +277,25 @@ async def get_vehicles_by_user_id(
     request: Request,
     response: Response,
     user_id: int,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    after: Optional[str] = None,
     vehicle_repo: VehicleRepository = Depends(),
     current_user: JWTUserData = Depends(try_get_jwt_user_data),
 ) -> List[VehicleOut]:
     if not current_user:
         raise HTTPException(status_code=401, detail="Unauthorized")
     try:
-        vehicles = vehicle_repo.get_vehicles_by_user_id(user_id)
-        return vehicles
+        version = await vehicle_repo.get_user_vehicles_version(user_id)
+        etag = make_etag(request, *version)
+        if etag_matches(request, etag):
+            return not_modified(etag)
+        vehicles, next_cursor = await vehicle_repo.get_vehicles_by_user_id(
+            user_id, limit, after
+        )
+        page = FastJSONResponse(vehicles)
+        set_next_page_headers(request, page, next_cursor)
+        set_etag(page, etag)
+        return page
     except HTTPException as http_exc:
         print(
             f"Failed to grab USER ID {user_id} due to an HTTP error: {http_exc.detail}"
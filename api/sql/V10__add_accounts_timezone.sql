@@ -0,0 +1,4 @@
+-- IANA timezone used to turn stored UTC timestamps into local dates.
+-- Existing accounts keep the Pacific dates they've always been shown.
+ALTER TABLE accounts
+  ADD COLUMN IF NOT EXISTS timezone varchar(64) DEFAULT 'America/Los_Angeles' NOT NULL;
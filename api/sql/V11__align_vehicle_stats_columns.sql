@@ -0,0 +1,41 @@
+-- V3 created vehicle_stats with vehicle_maintenance's columns, while the
+-- API reads and writes the per-service mileage columns below. Add them
+-- where they're missing and relax the stray NOT NULL maintenance
+-- columns so stats inserts work on databases built from these files.
+ALTER TABLE vehicle_stats
+  ADD COLUMN IF NOT EXISTS last_oil_change int,
+  ADD COLUMN IF NOT EXISTS last_tire_rotation int,
+  ADD COLUMN IF NOT EXISTS last_tire_change int,
+  ADD COLUMN IF NOT EXISTS last_air_filter int,
+  ADD COLUMN IF NOT EXISTS last_brake_flush int,
+  ADD COLUMN IF NOT EXISTS last_brake_rotor int,
+  ADD COLUMN IF NOT EXISTS last_brake_pad int,
+  ADD COLUMN IF NOT EXISTS last_coolant_flush int,
+  ADD COLUMN IF NOT EXISTS last_transmission_fluid_flush int,
+  ADD COLUMN IF NOT EXISTS last_cabin_filter_change int,
+  ADD COLUMN IF NOT EXISTS last_wiper_blades_change int;
+
+DO $$
+BEGIN
+  IF EXISTS(
+    SELECT
+    FROM
+      information_schema.columns
+    WHERE
+      table_schema = 'public'
+      AND table_name = 'vehicle_stats'
+      AND column_name = 'maintenance_type') THEN
+  ALTER TABLE vehicle_stats ALTER COLUMN maintenance_type DROP NOT NULL;
+END IF;
+IF EXISTS(
+  SELECT
+  FROM
+    information_schema.columns
+  WHERE
+    table_schema = 'public'
+    AND table_name = 'vehicle_stats'
+    AND column_name = 'service_date') THEN
+  ALTER TABLE vehicle_stats ALTER COLUMN service_date DROP NOT NULL;
+END IF;
+END
+$$;
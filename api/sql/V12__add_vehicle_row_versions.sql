@@ -0,0 +1,100 @@
+-- Versions behind the ETags on vehicle and maintenance log reads. Both
+-- columns draw from one global sequence, so a version never repeats and
+-- any change moves it forward.
+--   row_version          bumped whenever the vehicle itself is updated
+--   maintenance_version  bumped whenever any of its maintenance logs is
+--                        inserted, updated or deleted
+CREATE SEQUENCE IF NOT EXISTS row_version_seq;
+
+ALTER TABLE vehicles
+  ADD COLUMN IF NOT EXISTS row_version bigint DEFAULT nextval('row_version_seq') NOT NULL,
+  ADD COLUMN IF NOT EXISTS maintenance_version bigint DEFAULT nextval('row_version_seq') NOT NULL;
+
+-- max(row_version) and count(*) for a user's garage come from an
+-- index-only scan
+CREATE INDEX IF NOT EXISTS idx_vehicles_user_id_row_version ON vehicles(user_id, row_version);
+
+CREATE OR REPLACE FUNCTION bump_row_version()
+  RETURNS TRIGGER
+  AS $$
+BEGIN
+  NEW.row_version := nextval('row_version_seq');
+  RETURN NEW;
+END;
+$$
+LANGUAGE plpgsql;
+
+-- Listing the vehicle's own columns keeps maintenance_version bumps
+-- from touching row_version
+DROP TRIGGER IF EXISTS vehicles_bump_row_version ON vehicles;
+
+CREATE TRIGGER vehicles_bump_row_version
+  BEFORE UPDATE OF vehicle_name, year, make, model, vin, mileage, about, user_id ON vehicles
+  FOR EACH ROW
+  EXECUTE FUNCTION bump_row_version();
+
+-- Statement level with transition tables, so a bulk import bumps each
+-- vehicle once instead of once per imported row
+CREATE OR REPLACE FUNCTION bump_maintenance_version()
+  RETURNS TRIGGER
+  AS $$
+BEGIN
+  UPDATE
+    vehicles
+  SET
+    maintenance_version = nextval('row_version_seq')
+  WHERE
+    id IN (
+      SELECT
+        vehicle_id
+      FROM
+        changed_rows);
+  RETURN NULL;
+END;
+$$
+LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION bump_moved_maintenance_version()
+  RETURNS TRIGGER
+  AS $$
+BEGIN
+  UPDATE
+    vehicles
+  SET
+    maintenance_version = nextval('row_version_seq')
+  WHERE
+    id IN (
+      SELECT
+        vehicle_id
+      FROM
+        changed_rows
+      UNION
+      SELECT
+        vehicle_id
+      FROM
+        previous_rows);
+  RETURN NULL;
+END;
+$$
+LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS vehicle_maintenance_inserted ON vehicle_maintenance;
+
+CREATE TRIGGER vehicle_maintenance_inserted
+  AFTER INSERT ON vehicle_maintenance REFERENCING NEW TABLE AS changed_rows
+  FOR EACH STATEMENT
+  EXECUTE FUNCTION bump_maintenance_version();
+
+DROP TRIGGER IF EXISTS vehicle_maintenance_updated ON vehicle_maintenance;
+
+CREATE TRIGGER vehicle_maintenance_updated
+  AFTER UPDATE ON vehicle_maintenance REFERENCING OLD TABLE AS previous_rows NEW TABLE AS changed_rows
+  FOR EACH STATEMENT
+  EXECUTE FUNCTION bump_moved_maintenance_version();
+
+DROP TRIGGER IF EXISTS vehicle_maintenance_deleted ON vehicle_maintenance;
+
+CREATE TRIGGER vehicle_maintenance_deleted
+  AFTER DELETE ON vehicle_maintenance REFERENCING OLD TABLE AS changed_rows
+  FOR EACH STATEMENT
+  EXECUTE FUNCTION bump_maintenance_version();
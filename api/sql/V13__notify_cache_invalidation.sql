@@ -0,0 +1,112 @@
+-- Tells every API worker which cached keys a committed write touched, so
+-- in-process caches can evict them (see api/queries/invalidation.py).
+-- Payload on the cache_invalidation channel:
+--   {"table": "vehicles", "keys": [<user_id>, ...]}
+--   {"table": "vehicle_maintenance" | "vehicle_stats", "keys": [<vehicle_id>, ...]}
+-- "keys" is null when there were too many to fit in a notification,
+-- listeners then drop everything they cache for that table.
+--
+-- Trigger arguments: the key column, and optionally a version column.
+-- With a version column, updates that leave it unchanged are ignored:
+-- the maintenance_version bumps from V12 don't touch row_version, so
+-- they don't evict a user's cached vehicle list.
+CREATE OR REPLACE FUNCTION notify_cache_invalidation()
+  RETURNS TRIGGER
+  AS $$
+DECLARE
+  key_column text := TG_ARGV[0];
+  keys json;
+  payload text;
+BEGIN
+  IF TG_OP = 'UPDATE' AND TG_NARGS > 1 THEN
+    EXECUTE format('SELECT json_agg(DISTINCT key) FROM (
+        SELECT n.%1$I AS key FROM changed_rows n JOIN previous_rows o USING (id)
+        WHERE n.%2$I IS DISTINCT FROM o.%2$I
+        UNION
+        SELECT o.%1$I FROM changed_rows n JOIN previous_rows o USING (id)
+        WHERE n.%2$I IS DISTINCT FROM o.%2$I) changed', key_column, TG_ARGV[1]) INTO keys;
+  ELSIF TG_OP = 'UPDATE' THEN
+    EXECUTE format('SELECT json_agg(DISTINCT key) FROM (
+        SELECT %1$I AS key FROM changed_rows
+        UNION
+        SELECT %1$I FROM previous_rows) changed', key_column) INTO keys;
+  ELSE
+    EXECUTE format('SELECT json_agg(DISTINCT %I) FROM changed_rows', key_column) INTO keys;
+  END IF;
+  IF keys IS NULL THEN
+    RETURN NULL;
+  END IF;
+  payload := json_build_object('table', TG_TABLE_NAME, 'keys', keys)::text;
+  -- NOTIFY payloads are capped at 8000 bytes
+  IF octet_length(payload) > 7900 THEN
+    payload := json_build_object('table', TG_TABLE_NAME, 'keys', NULL)::text;
+  END IF;
+  PERFORM
+    pg_notify('cache_invalidation', payload);
+  RETURN NULL;
+END;
+$$
+LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS vehicles_notify_inserted ON vehicles;
+
+CREATE TRIGGER vehicles_notify_inserted
+  AFTER INSERT ON vehicles REFERENCING NEW TABLE AS changed_rows
+  FOR EACH STATEMENT
+  EXECUTE FUNCTION notify_cache_invalidation('user_id');
+
+DROP TRIGGER IF EXISTS vehicles_notify_updated ON vehicles;
+
+CREATE TRIGGER vehicles_notify_updated
+  AFTER UPDATE ON vehicles REFERENCING OLD TABLE AS previous_rows NEW TABLE AS changed_rows
+  FOR EACH STATEMENT
+  EXECUTE FUNCTION notify_cache_invalidation('user_id', 'row_version');
+
+DROP TRIGGER IF EXISTS vehicles_notify_deleted ON vehicles;
+
+CREATE TRIGGER vehicles_notify_deleted
+  AFTER DELETE ON vehicles REFERENCING OLD TABLE AS changed_rows
+  FOR EACH STATEMENT
+  EXECUTE FUNCTION notify_cache_invalidation('user_id');
+
+DROP TRIGGER IF EXISTS vehicle_maintenance_notify_inserted ON vehicle_maintenance;
+
+CREATE TRIGGER vehicle_maintenance_notify_inserted
+  AFTER INSERT ON vehicle_maintenance REFERENCING NEW TABLE AS changed_rows
+  FOR EACH STATEMENT
+  EXECUTE FUNCTION notify_cache_invalidation('vehicle_id');
+
+DROP TRIGGER IF EXISTS vehicle_maintenance_notify_updated ON vehicle_maintenance;
+
+CREATE TRIGGER vehicle_maintenance_notify_updated
+  AFTER UPDATE ON vehicle_maintenance REFERENCING OLD TABLE AS previous_rows NEW TABLE AS changed_rows
+  FOR EACH STATEMENT
+  EXECUTE FUNCTION notify_cache_invalidation('vehicle_id');
+
+DROP TRIGGER IF EXISTS vehicle_maintenance_notify_deleted ON vehicle_maintenance;
+
+CREATE TRIGGER vehicle_maintenance_notify_deleted
+  AFTER DELETE ON vehicle_maintenance REFERENCING OLD TABLE AS changed_rows
+  FOR EACH STATEMENT
+  EXECUTE FUNCTION notify_cache_invalidation('vehicle_id');
+
+DROP TRIGGER IF EXISTS vehicle_stats_notify_inserted ON vehicle_stats;
+
+CREATE TRIGGER vehicle_stats_notify_inserted
+  AFTER INSERT ON vehicle_stats REFERENCING NEW TABLE AS changed_rows
+  FOR EACH STATEMENT
+  EXECUTE FUNCTION notify_cache_invalidation('vehicle_id');
+
+DROP TRIGGER IF EXISTS vehicle_stats_notify_updated ON vehicle_stats;
+
+CREATE TRIGGER vehicle_stats_notify_updated
+  AFTER UPDATE ON vehicle_stats REFERENCING OLD TABLE AS previous_rows NEW TABLE AS changed_rows
+  FOR EACH STATEMENT
+  EXECUTE FUNCTION notify_cache_invalidation('vehicle_id');
+
+DROP TRIGGER IF EXISTS vehicle_stats_notify_deleted ON vehicle_stats;
+
+CREATE TRIGGER vehicle_stats_notify_deleted
+  AFTER DELETE ON vehicle_stats REFERENCING OLD TABLE AS changed_rows
+  FOR EACH STATEMENT
+  EXECUTE FUNCTION notify_cache_invalidation('vehicle_id');
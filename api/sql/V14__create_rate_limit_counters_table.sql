@@ -0,0 +1,12 @@
+-- Fixed-window rate limit counters shared by every API worker, used when
+-- RATE_LIMIT_STORAGE_URI=database:// (see api/utils/rate_limit_storage.py).
+-- key is the limits library's key (limit, route and client), the window
+-- ends at expires_at. Workers batch their hits into one upsert per sync
+-- interval and purge expired rows on a timer.
+CREATE TABLE IF NOT EXISTS rate_limit_counters(
+  key text PRIMARY KEY NOT NULL,
+  count integer NOT NULL,
+  expires_at timestamptz NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS idx_rate_limit_counters_expires_at ON rate_limit_counters(expires_at);
@@ -0,0 +1,4 @@
+-- Account plan, sets the rate limit tier (see api/utils/plans.py). It
+-- travels in the JWT, so limits are applied without a lookup.
+ALTER TABLE accounts
+  ADD COLUMN IF NOT EXISTS plan varchar(20) DEFAULT 'free' NOT NULL;
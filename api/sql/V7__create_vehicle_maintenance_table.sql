@@ -0,0 +1,24 @@
+DO $$
+BEGIN
+  -- V3 checks for vehicle_maintenance but creates vehicle_stats, so a
+  -- database built only from these migrations never gets this table
+  IF NOT EXISTS(
+    SELECT
+    FROM
+      pg_tables
+    WHERE
+      schemaname = 'public'
+      AND tablename = 'vehicle_maintenance') THEN
+  CREATE TABLE vehicle_maintenance(
+    id serial PRIMARY KEY NOT NULL,
+    vehicle_id integer NOT NULL REFERENCES vehicles(id ) ON DELETE CASCADE,
+    maintenance_type varchar(255 ) NOT NULL,
+    mileage int,
+    COST NUMERIC(10, 2 ),
+    description text,
+    service_date date NOT NULL,
+    created_date timestamp DEFAULT CURRENT_TIMESTAMP NOT NULL
+  );
+END IF;
+END
+$$;
@@ -0,0 +1,17 @@
+-- Indexes backing every WHERE / ORDER BY in api/queries/.
+-- Built CONCURRENTLY so writes aren't blocked while they build. Flyway
+-- runs a migration made only of non-transactional statements outside a
+-- transaction, so keep anything transactional out of this file.
+
+-- VehicleRepository.get_vehicles_by_user_id
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_vehicles_user_id_id ON vehicles(user_id, id);
+
+-- VehicleMaintenanceRepo.get_maintenance_log_by_vehicle_id and
+-- get_all_maintenance_log_by_vehicle_id
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_vehicle_maintenance_vehicle_id_service_date ON vehicle_maintenance(vehicle_id, service_date DESC, id DESC);
+
+-- VehicleStatRepository.get_vehicle_stats_by_vehicle_id
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_vehicle_stats_vehicle_id_last_update ON vehicle_stats(vehicle_id, last_update_timestamp DESC);
+
+-- VehicleStatRepository.get_all_vehicle_stat_by_id
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_vehicle_stats_vehicle_id_id ON vehicle_stats(vehicle_id, id DESC);
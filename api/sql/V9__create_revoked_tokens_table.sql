@@ -0,0 +1,13 @@
+-- Revoked JWTs, keyed by the token's jti. Rows only need to live until
+-- the token would have expired anyway, expired rows are purged by the
+-- API on a timer using idx_revoked_tokens_expires_at.
+CREATE TABLE IF NOT EXISTS revoked_tokens(
+  jti varchar(64) PRIMARY KEY NOT NULL,
+  expires_at timestamptz NOT NULL,
+  revoked_at timestamptz DEFAULT CURRENT_TIMESTAMP NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS idx_revoked_tokens_expires_at ON revoked_tokens(expires_at);
+
+-- Each worker pulls revocations made since its last refresh
+CREATE INDEX IF NOT EXISTS idx_revoked_tokens_revoked_at ON revoked_tokens(revoked_at);
@@ -0,0 +1,12 @@
+import os
+
+# Modules under queries/ and utils/ read these at import time. Nothing
+# connects until a test opens the pool, so placeholders are enough for
+# tests that don't touch Postgres.
+os.environ.setdefault(
+    "DATABASE_URL",
+    os.environ.get(
+        "TEST_DATABASE_URL", "postgresql://localhost/drivestats_test"
+    ),
+)
+os.environ.setdefault("SIGNING_KEY", "test-signing-key")
@@ -0,0 +1,28 @@
+import asyncio
+
+from queries.invalidation import CacheInvalidationListener
+
+
+def test_dispatches_keys_to_the_tables_subscribers():
+    listener = CacheInvalidationListener("postgresql://unused")
+    received = []
+
+    async def on_vehicles(keys):
+        received.append(("vehicles", keys))
+
+    async def failing(keys):
+        raise RuntimeError("handler bug")
+
+    listener.subscribe("vehicles", failing)
+    listener.subscribe("vehicles", on_vehicles)
+
+    async def scenario():
+        await listener.dispatch('{"table": "vehicles", "keys": [1, 2]}')
+        await listener.dispatch('{"table": "vehicle_stats", "keys": [3]}')
+        await listener.dispatch('{"table": "vehicles", "keys": null}')
+        await listener.dispatch("not json")
+
+    asyncio.run(scenario())
+
+    assert received == [("vehicles", [1, 2]), ("vehicles", None)]
+    assert listener.received == 3
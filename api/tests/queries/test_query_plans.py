@@ -0,0 +1,313 @@
+"""
+Index advisor for the repository queries
+
+Runs every read/ownership query in api/queries/ against a seeded local
+Postgres, captures the SQL each repository method actually sends, and
+fails if EXPLAIN shows a sequential scan for any of them.
+
+Needs a throwaway database, its public schema is dropped and rebuilt
+from api/sql/ on every run:
+
+    TEST_DATABASE_URL=postgresql://localhost/drivestats_test pytest
+"""
+
+import asyncio
+import os
+import re
+from datetime import date, datetime, timezone
+from pathlib import Path
+
+import psycopg
+import pytest
+from psycopg import AsyncCursor
+
+TEST_DATABASE_URL = os.environ.get("TEST_DATABASE_URL")
+SQL_DIR = Path(__file__).resolve().parents[2] / "sql"
+
+pytestmark = pytest.mark.skipif(
+    not TEST_DATABASE_URL, reason="TEST_DATABASE_URL is not set"
+)
+
+SEED_USERS = 200
+SEED_VEHICLES_PER_USER = 5
+SEED_LOGS_PER_VEHICLE = 20
+
+
+class RecordingCursor(AsyncCursor):
+    """
+    Cursor that remembers every statement a repository executes
+    """
+
+    executed: list = []
+
+    async def execute(self, query, params=None, **kwargs):
+        # The pool's health check sends an empty statement, skip it
+        if str(query).strip():
+            RecordingCursor.executed.append((query, params))
+        return await super().execute(query, params, **kwargs)
+
+
+def migration_version(path: Path) -> int:
+    return int(re.match(r"V(\d+)__", path.name).group(1))
+
+
+def apply_migrations(conn: psycopg.Connection):
+    conn.execute("DROP SCHEMA IF EXISTS public CASCADE")
+    conn.execute("CREATE SCHEMA public")
+    for path in sorted(SQL_DIR.glob("V*.sql"), key=migration_version):
+        script = path.read_text()
+        if "CONCURRENTLY" in script:
+            # Each CONCURRENTLY statement has to run on its own
+            statements = [
+                "\n".join(
+                    line
+                    for line in statement.splitlines()
+                    if not line.lstrip().startswith("--")
+                ).strip()
+                for statement in script.split(";")
+            ]
+            for statement in filter(None, statements):
+                conn.execute(statement)
+        else:
+            conn.execute(script)
+
+
+def seed(conn: psycopg.Connection):
+    with conn.cursor() as cur:
+        cur.execute(
+            """
+            INSERT INTO accounts (username, password, email)
+            SELECT 'user' || n, 'x', 'user' || n || '@example.com'
+            FROM generate_series(1, %s) AS n
+            """,
+            [SEED_USERS],
+        )
+        cur.execute(
+            """
+            INSERT INTO vehicles
+              (vehicle_name, year, make, model, vin, mileage, about, user_id)
+            SELECT 'car', 2020, 'make', 'model', 'vin', '1000', 'about', a.id
+            FROM accounts a, generate_series(1, %s)
+            """,
+            [SEED_VEHICLES_PER_USER],
+        )
+        cur.execute(
+            """
+            INSERT INTO vehicle_maintenance
+              (vehicle_id, maintenance_type, mileage, cost, description, service_date)
+            SELECT v.id, 'oil', 1000, 50, 'desc', DATE '2024-01-01' + n
+            FROM vehicles v, generate_series(1, %s) AS n
+            """,
+            [SEED_LOGS_PER_VEHICLE],
+        )
+        cur.execute(
+            """
+            INSERT INTO vehicle_stats
+              (vehicle_id, maintenance_type, service_date)
+            SELECT v.id, 'oil', DATE '2024-01-01' + n
+            FROM vehicles v, generate_series(1, %s) AS n
+            """,
+            [SEED_LOGS_PER_VEHICLE],
+        )
+        cur.execute(
+            """
+            INSERT INTO revoked_tokens (jti, expires_at, revoked_at)
+            SELECT 'jti' || n, now() + interval '1 hour' * (n %% 24),
+              now() - interval '1 minute' * n
+            FROM generate_series(1, %s) AS n
+            """,
+            [SEED_USERS * SEED_VEHICLES_PER_USER],
+        )
+        cur.execute("ANALYZE")
+
+
+async def capture_repository_queries() -> dict:
+    from models.vehicle_maintenance import VehicleMaintenanceIn
+    from queries.accounts import AccountRepo
+    from queries.pool import pool
+    from queries.rate_limits import RateLimitCounterRepo
+    from queries.revoked_tokens import RevokedTokenRepo
+    from queries.vehicle_maintenance import VehicleMaintenanceRepo
+    from queries.vehicle_stats import VehicleStatRepository
+    from queries.vehicles import VehicleRepository
+    from utils.pagination import encode_cursor
+
+    vehicles = VehicleRepository()
+    maintenance = VehicleMaintenanceRepo()
+    stats = VehicleStatRepository()
+    accounts = AccountRepo()
+    revoked_tokens = RevokedTokenRepo()
+    rate_limits = RateLimitCounterRepo()
+    log_update = VehicleMaintenanceIn(
+        vehicle_id=1,
+        maintenance_type="oil",
+        mileage=1000,
+        cost=50,
+        description="desc",
+        service_date=date(2024, 1, 1),
+    )
+
+    calls = {
+        "VehicleRepository.get_vehicle_by_id": lambda: (
+            vehicles.get_vehicle_by_id(1)
+        ),
+        "VehicleRepository.get_vehicles_by_user_id": lambda: (
+            vehicles.get_vehicles_by_user_id(1)
+        ),
+        "VehicleRepository.get_vehicles_by_user_id[after]": lambda: (
+            vehicles.get_vehicles_by_user_id(1, 2, encode_cursor(1))
+        ),
+        "VehicleRepository.get_all_vehicles[after]": lambda: (
+            vehicles.get_all_vehicles(10, encode_cursor(500))
+        ),
+        "VehicleRepository.get_vehicle_version": lambda: (
+            vehicles.get_vehicle_version(1)
+        ),
+        "VehicleRepository.get_user_vehicles_version": lambda: (
+            vehicles.get_user_vehicles_version(1)
+        ),
+        "VehicleMaintenanceRepo.get_maintenance_version": lambda: (
+            maintenance.get_maintenance_version(1)
+        ),
+        "VehicleMaintenanceRepo.get_maintenance_log_by_vehicle_id": lambda: (
+            maintenance.get_maintenance_log_by_vehicle_id(1)
+        ),
+        "VehicleMaintenanceRepo.get_all_maintenance_log_by_vehicle_id": lambda: (
+            maintenance.get_all_maintenance_log_by_vehicle_id(1)
+        ),
+        "VehicleMaintenanceRepo.get_all_maintenance_log_by_vehicle_id[after]": lambda: (
+            maintenance.get_all_maintenance_log_by_vehicle_id(
+                1, 5, encode_cursor("2024-01-10", 10)
+            )
+        ),
+        "VehicleMaintenanceRepo.get_maintenance_log_by_log_id": lambda: (
+            maintenance.get_maintenance_log_by_log_id(1)
+        ),
+        "VehicleMaintenanceRepo.update_maintenance_log_by_id": lambda: (
+            maintenance.update_maintenance_log_by_id(1, log_update, 1)
+        ),
+        "VehicleMaintenanceRepo.delete_maintenance_log_by_id": lambda: (
+            maintenance.delete_maintenance_log_by_id(2, 1)
+        ),
+        "VehicleStatRepository.get_vehicle_stats_by_vehicle_id": lambda: (
+            stats.get_vehicle_stats_by_vehicle_id(1)
+        ),
+        "VehicleStatRepository.get_all_vehicle_stat_by_id": lambda: (
+            stats.get_all_vehicle_stat_by_id(1)
+        ),
+        "VehicleStatRepository.get_all_vehicle_stat_by_id[after]": lambda: (
+            stats.get_all_vehicle_stat_by_id(1, 5, encode_cursor(10))
+        ),
+        "AccountRepo.get_single_user": lambda: (
+            accounts.get_single_user("user1")
+        ),
+        "AccountRepo.check_single_user": lambda: (
+            accounts.check_single_user("user1")
+        ),
+        "AccountRepo.check_user_email": lambda: (
+            accounts.check_user_email("user1@example.com")
+        ),
+        "RevokedTokenRepo.is_revoked": lambda: (
+            revoked_tokens.is_revoked("jti1")
+        ),
+        "RevokedTokenRepo.get_revoked_since": lambda: (
+            revoked_tokens.get_revoked_since(datetime.now(timezone.utc))
+        ),
+        "RevokedTokenRepo.purge_expired": lambda: (
+            revoked_tokens.purge_expired()
+        ),
+        "RateLimitCounterRepo.add_hits": lambda: (
+            rate_limits.add_hits(["limit/1.2.3.4"], [1], [60.0])
+        ),
+        "RateLimitCounterRepo.get_counts": lambda: (
+            rate_limits.get_counts(["limit/1.2.3.4"])
+        ),
+        "RateLimitCounterRepo.purge_expired": lambda: (
+            rate_limits.purge_expired()
+        ),
+    }
+
+    pool.conninfo = TEST_DATABASE_URL
+    pool.kwargs = dict(pool.kwargs or {}, cursor_factory=RecordingCursor)
+    await pool.open(wait=True)
+    captured = {}
+    try:
+        for name, call in calls.items():
+            RecordingCursor.executed = []
+            try:
+                await call()
+            except Exception:
+                # Only the statement matters here, not whether the
+                # lookup found anything
+                pass
+            captured[name] = list(RecordingCursor.executed)
+    finally:
+        await pool.close()
+    return captured
+
+
+def seq_scans(plan: dict) -> list:
+    found = []
+    if plan.get("Node Type") == "Seq Scan":
+        found.append(plan.get("Relation Name"))
+    for child in plan.get("Plans", []):
+        found.extend(seq_scans(child))
+    return found
+
+
+@pytest.fixture(scope="module")
+def captured_queries():
+    with psycopg.connect(TEST_DATABASE_URL, autocommit=True) as conn:
+        apply_migrations(conn)
+        seed(conn)
+    return asyncio.run(capture_repository_queries())
+
+
+REPOSITORY_METHODS = [
+    "VehicleRepository.get_vehicle_by_id",
+    "VehicleRepository.get_vehicles_by_user_id",
+    "VehicleRepository.get_vehicles_by_user_id[after]",
+    "VehicleRepository.get_all_vehicles[after]",
+    "VehicleRepository.get_vehicle_version",
+    "VehicleRepository.get_user_vehicles_version",
+    "VehicleMaintenanceRepo.get_maintenance_version",
+    "VehicleMaintenanceRepo.get_maintenance_log_by_vehicle_id",
+    "VehicleMaintenanceRepo.get_all_maintenance_log_by_vehicle_id",
+    "VehicleMaintenanceRepo.get_all_maintenance_log_by_vehicle_id[after]",
+    "VehicleMaintenanceRepo.get_maintenance_log_by_log_id",
+    "VehicleMaintenanceRepo.update_maintenance_log_by_id",
+    "VehicleMaintenanceRepo.delete_maintenance_log_by_id",
+    "VehicleStatRepository.get_vehicle_stats_by_vehicle_id",
+    "VehicleStatRepository.get_all_vehicle_stat_by_id",
+    "VehicleStatRepository.get_all_vehicle_stat_by_id[after]",
+    "AccountRepo.get_single_user",
+    "AccountRepo.check_single_user",
+    "AccountRepo.check_user_email",
+    "RevokedTokenRepo.is_revoked",
+    "RevokedTokenRepo.get_revoked_since",
+    "RevokedTokenRepo.purge_expired",
+    "RateLimitCounterRepo.add_hits",
+    "RateLimitCounterRepo.get_counts",
+    "RateLimitCounterRepo.purge_expired",
+]
+
+
+@pytest.mark.parametrize("method", REPOSITORY_METHODS)
+def test_repository_query_uses_an_index(captured_queries, method):
+    statements = captured_queries[method]
+    assert statements, f"{method} did not execute any SQL"
+
+    with psycopg.connect(TEST_DATABASE_URL) as conn:
+        # With seq scans priced out the planner still falls back to one
+        # when no index can serve the query, which is what we look for
+        conn.execute("SET enable_seqscan = off")
+        for query, params in statements:
+            plan = conn.execute(
+                f"EXPLAIN (FORMAT JSON) {query}", params
+            ).fetchone()[0][0]["Plan"]
+            scans = seq_scans(plan)
+            assert not scans, (
+                f"{method} falls back to a sequential scan on "
+                f"{', '.join(scans)}:\n{query}"
+            )
+        conn.rollback()
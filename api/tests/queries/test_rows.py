@@ -0,0 +1,43 @@
+from datetime import date
+from types import SimpleNamespace
+
+import pytest
+from pydantic import ValidationError
+
+from models.vehicle_maintenance import VehicleMaintenanceOut
+from queries.rows import model_row
+
+
+def cursor_for(*names):
+    return SimpleNamespace(
+        description=[SimpleNamespace(name=name) for name in names]
+    )
+
+
+def test_builds_the_same_model_as_validation():
+    row = {
+        "id": 1,
+        "vehicle_id": 2,
+        "maintenance_type": "oil",
+        "mileage": 1000,
+        "cost": 50,
+        "description": "desc",
+        "service_date": date(2024, 1, 2),
+        "created_date": date(2024, 1, 3),
+    }
+    make_row = model_row(VehicleMaintenanceOut)(cursor_for(*row))
+
+    log = make_row(tuple(row.values()))
+
+    assert log == VehicleMaintenanceOut(**row)
+    assert (
+        log.model_dump_json() == VehicleMaintenanceOut(**row).model_dump_json()
+    )
+    assert log.model_copy(update={"cost": 60}).cost == 60
+
+
+def test_falls_back_to_validation_when_columns_differ():
+    make_row = model_row(VehicleMaintenanceOut)(cursor_for("id", "vehicle_id"))
+
+    with pytest.raises(ValidationError):
+        make_row((1, 2))
@@ -0,0 +1,14 @@
+import re
+from pathlib import Path
+
+from queries.schema import EXPECTED_SCHEMA_VERSION
+
+SQL_DIR = Path(__file__).resolve().parents[2] / "sql"
+
+
+def test_expected_version_is_the_latest_migration():
+    versions = [
+        int(re.match(r"V(\d+)__", path.name).group(1))
+        for path in SQL_DIR.glob("V*__*.sql")
+    ]
+    assert EXPECTED_SCHEMA_VERSION == max(versions)
@@ -0,0 +1,59 @@
+import asyncio
+import logging
+from types import SimpleNamespace
+
+from queries import tracing
+from queries.tracing import (
+    current_trace,
+    fingerprint,
+    record_pool_wait,
+    traced_repository,
+)
+from utils.metrics import repository_calls
+
+
+def test_fingerprint_ignores_formatting():
+    assert fingerprint("SELECT id\n  FROM vehicles WHERE id = %s") == (
+        fingerprint("SELECT id FROM vehicles WHERE id = %s")
+    )
+    assert fingerprint("SELECT 1") != fingerprint("SELECT 2")
+
+
+def test_traces_queries_and_pool_wait_per_repository_call():
+    traces = []
+
+    @traced_repository
+    class ThingRepo:
+        async def get_thing(self, thing_id):
+            record_pool_wait(0.002)
+            cursor = SimpleNamespace(rowcount=1)
+            tracing._record_query(cursor, "SELECT %s", [thing_id], 0.001)
+            traces.append(current_trace.get())
+            return thing_id
+
+        def not_async(self):
+            return "untouched"
+
+    repo = ThingRepo()
+    assert asyncio.run(repo.get_thing(7)) == 7
+    assert repo.not_async() == "untouched"
+    assert current_trace.get() is None
+    assert repository_calls.count("ThingRepo.get_thing") == 1
+
+    (trace,) = traces
+    assert trace.method == "ThingRepo.get_thing"
+    assert trace.pool_wait == 0.002
+    assert trace.queries == [(fingerprint("SELECT %s"), 1, 0.001)]
+
+
+def test_logs_queries_over_the_threshold(caplog, monkeypatch):
+    monkeypatch.setattr(tracing, "SLOW_QUERY_MS", 100)
+    cursor = SimpleNamespace(rowcount=12)
+    with caplog.at_level(logging.WARNING, logger="queries.slow_query"):
+        tracing._record_query(cursor, "SELECT fast", None, 0.05)
+        tracing._record_query(cursor, "SELECT   slow", None, 0.25)
+
+    (record,) = caplog.records
+    assert record.slow_query["sql"] == "SELECT slow"
+    assert record.slow_query["rows"] == 12
+    assert record.slow_query["duration_ms"] == 250
@@ -0,0 +1,521 @@
+"""
+VehicleMaintenanceRepo and the import/export routes on top of it,
+against a seeded local Postgres
+
+Reuses the throwaway database and seed data of test_query_plans.py and
+is skipped the same way when TEST_DATABASE_URL is not set.
+"""
+
+import asyncio
+import csv
+import io
+import json
+from contextlib import asynccontextmanager, contextmanager
+from datetime import date
+
+import psycopg
+import pytest
+from fastapi import FastAPI, HTTPException
+from fastapi.testclient import TestClient
+from psycopg_pool import AsyncConnectionPool
+
+import queries.vehicle_maintenance
+import queries.vehicle_stats
+import routers.vehicle_maintenance
+import routers.vehicle_stats
+from models.jwt import JWTPayload, JWTUserData
+from models.vehicle_maintenance import VehicleMaintenanceIn
+from queries.vehicle_maintenance import VehicleMaintenanceRepo
+from test_query_plans import TEST_DATABASE_URL, apply_migrations, seed
+from utils.authentication import try_get_jwt_payload
+from utils.rate_limiting import limiter
+from utils.timezone import DEFAULT_TIMEZONE
+from utils.exceptions import (
+    PermissionDeniedException,
+    RecordNotFoundException,
+)
+
+pytestmark = pytest.mark.skipif(
+    not TEST_DATABASE_URL, reason="TEST_DATABASE_URL is not set"
+)
+
+MISSING_LOG_ID = 10**9
+
+
+@pytest.fixture(scope="module", autouse=True)
+def seeded_database():
+    with psycopg.connect(TEST_DATABASE_URL, autocommit=True) as conn:
+        apply_migrations(conn)
+        seed(conn)
+
+
+def run_with_pool(monkeypatch, scenario):
+    """
+    Runs scenario() with the repositories on a pool of their own, the
+    shared one can't be reopened once another test has closed it
+    """
+
+    async def with_pool():
+        async with AsyncConnectionPool(
+            TEST_DATABASE_URL, min_size=1, open=False
+        ) as test_pool:
+            monkeypatch.setattr(queries.vehicle_maintenance, "pool", test_pool)
+            return await scenario()
+
+    return asyncio.run(with_pool())
+
+
+class BodyChunks:
+    """
+    Records the size of every body message the app sends, the
+    TestClient joins them back into one
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self.sizes = []
+
+    async def __call__(self, scope, receive, send):
+        async def recording_send(message):
+            if message["type"] == "http.response.body" and message.get("body"):
+                self.sizes.append(len(message["body"]))
+            await send(message)
+
+        await self.app(scope, receive, recording_send)
+
+
+@contextmanager
+def client_for(monkeypatch, username, timezone=DEFAULT_TIMEZONE):
+    """
+    TestClient for the maintenance and stats routers, signed in as
+    username
+    """
+
+    @asynccontextmanager
+    async def lifespan(app):
+        async with AsyncConnectionPool(
+            TEST_DATABASE_URL, min_size=1, open=False
+        ) as test_pool:
+            monkeypatch.setattr(queries.vehicle_maintenance, "pool", test_pool)
+            monkeypatch.setattr(queries.vehicle_stats, "pool", test_pool)
+            yield
+
+    app = FastAPI(lifespan=lifespan)
+    app.state.limiter = limiter
+    app.include_router(routers.vehicle_maintenance.router)
+    app.include_router(routers.vehicle_stats.router)
+    payload = JWTPayload(
+        user=JWTUserData(
+            id=user_id(username),
+            username=username,
+            email=f"{username}@example.com",
+            timezone=timezone,
+        ),
+        sub=username,
+        exp=0,
+    )
+    # Skips the signature and revocation checks, try_get_jwt_user_data
+    # still runs and sets the request's timezone
+    app.dependency_overrides[try_get_jwt_payload] = lambda: payload
+    monkeypatch.setattr(limiter, "enabled", False)
+    with TestClient(
+        BodyChunks(app), headers={"Authorization": "Bearer test"}
+    ) as client:
+        yield client
+
+
+def fetch_one(query, params=()):
+    with psycopg.connect(TEST_DATABASE_URL) as conn:
+        return conn.execute(query, params).fetchone()
+
+
+def user_id(username):
+    return fetch_one(
+        "SELECT id FROM accounts WHERE username = %s", [username]
+    )[0]
+
+
+def log_of(username):
+    """
+    (log id, vehicle id) of one of the user's maintenance logs
+    """
+    return fetch_one(
+        """
+        SELECT vm.id, vm.vehicle_id
+        FROM vehicle_maintenance vm
+        JOIN vehicles v ON v.id = vm.vehicle_id
+        JOIN accounts a ON a.id = v.user_id
+        WHERE a.username = %s
+        ORDER BY vm.id
+        LIMIT 1
+        """,
+        [username],
+    )
+
+
+def vehicle_of(username):
+    return fetch_one(
+        """
+        SELECT v.id FROM vehicles v JOIN accounts a ON a.id = v.user_id
+        WHERE a.username = %s ORDER BY v.id LIMIT 1
+        """,
+        [username],
+    )[0]
+
+
+def log_update(vehicle_id, description="updated"):
+    return VehicleMaintenanceIn(
+        vehicle_id=vehicle_id,
+        maintenance_type="tires",
+        mileage=2000,
+        cost=400,
+        description=description,
+        service_date=date(2024, 6, 1),
+    )
+
+
+def test_missing_log_is_not_found(monkeypatch):
+    repo = VehicleMaintenanceRepo()
+    owner = user_id("user1")
+    vehicle_id = vehicle_of("user1")
+
+    async def scenario():
+        with pytest.raises(RecordNotFoundException):
+            await repo.delete_maintenance_log_by_id(MISSING_LOG_ID, owner)
+        with pytest.raises(RecordNotFoundException):
+            await repo.update_maintenance_log_by_id(
+                MISSING_LOG_ID, log_update(vehicle_id), owner
+            )
+
+    run_with_pool(monkeypatch, scenario)
+
+
+def test_another_users_log_is_forbidden_and_left_alone(monkeypatch):
+    repo = VehicleMaintenanceRepo()
+    intruder = user_id("user1")
+    log_id, vehicle_id = log_of("user2")
+
+    async def scenario():
+        with pytest.raises(PermissionDeniedException):
+            await repo.delete_maintenance_log_by_id(log_id, intruder)
+        with pytest.raises(PermissionDeniedException):
+            await repo.update_maintenance_log_by_id(
+                log_id, log_update(vehicle_id), intruder
+            )
+
+    run_with_pool(monkeypatch, scenario)
+
+    assert fetch_one(
+        "SELECT description FROM vehicle_maintenance WHERE id = %s",
+        [log_id],
+    ) == ("desc",)
+
+
+def test_moving_a_log_to_another_users_vehicle_is_refused(monkeypatch):
+    repo = VehicleMaintenanceRepo()
+    owner = user_id("user3")
+    log_id, vehicle_id = log_of("user3")
+    foreign_vehicle_id = vehicle_of("user4")
+
+    async def scenario():
+        with pytest.raises(PermissionDeniedException):
+            await repo.update_maintenance_log_by_id(
+                log_id, log_update(foreign_vehicle_id), owner
+            )
+
+    run_with_pool(monkeypatch, scenario)
+
+    assert fetch_one(
+        "SELECT vehicle_id, description FROM vehicle_maintenance "
+        "WHERE id = %s",
+        [log_id],
+    ) == (vehicle_id, "desc")
+
+
+def test_owner_can_update_then_delete(monkeypatch):
+    repo = VehicleMaintenanceRepo()
+    owner = user_id("user5")
+    log_id, _ = log_of("user5")
+    other_vehicle_id = fetch_one(
+        "SELECT max(id) FROM vehicles WHERE user_id = %s", [owner]
+    )[0]
+
+    async def scenario():
+        updated = await repo.update_maintenance_log_by_id(
+            log_id, log_update(other_vehicle_id), owner
+        )
+        deleted = await repo.delete_maintenance_log_by_id(log_id, owner)
+        return updated, deleted
+
+    updated, deleted = run_with_pool(monkeypatch, scenario)
+
+    assert updated.vehicle_id == other_vehicle_id
+    assert updated.description == "updated"
+    assert deleted.id == log_id
+    assert (
+        fetch_one("SELECT 1 FROM vehicle_maintenance WHERE id = %s", [log_id])
+        is None
+    )
+
+
+# Needs CSV quoting and JSON escaping
+AWKWARD_DESCRIPTION = 'Said "it\'s fine", then\nleft, \\ twice'
+
+
+def add_awkward_logs(username, per_vehicle):
+    with psycopg.connect(TEST_DATABASE_URL, autocommit=True) as conn:
+        conn.execute(
+            """
+            INSERT INTO vehicle_maintenance
+              (vehicle_id, maintenance_type, mileage, cost, description, service_date)
+            SELECT v.id, 'brakes', 3000, 120, %s, DATE '2023-01-01' + n
+            FROM vehicles v
+            JOIN accounts a ON a.id = v.user_id,
+            generate_series(1, %s) AS n
+            WHERE a.username = %s
+            """,
+            [AWKWARD_DESCRIPTION, per_vehicle, username],
+        )
+        return conn.execute(
+            """
+            SELECT array_agg(vm.id ORDER BY vm.id)
+            FROM vehicle_maintenance vm
+            JOIN vehicles v ON v.id = vm.vehicle_id
+            WHERE v.user_id = %s
+            """,
+            [user_id(username)],
+        ).fetchone()[0]
+
+
+@pytest.fixture(scope="module")
+def exported_log_ids():
+    # Well past EXPORT_CHUNK_SIZE in either format
+    return add_awkward_logs("user6", per_vehicle=500)
+
+
+def export(client, format):
+    client.app.sizes = []
+    response = client.get(
+        "/api/vehicle-maintenance/export", params={"format": format}
+    )
+    assert response.status_code == 200
+    # Buffered up to EXPORT_CHUNK_SIZE, then sent as the rows arrive
+    chunk_size = routers.vehicle_maintenance.EXPORT_CHUNK_SIZE
+    assert len(client.app.sizes) > 2
+    assert all(size >= chunk_size for size in client.app.sizes[:-1])
+    return response.text
+
+
+def test_exports_ndjson_across_chunks(monkeypatch, exported_log_ids):
+    with client_for(monkeypatch, "user6") as client:
+        body = export(client, "ndjson")
+
+    lines = body.splitlines()
+    logs = [json.loads(line) for line in lines]
+    # Newlines in a description stay escaped, one log per line
+    assert len(lines) == len(exported_log_ids)
+    # Every one of the caller's logs and nobody else's
+    assert sorted(log["id"] for log in logs) == exported_log_ids
+    awkward = [log for log in logs if log["maintenance_type"] == "brakes"]
+    assert len(awkward) == 2500
+    assert all(log["description"] == AWKWARD_DESCRIPTION for log in awkward)
+
+
+def test_exports_csv_across_chunks(monkeypatch, exported_log_ids):
+    with client_for(monkeypatch, "user6") as client:
+        body = export(client, "csv")
+
+    reader = csv.reader(io.StringIO(body, newline=""))
+    header = next(reader)
+    rows = [dict(zip(header, row)) for row in reader]
+    assert header == routers.vehicle_maintenance.EXPORT_CSV_COLUMNS
+    # Every one of the caller's logs and nobody else's
+    assert sorted(int(row["id"]) for row in rows) == exported_log_ids
+    awkward = [row for row in rows if row["maintenance_type"] == "brakes"]
+    assert len(awkward) == 2500
+    assert all(row["description"] == AWKWARD_DESCRIPTION for row in awkward)
+
+
+def user_log_count(username):
+    return fetch_one(
+        """
+        SELECT count(*) FROM vehicle_maintenance vm
+        JOIN vehicles v ON v.id = vm.vehicle_id
+        JOIN accounts a ON a.id = v.user_id
+        WHERE a.username = %s
+        """,
+        [username],
+    )[0]
+
+
+def import_rows(vehicle_id, count):
+    return [
+        {
+            "vehicle_id": vehicle_id,
+            "maintenance_type": "import",
+            "mileage": 5000 + n,
+            "cost": 75,
+            "description": f"imported, row {n}",
+            "service_date": f"2022-02-{n:02d}",
+        }
+        for n in range(1, count + 1)
+    ]
+
+
+def as_csv(rows):
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=list(rows[0]))
+    writer.writeheader()
+    writer.writerows(rows)
+    return buffer.getvalue()
+
+
+def upload(client, name, content, content_type):
+    return client.post(
+        "/api/vehicle-maintenance/import",
+        files={"file": (name, content, content_type)},
+    )
+
+
+def test_imports_csv_and_json(monkeypatch):
+    vehicle_id = vehicle_of("user7")
+    before = user_log_count("user7")
+
+    with client_for(monkeypatch, "user7") as client:
+        from_csv = upload(
+            client, "logs.csv", as_csv(import_rows(vehicle_id, 3)), "text/csv"
+        )
+        from_json = upload(
+            client,
+            "logs.json",
+            json.dumps(import_rows(vehicle_id, 2)),
+            "application/json",
+        )
+
+    assert from_csv.status_code == 200
+    assert from_csv.json() == {"imported": 3, "errors": []}
+    assert from_json.json() == {"imported": 2, "errors": []}
+    assert user_log_count("user7") == before + 5
+    assert fetch_one(
+        "SELECT mileage, cost, description FROM vehicle_maintenance "
+        "WHERE vehicle_id = %s AND service_date = '2022-02-03'",
+        [vehicle_id],
+    ) == (5003, 75, "imported, row 3")
+
+
+def test_invalid_rows_are_reported_and_nothing_is_written(monkeypatch):
+    rows = import_rows(vehicle_of("user8"), 3)
+    rows[1]["mileage"] = "lots"
+    rows[2]["service_date"] = "yesterday"
+    before = user_log_count("user8")
+
+    with client_for(monkeypatch, "user8") as client:
+        response = upload(client, "logs.csv", as_csv(rows), "text/csv")
+
+    assert response.status_code == 422
+    errors = response.json()["errors"]
+    assert [error["row"] for error in errors] == [2, 3]
+    assert errors[0]["error"].startswith("mileage: ")
+    assert errors[1]["error"].startswith("service_date: ")
+    assert user_log_count("user8") == before
+
+
+def test_another_users_vehicle_rejects_the_whole_file(monkeypatch):
+    rows = import_rows(vehicle_of("user9"), 2) + import_rows(
+        vehicle_of("user10"), 1
+    )
+    before = user_log_count("user9"), user_log_count("user10")
+
+    with client_for(monkeypatch, "user9") as client:
+        response = upload(client, "logs.json", json.dumps(rows), "text/json")
+
+    assert response.status_code == 422
+    assert response.json()["imported"] == 0
+    assert [error["row"] for error in response.json()["errors"]] == [3]
+    assert (user_log_count("user9"), user_log_count("user10")) == before
+
+
+def test_a_row_failing_inside_copy_rolls_back_the_rest(monkeypatch):
+    repo = VehicleMaintenanceRepo()
+    rows = import_rows(vehicle_of("user12"), 3)
+    # Valid for the model, out of range for the int column
+    rows[2]["mileage"] = 10**10
+    logs = [
+        (row, VehicleMaintenanceIn.model_validate(record))
+        for row, record in enumerate(rows, start=1)
+    ]
+    before = user_log_count("user12")
+
+    async def scenario():
+        with pytest.raises(HTTPException) as failed:
+            await repo.import_maintenance_logs(logs, user_id("user12"))
+        return failed.value
+
+    assert run_with_pool(monkeypatch, scenario).status_code == 500
+    assert user_log_count("user12") == before
+
+
+def test_rejects_uploads_over_the_row_cap_or_unparseable(monkeypatch):
+    monkeypatch.setattr(routers.vehicle_maintenance, "MAX_IMPORT_ROWS", 2)
+    vehicle_id = vehicle_of("user11")
+    before = user_log_count("user11")
+
+    with client_for(monkeypatch, "user11") as client:
+        too_many = upload(
+            client, "logs.csv", as_csv(import_rows(vehicle_id, 3)), "text/csv"
+        )
+        not_a_list = upload(
+            client, "logs.json", json.dumps({"rows": []}), "application/json"
+        )
+        empty = upload(client, "logs.json", "[]", "application/json")
+
+    assert too_many.status_code == 413
+    assert not_a_list.status_code == 400
+    assert empty.status_code == 400
+    assert user_log_count("user11") == before
+
+
+def test_listings_render_dates_in_the_callers_timezone(monkeypatch):
+    vehicle_id = vehicle_of("user13")
+    with psycopg.connect(TEST_DATABASE_URL, autocommit=True) as conn:
+        # Noon UTC is already the next day in Kiritimati (UTC+14)
+        conn.execute(
+            "UPDATE vehicle_maintenance SET created_date = '2024-03-01 12:00' "
+            "WHERE vehicle_id = %s",
+            [vehicle_id],
+        )
+        conn.execute(
+            "UPDATE vehicle_stats "
+            "SET last_update_timestamp = '2024-03-01 12:00' "
+            "WHERE vehicle_id = %s",
+            [vehicle_id],
+        )
+    routes = {
+        f"/api/vehicle-maintenance/maintenance-logs/{vehicle_id}": (
+            "created_date"
+        ),
+        f"/api/vehicle-maintenance/maintenance-log/{vehicle_id}": (
+            "created_date"
+        ),
+        f"/vehicle_stats/all/{vehicle_id}": "last_update_timestamp",
+        f"/vehicle_stats/{vehicle_id}": "last_update_timestamp",
+    }
+
+    def dates_and_etag(timezone):
+        with client_for(monkeypatch, "user13", timezone) as client:
+            responses = {path: client.get(path) for path in routes}
+        dates = {}
+        for path, response in responses.items():
+            assert response.status_code == 200, path
+            body = response.json()
+            rows = body if isinstance(body, list) else [body]
+            dates[path] = {row[routes[path]] for row in rows}
+        listing = next(iter(routes))
+        return dates, responses[listing].headers["etag"]
+
+    local_dates, local_etag = dates_and_etag("Pacific/Kiritimati")
+    default_dates, default_etag = dates_and_etag(DEFAULT_TIMEZONE)
+
+    assert all(dates == {"2024-03-02"} for dates in local_dates.values())
+    assert all(dates == {"2024-03-01"} for dates in default_dates.values())
+    assert local_etag != default_etag
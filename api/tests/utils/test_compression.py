@@ -0,0 +1,85 @@
+import gzip
+import json
+
+from fastapi import FastAPI
+from fastapi.responses import JSONResponse, StreamingResponse
+from fastapi.testclient import TestClient
+
+from utils.compression import CompressionMiddleware, negotiate_encoding
+
+ROWS = [{"id": i, "maintenance_type": "Oil change"} for i in range(200)]
+
+app = FastAPI()
+app.add_middleware(CompressionMiddleware, minimum_size=500)
+
+
+@app.get("/large")
+async def large():
+    return JSONResponse(ROWS)
+
+
+@app.get("/tagged")
+async def tagged():
+    return JSONResponse(ROWS, headers={"ETag": '"v1"'})
+
+
+@app.get("/small")
+async def small():
+    return {"ok": True}
+
+
+@app.get("/stream")
+async def stream():
+    async def lines():
+        for row in ROWS:
+            yield json.dumps(row) + "\n"
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+
+client = TestClient(app)
+
+
+def test_compresses_large_responses():
+    response = client.get("/large", headers={"Accept-Encoding": "gzip"})
+
+    assert response.headers["content-encoding"] == "gzip"
+    assert response.headers["vary"] == "Accept-Encoding"
+    assert response.json() == ROWS
+
+
+def test_leaves_small_and_unnegotiated_responses_alone():
+    small = client.get("/small", headers={"Accept-Encoding": "gzip"})
+    identity = client.get("/large", headers={"Accept-Encoding": "identity"})
+
+    assert "content-encoding" not in small.headers
+    assert small.json() == {"ok": True}
+    assert "content-encoding" not in identity.headers
+    assert identity.json() == ROWS
+
+
+def test_compressed_responses_get_a_weak_etag():
+    compressed = client.get("/tagged", headers={"Accept-Encoding": "gzip"})
+    identity = client.get("/tagged", headers={"Accept-Encoding": "identity"})
+
+    assert compressed.headers["etag"] == 'W/"v1"'
+    assert identity.headers["etag"] == '"v1"'
+
+
+def test_compresses_streaming_responses_chunk_by_chunk():
+    with client.stream(
+        "GET", "/stream", headers={"Accept-Encoding": "gzip"}
+    ) as response:
+        raw = b"".join(response.iter_raw())
+
+    assert response.headers["content-encoding"] == "gzip"
+    lines = gzip.decompress(raw).decode().splitlines()
+    assert [json.loads(line) for line in lines] == ROWS
+
+
+def test_negotiation_honours_q_values():
+    assert negotiate_encoding("gzip;q=0, *;q=0.5") == (
+        "br" if negotiate_encoding("br") else None
+    )
+    assert negotiate_encoding("deflate") is None
+    assert negotiate_encoding("gzip, deflate") == "gzip"
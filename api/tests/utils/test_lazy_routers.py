@@ -0,0 +1,55 @@
+import importlib
+import sys
+import types
+
+from fastapi import APIRouter, FastAPI
+from fastapi.testclient import TestClient
+
+from utils.lazy_routers import LazyRouterMiddleware
+
+
+def test_every_route_is_under_its_routers_prefixes():
+    from main import ROUTERS
+
+    for module_name, prefixes in ROUTERS.items():
+        others = tuple(
+            prefix
+            for other, other_prefixes in ROUTERS.items()
+            if other != module_name
+            for prefix in other_prefixes
+        )
+        router = importlib.import_module(module_name).router
+        for route in router.routes:
+            assert route.path.startswith(prefixes), route.path
+            assert not route.path.startswith(others), route.path
+
+
+def fake_router_module(name, path):
+    router = APIRouter()
+
+    @router.get(path)
+    async def endpoint():
+        return {"router": name}
+
+    module = types.ModuleType(name)
+    module.router = router
+    sys.modules[name] = module
+    return module
+
+
+def test_includes_a_router_on_its_first_request():
+    fake_router_module("lazy_things", "/things/{thing_id}")
+    fake_router_module("lazy_widgets", "/widgets")
+    app = FastAPI()
+    app.add_middleware(
+        LazyRouterMiddleware,
+        routers={"lazy_things": ("/things/",), "lazy_widgets": ("/widgets",)},
+    )
+    client = TestClient(app)
+
+    assert client.get("/things/1").json() == {"router": "lazy_things"}
+    assert client.get("/nothing").status_code == 404
+    assert set(app.openapi()["paths"]) == {"/things/{thing_id}"}
+
+    schema = client.get("/openapi.json").json()
+    assert set(schema["paths"]) == {"/things/{thing_id}", "/widgets"}
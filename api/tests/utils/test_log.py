@@ -0,0 +1,106 @@
+import json
+import logging
+import sys
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from utils.log import (
+    JSONFormatter,
+    NonBlockingQueueHandler,
+    RequestIDFilter,
+    RequestIDMiddleware,
+    SamplingFilter,
+    current_request_id,
+    parse_sample_rates,
+    request_id,
+)
+
+app = FastAPI()
+app.add_middleware(RequestIDMiddleware)
+
+
+@app.get("/id")
+async def read_id():
+    return {"request_id": current_request_id()}
+
+
+client = TestClient(app)
+
+
+def make_record(name="queries.vehicles", level=logging.INFO, **extra):
+    record = logging.LogRecord(
+        name, level, __file__, 1, "%s %s", ("a", 1), None
+    )
+    record.__dict__.update(extra)
+    return record
+
+
+def test_json_formatter_includes_request_id_and_extra_fields():
+    record = make_record(slow_query={"ms": 300.0})
+    token = request_id.set("abc")
+    RequestIDFilter().filter(record)
+    request_id.reset(token)
+
+    entry = json.loads(JSONFormatter().format(record))
+
+    assert entry["message"] == "a 1"
+    assert entry["logger"] == "queries.vehicles"
+    assert entry["level"] == "INFO"
+    assert entry["request_id"] == "abc"
+    assert entry["slow_query"] == {"ms": 300.0}
+
+
+def test_sampling_uses_the_most_specific_logger_and_spares_warnings():
+    sampling = SamplingFilter(
+        parse_sample_rates("utils=1,utils.authentication=0")
+    )
+
+    assert not sampling.filter(make_record("utils.authentication"))
+    assert not sampling.filter(make_record("utils.authentication.jwt"))
+    assert sampling.filter(make_record("utils.etag"))
+    assert sampling.filter(make_record("queries.vehicles"))
+    assert sampling.filter(
+        make_record("utils.authentication", level=logging.WARNING)
+    )
+    assert sampling.dropped == 2
+
+
+def test_queue_handler_drops_instead_of_blocking_when_full():
+    handler = NonBlockingQueueHandler(maxsize=1)
+
+    handler.handle(make_record())
+    handler.handle(make_record())
+
+    assert handler.queue.qsize() == 1
+    assert handler.dropped == 1
+    queued = handler.queue.get_nowait()
+    assert queued.getMessage() == "a 1" and queued.args is None
+
+
+def test_queue_handler_keeps_the_traceback_apart_from_the_message():
+    handler = NonBlockingQueueHandler(maxsize=1)
+    try:
+        raise ValueError("boom")
+    except ValueError:
+        record = make_record()
+        record.exc_info = sys.exc_info()
+    handler.handle(record)
+
+    entry = json.loads(JSONFormatter().format(handler.queue.get_nowait()))
+
+    assert entry["message"] == "a 1"
+    assert "ValueError: boom" in entry["exception"]
+
+
+def test_request_id_is_generated_or_taken_from_the_header():
+    generated = client.get("/id")
+    forwarded = client.get("/id", headers={"X-Request-ID": "lb-123"})
+    bogus = client.get("/id", headers={"X-Request-ID": "bad id\n"})
+
+    assert generated.json()["request_id"] == generated.headers["x-request-id"]
+    assert len(generated.headers["x-request-id"]) == 32
+    assert forwarded.headers["x-request-id"] == "lb-123"
+    assert forwarded.json()["request_id"] == "lb-123"
+    assert bogus.headers["x-request-id"] != "bad id\n"
+    assert current_request_id() is None
@@ -0,0 +1,65 @@
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+import routers.metrics
+from utils.metrics import (
+    MetricsMiddleware,
+    Registry,
+    request_duration,
+    responses,
+)
+
+
+def test_renders_counters_and_cumulative_histograms():
+    registry = Registry()
+    requests = registry.counter("requests_total", "Requests", ["route"])
+    latency = registry.histogram("latency_seconds", "Latency", buckets=[1, 5])
+    requests.inc("/a")
+    requests.inc("/a")
+    latency.observe(0.5)
+    latency.observe(3)
+
+    lines = registry.render().splitlines()
+    assert "# TYPE requests_total counter" in lines
+    assert 'requests_total{route="/a"} 2' in lines
+    assert 'latency_seconds_bucket{le="1"} 1' in lines
+    assert 'latency_seconds_bucket{le="5"} 2' in lines
+    assert 'latency_seconds_bucket{le="+Inf"} 2' in lines
+    assert "latency_seconds_sum 3.5" in lines
+    assert "latency_seconds_count 2" in lines
+
+
+def test_middleware_labels_by_route_template():
+    app = FastAPI()
+    app.add_middleware(MetricsMiddleware)
+
+    @app.get("/metrics-test/{item_id}")
+    async def item(item_id: int):
+        return {"id": item_id}
+
+    client = TestClient(app)
+    client.get("/metrics-test/1")
+    client.get("/metrics-test/2")
+    client.get("/metrics-test/nope")
+    client.get("/not-a-route")
+
+    route = "/metrics-test/{item_id}"
+    assert responses.value("GET", route, "200") == 2
+    assert responses.value("GET", route, "422") == 1
+    assert responses.value("GET", "unmatched", "404") >= 1
+    assert request_duration.count("GET", route) == 3
+
+
+def test_endpoint_requires_the_token(monkeypatch):
+    app = FastAPI()
+    app.include_router(routers.metrics.router)
+    client = TestClient(app)
+
+    monkeypatch.setattr(routers.metrics, "METRICS_TOKEN", None)
+    assert client.get("/metrics").status_code == 404
+
+    monkeypatch.setattr(routers.metrics, "METRICS_TOKEN", "secret")
+    assert client.get("/metrics").status_code == 401
+    scrape = client.get("/metrics", headers={"Authorization": "Bearer secret"})
+    assert scrape.status_code == 200
+    assert "log_records_dropped_total" in scrape.text
@@ -0,0 +1,58 @@
+import asyncio
+import threading
+
+import pytest
+from fastapi import HTTPException
+
+from utils.password_hashing import PasswordHashingPool
+
+
+def test_rejects_with_503_once_saturated():
+    hashing_pool = PasswordHashingPool(workers=1, max_pending=2)
+    release = threading.Event()
+
+    async def scenario():
+        running = [
+            asyncio.ensure_future(hashing_pool.run(release.wait))
+            for _ in range(2)
+        ]
+        await asyncio.sleep(0)
+        with pytest.raises(HTTPException) as exc_info:
+            await hashing_pool.run(release.wait)
+        release.set()
+        await asyncio.gather(*running)
+        return exc_info.value
+
+    error = asyncio.run(scenario())
+    hashing_pool.shutdown()
+
+    assert error.status_code == 503
+    assert "Retry-After" in error.headers
+    assert hashing_pool.stats()["rejected"] == 1
+    assert hashing_pool.stats()["completed"] == 2
+    assert hashing_pool.stats()["pending"] == 0
+
+
+def test_password_round_trip():
+    from utils.authentication import hash_password, verify_password
+
+    async def scenario():
+        hashed = await hash_password("hunter2")
+        return (
+            await verify_password("hunter2", hashed),
+            await verify_password("wrong", hashed),
+        )
+
+    assert asyncio.run(scenario()) == (True, False)
+
+
+def test_runs_again_after_shutdown():
+    hashing_pool = PasswordHashingPool(workers=1, max_pending=2)
+
+    async def scenario():
+        return await hashing_pool.run(sum, [1, 2])
+
+    assert asyncio.run(scenario()) == 3
+    hashing_pool.shutdown()
+    assert asyncio.run(scenario()) == 3
+    hashing_pool.shutdown()
@@ -0,0 +1,123 @@
+import asyncio
+import time
+
+from limits import parse
+from limits.strategies import FixedWindowRateLimiter
+
+from utils.rate_limit_storage import DatabaseStorage
+
+
+class FakeCounterRepo:
+    """
+    In-memory stand-in for RateLimitCounterRepo, shared by the storages
+    playing separate workers
+    """
+
+    def __init__(self):
+        self.counters = {}
+        self.batches = 0
+
+    async def add_hits(self, keys, amounts, expiries):
+        self.batches += 1
+        now = time.time()
+        rows = []
+        for key, amount, expiry in zip(keys, amounts, expiries):
+            count, expires_at = self.counters.get(key, (0, 0))
+            if expires_at <= now:
+                count, expires_at = 0, now + expiry
+            self.counters[key] = (count + amount, expires_at)
+            rows.append((key, *self.counters[key]))
+        return rows
+
+    async def get_counts(self, keys):
+        now = time.time()
+        return [
+            (key, *self.counters[key])
+            for key in keys
+            if key in self.counters and self.counters[key][1] > now
+        ]
+
+    async def delete(self, keys):
+        for key in keys:
+            self.counters.pop(key, None)
+
+    async def delete_all(self):
+        self.counters.clear()
+
+
+def test_counts_hits_from_every_worker_after_a_sync():
+    repo = FakeCounterRepo()
+    workers = [DatabaseStorage(repo=repo), DatabaseStorage(repo=repo)]
+    limiters = [FixedWindowRateLimiter(worker) for worker in workers]
+    limit = parse("5/minute")
+
+    # Before a sync each worker only knows its own hits
+    assert all(limiters[0].hit(limit, "client") for _ in range(3))
+    assert all(limiters[1].hit(limit, "client") for _ in range(2))
+    assert repo.batches == 0
+
+    # The first worker to sync only sees its own hits in Postgres, it
+    # picks up the other's on the next round
+    for _ in range(2):
+        for worker in workers:
+            asyncio.run(worker.sync())
+    assert repo.counters[limit.key_for("client")][0] == 5
+    assert repo.batches == 2
+    assert not limiters[0].hit(limit, "client")
+    assert not limiters[1].hit(limit, "client")
+
+
+def test_failed_sync_keeps_the_hits_for_the_next_one():
+    class FailingOnce(FakeCounterRepo):
+        failed = False
+
+        async def add_hits(self, *args):
+            if not self.failed:
+                self.failed = True
+                raise ConnectionError("database went away")
+            return await super().add_hits(*args)
+
+    repo = FailingOnce()
+    storage = DatabaseStorage(repo=repo)
+    storage.incr("key", 60, amount=2)
+    try:
+        asyncio.run(storage.sync())
+    except ConnectionError:
+        pass
+    assert storage.get("key") == 2
+
+    asyncio.run(storage.sync())
+    assert repo.counters["key"][0] == 2
+    assert storage.get("key") == 2
+
+
+def test_clear_and_reset_reach_the_database():
+    repo = FakeCounterRepo()
+    storage = DatabaseStorage(repo=repo)
+    storage.incr("a", 60)
+    storage.incr("b", 60)
+    asyncio.run(storage.sync())
+
+    storage.clear("a")
+    asyncio.run(storage.sync())
+    assert set(repo.counters) == {"b"}
+
+    storage.reset()
+    asyncio.run(storage.sync())
+    assert repo.counters == {}
+
+
+def test_hits_start_a_sync_when_no_background_task_runs(monkeypatch):
+    monkeypatch.setattr("utils.rate_limit_storage.RATE_LIMIT_SYNC_SECONDS", 0)
+    repo = FakeCounterRepo()
+    storage = DatabaseStorage(repo=repo)
+    limiter = FixedWindowRateLimiter(storage)
+
+    async def scenario():
+        limiter.hit(parse("5/minute"), "client")
+        await storage._sync_task
+
+    asyncio.run(scenario())
+
+    assert repo.batches == 1
+    assert repo.counters[next(iter(repo.counters))][0] == 1
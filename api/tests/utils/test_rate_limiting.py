@@ -0,0 +1,124 @@
+from types import SimpleNamespace
+
+from limits import parse
+from limits.storage import MemoryStorage
+from starlette.requests import Request
+
+from utils import token_bucket
+from utils.authentication import generate_jwt, verify_jwt
+from utils.rate_limiting import (
+    TieredRateLimiter,
+    get_rate_limit_key,
+    limiter,
+    rate_limit_storage,
+)
+from utils.revocation import revocation_store
+from utils.token_bucket import TokenBucketRateLimiter
+
+FIVE_PER_MINUTE = parse("5/minute")
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_bucket_allows_a_burst_then_refills_lazily(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(token_bucket.time, "monotonic", clock)
+    buckets = TokenBucketRateLimiter(MemoryStorage())
+
+    assert all(buckets.hit(FIVE_PER_MINUTE, "client") for _ in range(5))
+    assert not buckets.hit(FIVE_PER_MINUTE, "client")
+
+    # 5/minute refills one token every 12 seconds
+    clock.now += 12
+    assert buckets.hit(FIVE_PER_MINUTE, "client")
+    assert not buckets.hit(FIVE_PER_MINUTE, "client")
+
+    clock.now += 3600
+    assert buckets.get_window_stats(FIVE_PER_MINUTE, "client").remaining == 5
+
+
+def test_evicts_the_least_recently_used_bucket():
+    buckets = TokenBucketRateLimiter(MemoryStorage(), max_buckets=2)
+    for client in ("a", "b", "a", "c"):
+        buckets.hit(FIVE_PER_MINUTE, client)
+    assert len(buckets) == 2
+    assert buckets.get_window_stats(FIVE_PER_MINUTE, "a").remaining == 3
+
+
+def test_plans_scale_the_limit():
+    limiter = TieredRateLimiter(TokenBucketRateLimiter(MemoryStorage()))
+    free = [limiter.hit(FIVE_PER_MINUTE, "user:1:free") for _ in range(6)]
+    fleet = [limiter.hit(FIVE_PER_MINUTE, "user:2:fleet") for _ in range(50)]
+    assert free.count(True) == 5
+    assert all(fleet)
+    assert not limiter.hit(FIVE_PER_MINUTE, "user:2:fleet")
+
+
+def request_with(headers=None):
+    return Request(
+        {
+            "type": "http",
+            "headers": [
+                (name.lower().encode(), value.encode())
+                for name, value in (headers or {}).items()
+            ],
+            "client": ("203.0.113.7", 5000),
+        }
+    )
+
+
+def test_keys_on_the_user_when_the_token_is_valid():
+    user = SimpleNamespace(
+        id=42,
+        username="driver",
+        email="driver@example.com",
+        timezone="UTC",
+        plan="plus",
+    )
+    token = generate_jwt(user)
+
+    assert (
+        get_rate_limit_key(request_with({"Authorization": f"Bearer {token}"}))
+        == "user:42:plus"
+    )
+    assert (
+        get_rate_limit_key(request_with({"Cookie": f"fast_api_token={token}"}))
+        == "user:42:plus"
+    )
+    assert get_rate_limit_key(request_with()) == "203.0.113.7"
+    assert (
+        get_rate_limit_key(request_with({"Authorization": "Bearer nope"}))
+        == "203.0.113.7"
+    )
+
+
+def test_revoked_tokens_fall_back_to_the_client_address():
+    user = SimpleNamespace(
+        id=43,
+        username="fleet",
+        email="fleet@example.com",
+        timezone="UTC",
+        plan="fleet",
+    )
+    token = generate_jwt(user)
+    payload = verify_jwt(token)
+    revocation_store._revoked.set(payload.jti, True, payload.exp)
+
+    assert (
+        get_rate_limit_key(request_with({"Authorization": f"Bearer {token}"}))
+        == "203.0.113.7"
+    )
+
+
+def test_limiter_uses_the_tiered_strategy_and_our_storage():
+    # Both are set through private slowapi attributes, a slowapi upgrade
+    # that renames them would otherwise quietly drop the plan tiers
+    assert isinstance(limiter._limiter, TieredRateLimiter)
+    assert limiter._limiter.storage is rate_limit_storage
+    assert limiter.limiter is limiter._limiter
@@ -0,0 +1,134 @@
+import asyncio
+import json
+
+import pytest
+
+from utils.read_cache import (
+    MemoryBackend,
+    NullBackend,
+    ReadThroughCache,
+    RedisBackend,
+)
+
+
+class FakeRedis:
+    """
+    Stand-in for redis.asyncio.Redis with just what RedisBackend uses
+    """
+
+    def __init__(self):
+        self.data = {}
+
+    async def get(self, key):
+        return self.data.get(key)
+
+    async def set(self, key, value, ex=None):
+        self.data[key] = value
+
+    async def incr(self, key):
+        self.data[key] = int(self.data.get(key, 0)) + 1
+        return self.data[key]
+
+    async def expire(self, key, seconds):
+        pass
+
+
+class BrokenRedis(FakeRedis):
+    async def get(self, key):
+        raise ConnectionError("redis is down")
+
+
+def make_cache(backend):
+    return ReadThroughCache(
+        "test", backend=backend, ttl=30, dumps=json.dumps, loads=json.loads
+    )
+
+
+@pytest.mark.parametrize(
+    "backend", [MemoryBackend, lambda: RedisBackend(FakeRedis())]
+)
+def test_reads_through_and_invalidates(backend):
+    cache = make_cache(backend())
+    loads = []
+
+    async def loader():
+        loads.append(1)
+        return [len(loads)]
+
+    async def scenario():
+        first = await cache.get_or_load("user1", "page1", loader)
+        second = await cache.get_or_load("user1", "page1", loader)
+        await cache.invalidate("user1")
+        third = await cache.get_or_load("user1", "page1", loader)
+        return first, second, third
+
+    assert asyncio.run(scenario()) == ([1], [1], [2])
+    assert cache.stats() == {
+        "hits": 1,
+        "misses": 2,
+        "invalidations": 1,
+        "errors": 0,
+    }
+
+
+def test_failing_backend_falls_through_to_the_loader():
+    cache = make_cache(RedisBackend(BrokenRedis()))
+
+    async def loader():
+        return ["fresh"]
+
+    assert asyncio.run(cache.get_or_load("user1", "page1", loader)) == [
+        "fresh"
+    ]
+    assert cache.stats()["errors"] == 1
+
+
+def test_null_backend_always_loads():
+    cache = make_cache(NullBackend())
+    loads = []
+
+    async def loader():
+        loads.append(1)
+        return [len(loads)]
+
+    async def scenario():
+        return [
+            await cache.get_or_load("user1", "page1", loader) for _ in "ab"
+        ]
+
+    assert asyncio.run(scenario()) == [[1], [2]]
+
+
+def test_caches_sharing_a_name_and_backend_invalidate_together():
+    backend = MemoryBackend()
+    pages, versions = make_cache(backend), make_cache(backend)
+    loads = []
+
+    async def loader():
+        loads.append(1)
+        return len(loads)
+
+    async def scenario():
+        await pages.get_or_load("user1", "page1", loader)
+        await versions.get_or_load("user1", "version", loader)
+        await pages.invalidate("user1")
+        return await versions.get_or_load("user1", "version", loader)
+
+    assert asyncio.run(scenario()) == 3
+
+
+def test_memory_backend_bounds_generations_without_resurrecting_entries():
+    backend = MemoryBackend(maxsize=2)
+
+    async def scenario():
+        await backend.set("user1:0:page1", "stale", ttl=30)
+        await backend.bump_generation("user1", ttl=30)
+        # Pushes user1's generation out of the LRU
+        await backend.bump_generation("user2", ttl=30)
+        await backend.bump_generation("user3", ttl=30)
+        return await backend.generation("user1")
+
+    generation = asyncio.run(scenario())
+
+    assert len(backend._generations) == 2
+    assert generation >= 1
@@ -0,0 +1,40 @@
+from datetime import date
+from decimal import Decimal
+
+import orjson
+from pydantic import BaseModel, Field
+
+from models.vehicle_maintenance import Error, VehicleMaintenanceOut
+from utils.responses import FastJSONResponse
+
+
+class AliasedCost(BaseModel):
+    amount: Decimal = Field(serialization_alias="cost")
+
+
+def test_renders_models_dates_decimals_and_errors():
+    log = VehicleMaintenanceOut(
+        id=1,
+        vehicle_id=2,
+        maintenance_type="oil",
+        mileage=1000,
+        cost=50,
+        description="desc",
+        service_date=date(2024, 1, 2),
+        created_date=date(2024, 1, 3),
+    )
+    body = FastJSONResponse(
+        {
+            "logs": [log],
+            "error": Error(detail="nope"),
+            "total": Decimal("12.50"),
+            "aliased": AliasedCost(amount=Decimal("1.25")),
+        }
+    ).body
+
+    assert orjson.loads(body) == {
+        "logs": [orjson.loads(log.model_dump_json())],
+        "error": {"message": None, "detail": "nope"},
+        "total": 12.5,
+        "aliased": {"cost": 1.25},
+    }
@@ -1,74 +1,150 @@
+import logging
 import os
-import bcrypt
+import uuid
 from calendar import timegm
 from datetime import datetime, timedelta
-from fastapi import Cookie, Header
-from jose import JWTError, jwt
-from jose.constants import ALGORITHMS
+from fastapi import Cookie, Depends, Header
 from typing import Annotated, Optional, Union
 from models.jwt import JWTPayload, JWTUserData
+from utils.cache import LRUCache
+from utils.password_hashing import password_hashing_pool
+from utils.revocation import revocation_store
+from utils.timezone import set_request_timezone
 
 from queries.user_queries import UserWithPw
 
+logger = logging.getLogger(__name__)
+
 # If you ever need to change the hashing algorithm, you can change it here
-ALGORITHM = ALGORITHMS.HS256
+ALGORITHM = "HS256"
+
+# jose and bcrypt are imported where they're used rather than here, they
+# add ~50 ms to every cold start and most requests only hit the
+# verified_tokens cache
 
 # We pull this from the environment
 SIGNING_KEY = os.environ.get("SIGNING_KEY")
 if not SIGNING_KEY:
     raise ValueError("SIGNING_KEY environment variable not set")
 
+# Tokens that already passed signature and expiry checks, so the same
+# token sent on every request of a page load is only verified once.
+# Entries drop out at the token's exp, revocation is still checked on
+# every request by try_get_jwt_payload.
+JWT_CACHE_SIZE = int(os.environ.get("JWT_CACHE_SIZE", 10_000))
+verified_tokens = LRUCache(JWT_CACHE_SIZE)
+
 
 async def decode_jwt(token: str) -> Optional[JWTPayload]:
     """
     Helper function to decode the JWT from a token string
     """
+    return verify_jwt(token)
+
+
+def verify_jwt(token: str) -> Optional[JWTPayload]:
+    """
+    Checks the token's signature and expiry (not revocation), for
+    callers outside the dependency chain such as the rate limit key
+    """
+    cached = verified_tokens.get(token)
+    if cached is not None:
+        return cached
+    from jose import JWTError, jwt
+
     try:
-        payload = jwt.decode(token, SIGNING_KEY, algorithms=[ALGORITHM])
-        return JWTPayload(**payload)
+        payload = JWTPayload(
+            **jwt.decode(token, SIGNING_KEY, algorithms=[ALGORITHM])
+        )
+        verified_tokens.set(token, payload, payload.exp)
+        return payload
     except (JWTError, AttributeError) as e:
-        print(f"JWT decoding error: {e}")
+        logger.debug("JWT decoding error: %s", e)
     return None
 
 
-async def try_get_jwt_user_data(
+async def get_jwt_token(
     fast_api_token: Annotated[Optional[str], Cookie()] = None,
     authorization: Annotated[Optional[str], Header()] = None,
-) -> Optional[JWTUserData]:
-    token = fast_api_token
+) -> Optional[str]:
+    """
+    Pulls the raw JWT from the auth cookie, or failing that from a
+    Bearer Authorization header
+    """
+    return extract_jwt_token(fast_api_token, authorization)
+
+
+def extract_jwt_token(
+    cookie: Optional[str], authorization: Optional[str]
+) -> Optional[str]:
+    token = cookie
     if not token and authorization:
         if authorization.startswith("Bearer "):
             token = authorization[len("Bearer ") :]  # noqa: E203
+    return token
+
 
+async def try_get_jwt_payload(
+    token: Annotated[Optional[str], Depends(get_jwt_token)],
+) -> Optional[JWTPayload]:
+    """
+    Decodes the request's JWT, returning None if it is missing, invalid
+    or has been revoked
+    """
     if not token:
-        print("No JWT token found in cookies or Authorization header.")
+        logger.debug("No JWT token found in cookies or Authorization header.")
         return None
 
     payload = await decode_jwt(token)
     if not payload:
-        print("JWT token decoding failed or payload is empty.")
+        logger.debug("JWT token decoding failed or payload is empty.")
+        return None
+    if payload.jti and await revocation_store.is_revoked(payload.jti):
+        # Rare, and worth seeing every time
+        logger.warning(f"Revoked JWT {payload.jti} was presented")
+        verified_tokens.pop(token)
+        return None
+    return payload
+
+
+async def try_get_jwt_user_data(
+    payload: Annotated[Optional[JWTPayload], Depends(try_get_jwt_payload)],
+) -> Optional[JWTUserData]:
+    if not payload:
         return None
+    # Repositories render dates in this user's timezone for the request
+    set_request_timezone(payload.user.timezone)
     return payload.user
 
 
-def verify_password(plain_password, hashed_password) -> bool:
+async def verify_password(plain_password, hashed_password) -> bool:
     """
     This verifies the user's password, by hashing the plain
     password and then comparing it to the hashed password
     from the database
+
+    bcrypt runs on the password hashing pool, so this raises a 503
+    when that pool is saturated
     """
-    return bcrypt.checkpw(
-        plain_password.encode("utf-8"), hashed_password.encode("utf-8")
+    import bcrypt
+
+    return await password_hashing_pool.run(
+        bcrypt.checkpw,
+        plain_password.encode("utf-8"),
+        hashed_password.encode("utf-8"),
     )
 
 
-def hash_password(plain_password) -> str:
+async def hash_password(plain_password) -> str:
     """
-    Helper function that hashes a password
+    Helper function that hashes a password on the password hashing pool
     """
-    return bcrypt.hashpw(
-        plain_password.encode("utf-8"), bcrypt.gensalt()
-    ).decode()
+    import bcrypt
+
+    hashed = await password_hashing_pool.run(
+        bcrypt.hashpw, plain_password.encode("utf-8"), bcrypt.gensalt()
+    )
+    return hashed.decode()
 
 
 def generate_jwt(user: UserWithPw) -> str:
@@ -78,13 +154,22 @@ def generate_jwt(user: UserWithPw) -> str:
     We store the user as a JWTUserData converted to a dictionary
     in the payload of the JWT
     """
+    from jose import jwt
+
     exp = timegm((datetime.utcnow() + timedelta(hours=1)).utctimetuple())
     jwt_data = JWTPayload(
         exp=exp,
         sub=user.username,
-        user=JWTUserData(username=user.username, id=user.id, email=user.email),
+        user=JWTUserData(
+            username=user.username,
+            id=user.id,
+            email=user.email,
+            timezone=user.timezone,
+            plan=user.plan,
+        ),
+        jti=uuid.uuid4().hex,
     )
     encoded_jwt = jwt.encode(
-        jwt_data.model_dump(), SIGNING_KEY, algorithm=ALGORITHMS.HS256
+        jwt_data.model_dump(), SIGNING_KEY, algorithm=ALGORITHM
     )
     return encoded_jwt
@@ -0,0 +1,228 @@
+"""
+Negotiated gzip/brotli response compression
+
+Pure ASGI middleware, so it also handles StreamingResponse (the
+maintenance export) without buffering the whole body: each chunk is
+compressed and flushed as it arrives, so clients still see data as soon
+as it's produced.
+
+Responses stay uncompressed when:
+- the client didn't ask for gzip or br (Accept-Encoding)
+- the body is smaller than COMPRESSION_MINIMUM_SIZE; streamed bodies
+  are held back only until that many bytes have arrived
+- the content type isn't text-like, or the app already set a
+  Content-Encoding
+
+Compressed responses turn a strong ETag weak, since the encoded bodies
+differ byte for byte. If-None-Match uses the weak comparison, so
+conditional requests still match (see utils/etag.py).
+
+brotli is optional. Without the package installed only gzip is offered.
+"""
+
+import os
+import zlib
+from typing import Dict, Optional
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - depends on the deployment
+    brotli = None
+
+COMPRESSION_MINIMUM_SIZE = int(
+    os.environ.get("COMPRESSION_MINIMUM_SIZE", 1024)
+)
+# gzip: 1 (fastest) to 9 (smallest). brotli: 0 to 11, the higher levels
+# are far too slow for per-request use
+COMPRESSION_LEVEL = int(os.environ.get("COMPRESSION_LEVEL", 6))
+BROTLI_QUALITY = int(os.environ.get("BROTLI_QUALITY", 4))
+
+COMPRESSIBLE_TYPES = (
+    "application/json",
+    "application/x-ndjson",
+    "application/javascript",
+    "application/xml",
+    "image/svg+xml",
+    "text/",
+)
+
+
+def parse_accept_encoding(header: str) -> Dict[str, float]:
+    """
+    Maps each coding in an Accept-Encoding header to its q-value
+    """
+    codings = {}
+    for part in header.split(","):
+        coding, _, params = part.strip().partition(";")
+        if not coding:
+            continue
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        codings[coding.strip().lower()] = q
+    return codings
+
+
+def negotiate_encoding(header: str) -> Optional[str]:
+    codings = parse_accept_encoding(header)
+    wildcard = codings.get("*", 0.0)
+    offered = ["br", "gzip"] if brotli is not None else ["gzip"]
+    best, best_q = None, 0.0
+    for coding in offered:
+        q = codings.get(coding, wildcard)
+        if q > best_q:
+            best, best_q = coding, q
+    return best
+
+
+class _GzipEncoder:
+    def __init__(self, level: int):
+        self._compressor = zlib.compressobj(
+            level, zlib.DEFLATED, 16 + zlib.MAX_WBITS
+        )
+
+    def chunk(self, data: bytes) -> bytes:
+        # Sync flush so a streamed chunk is decodable on arrival
+        return self._compressor.compress(data) + self._compressor.flush(
+            zlib.Z_SYNC_FLUSH
+        )
+
+    def finish(self, data: bytes) -> bytes:
+        return self._compressor.compress(data) + self._compressor.flush()
+
+
+class _BrotliEncoder:
+    def __init__(self, quality: int):
+        self._compressor = brotli.Compressor(quality=quality)
+
+    def chunk(self, data: bytes) -> bytes:
+        return self._compressor.process(data) + self._compressor.flush()
+
+    def finish(self, data: bytes) -> bytes:
+        return self._compressor.process(data) + self._compressor.finish()
+
+
+class CompressionMiddleware:
+    def __init__(
+        self,
+        app,
+        minimum_size: int = COMPRESSION_MINIMUM_SIZE,
+        level: int = COMPRESSION_LEVEL,
+        brotli_quality: int = BROTLI_QUALITY,
+    ):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.level = level
+        self.brotli_quality = brotli_quality
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        accept_encoding = ""
+        for name, value in scope["headers"]:
+            if name == b"accept-encoding":
+                accept_encoding = value.decode("latin-1")
+                break
+        encoding = negotiate_encoding(accept_encoding)
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+        responder = _CompressedResponder(self, encoding, send)
+        await self.app(scope, receive, responder.send)
+
+    def encoder(self, encoding: str):
+        if encoding == "br":
+            return _BrotliEncoder(self.brotli_quality)
+        return _GzipEncoder(self.level)
+
+
+class _CompressedResponder:
+    def __init__(self, middleware: CompressionMiddleware, encoding, send):
+        self.middleware = middleware
+        self.encoding = encoding
+        self.send_downstream = send
+        self.start_message = None
+        self.passthrough = False
+        self.buffer = bytearray()
+        self.encoder = None
+
+    async def send(self, message):
+        message_type = message["type"]
+        if message_type == "http.response.start":
+            self.start_message = message
+            self.passthrough = not self._compressible(message)
+            if self.passthrough:
+                await self.send_downstream(message)
+            return
+        if message_type != "http.response.body" or self.passthrough:
+            await self.send_downstream(message)
+            return
+
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+        if self.encoder is None:
+            self.buffer += body
+            if len(self.buffer) < self.middleware.minimum_size:
+                if more_body:
+                    return
+                # Too small to be worth it, send it as it came
+                await self.send_downstream(self.start_message)
+                await self.send_downstream(
+                    {"type": "http.response.body", "body": bytes(self.buffer)}
+                )
+                return
+            body, self.buffer = bytes(self.buffer), bytearray()
+            self.encoder = self.middleware.encoder(self.encoding)
+            await self.send_downstream(self._compressed_start())
+
+        if more_body:
+            data = self.encoder.chunk(body)
+            if not data:
+                return
+        else:
+            data = self.encoder.finish(body)
+        await self.send_downstream(
+            {
+                "type": "http.response.body",
+                "body": data,
+                "more_body": more_body,
+            }
+        )
+
+    def _compressible(self, message) -> bool:
+        if message["status"] < 200 or message["status"] in (204, 304):
+            return False
+        content_type = ""
+        for name, value in message.get("headers", []):
+            if name == b"content-encoding":
+                return False
+            if name == b"content-type":
+                content_type = value.decode("latin-1").lower()
+        return content_type.startswith(COMPRESSIBLE_TYPES)
+
+    def _compressed_start(self):
+        headers = []
+        vary = None
+        for name, value in self.start_message.get("headers", []):
+            if name == b"content-length":
+                continue
+            if name == b"vary":
+                vary = value
+                continue
+            if name == b"etag" and not value.startswith(b"W/"):
+                # A strong tag promises byte-identical bodies, which the
+                # encodings aren't. Weak ones still match If-None-Match
+                value = b"W/" + value
+            headers.append((name, value))
+        if vary is None:
+            vary = b"Accept-Encoding"
+        elif b"accept-encoding" not in vary.lower():
+            vary += b", Accept-Encoding"
+        headers.append((b"vary", vary))
+        headers.append((b"content-encoding", self.encoding.encode()))
+        return {**self.start_message, "headers": headers}
@@ -0,0 +1,55 @@
+"""
+Conditional GETs for vehicle and maintenance log reads
+
+Routes look up a version first (a single indexed read of the vehicles
+table, see V12__add_vehicle_row_versions.sql) and build the ETag from
+it. When it matches If-None-Match they answer 304 without loading or
+serializing any rows.
+
+The tag also covers the caller's timezone and the query string, since
+both change the body (local dates, page size and cursor).
+"""
+
+import hashlib
+
+from fastapi import Request, Response, status
+
+from utils.timezone import current_timezone
+
+# Authenticated data, only the browser may keep it and it has to ask
+# before reusing it
+CACHE_CONTROL = "private, no-cache"
+
+
+def make_etag(request: Request, *version) -> str:
+    key = "|".join(
+        [request.url.path, request.url.query, current_timezone()]
+        + [str(part) for part in version]
+    )
+    return f'"{hashlib.blake2b(key.encode(), digest_size=16).hexdigest()}"'
+
+
+def etag_matches(request: Request, etag: str) -> bool:
+    """
+    If-None-Match uses the weak comparison, so W/ prefixes are ignored
+    """
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    candidates = (tag.strip() for tag in header.split(","))
+    return etag in (
+        tag[2:] if tag.startswith("W/") else tag for tag in candidates
+    )
+
+
+def set_etag(response: Response, etag: str):
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = CACHE_CONTROL
+
+
+def not_modified(etag: str) -> Response:
+    response = Response(status_code=status.HTTP_304_NOT_MODIFIED)
+    set_etag(response, etag)
+    return response
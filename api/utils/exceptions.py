@@ -5,3 +5,11 @@ Custom Exceptions for the App
 
 class UserDatabaseException(Exception):
     pass
+
+
+class RecordNotFoundException(Exception):
+    pass
+
+
+class PermissionDeniedException(Exception):
+    pass
@@ -0,0 +1,62 @@
+"""
+Routers included on first use
+
+In LAZY_INIT mode main.py doesn't import the routers up front. Each
+router module is listed with the path prefixes its routes live under,
+and LazyRouterMiddleware imports and includes a router the first time a
+request path matches one of them. A cold start serving /vehicles never
+pays for importing the maintenance import/export or newsletter code.
+
+Requests for the OpenAPI schema or docs include every router first, so
+they always describe the whole API.
+
+tests/utils/test_lazy_routers.py checks every route of every listed
+router sits under that router's prefixes, so a new route can't go
+missing in lazy mode.
+"""
+
+import importlib
+import logging
+from typing import Dict, Iterable, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+LOAD_ALL_PATHS = ("/openapi.json", "/docs", "/redoc")
+
+
+class LazyRouterMiddleware:
+    def __init__(
+        self,
+        app,
+        routers: Dict[str, Tuple[str, ...]],
+        load_all_paths: Iterable[str] = LOAD_ALL_PATHS,
+    ):
+        self.app = app
+        self.routers = routers
+        self.load_all_paths = frozenset(load_all_paths)
+        self.loaded: Set[str] = set()
+
+    def include(self, fastapi_app, module_name: str):
+        module = importlib.import_module(module_name)
+        fastapi_app.include_router(module.router)
+        # Generated from the routes present at the time, start over
+        fastapi_app.openapi_schema = None
+        self.loaded.add(module_name)
+        logger.info(f"Included {module_name} on first use")
+
+    def include_for_path(self, fastapi_app, path: str):
+        if len(self.loaded) == len(self.routers):
+            return
+        load_all = path in self.load_all_paths
+        for module_name, prefixes in self.routers.items():
+            if module_name in self.loaded:
+                continue
+            if load_all or path.startswith(prefixes):
+                self.include(fastapi_app, module_name)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http":
+            # Imports run synchronously on the event loop, so concurrent
+            # first requests can't include a router twice
+            self.include_for_path(scope["app"], scope["path"])
+        await self.app(scope, receive, send)
@@ -0,0 +1,246 @@
+"""
+Structured, non-blocking logging with request IDs
+
+configure_logging() replaces the root handlers with a QueueHandler. The
+request path only formats the message and puts the record on a bounded
+queue; a QueueListener thread serializes it and writes to stdout. When
+the queue is full the record is dropped and counted rather than making
+the request wait on the stream.
+
+Every record carries the request_id of the request that logged it.
+RequestIDMiddleware takes it from an incoming X-Request-ID (e.g. set by
+the load balancer) or generates one, and sends it back on the response,
+so a client report can be matched to the log lines. Tasks started
+during a request (such as the EXPLAIN of a slow query) inherit it.
+
+High-volume loggers can be sampled below WARNING with LOG_SAMPLE_RATES,
+comma-separated `logger=rate` pairs matched on the logger name and its
+children. The default keeps 1% of utils.authentication's per-request
+messages. Warnings and errors are never sampled.
+
+Settings:
+- LOG_LEVEL (default INFO)
+- LOG_FORMAT: json (default), one object per line, or text
+- LOG_QUEUE_SIZE: records waiting for the writer thread
+"""
+
+import atexit
+import logging
+import os
+import queue
+import random
+import re
+import sys
+import time
+import uuid
+from contextvars import ContextVar
+from logging.handlers import QueueHandler, QueueListener
+from typing import Dict, Optional
+
+import orjson
+
+LOG_LEVEL = os.environ.get("LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = os.environ.get("LOG_FORMAT", "json").lower()
+LOG_QUEUE_SIZE = int(os.environ.get("LOG_QUEUE_SIZE", 10_000))
+# Every unauthenticated request logs why at DEBUG
+LOG_SAMPLE_RATES = os.environ.get(
+    "LOG_SAMPLE_RATES", "utils.authentication=0.01"
+)
+
+TEXT_FORMAT = "%(asctime)s %(levelname)s %(name)s [%(request_id)s] %(message)s"
+
+REQUEST_ID_HEADER = b"x-request-id"
+# Incoming IDs end up in every log line, anything else is replaced
+VALID_REQUEST_ID = re.compile(r"[A-Za-z0-9._:-]{1,64}")
+
+request_id: ContextVar[Optional[str]] = ContextVar("request_id", default=None)
+
+# Attributes every LogRecord has, anything else came in through extra=
+RECORD_ATTRIBUTES = set(
+    vars(logging.LogRecord("", 0, "", 0, "", None, None))
+) | {"message", "asctime", "request_id"}
+
+
+def current_request_id() -> Optional[str]:
+    return request_id.get()
+
+
+def parse_sample_rates(spec: str) -> Dict[str, float]:
+    rates = {}
+    for pair in spec.split(","):
+        name, _, rate = pair.partition("=")
+        if name.strip() and rate.strip():
+            rates[name.strip()] = min(max(float(rate), 0.0), 1.0)
+    return rates
+
+
+class RequestIDFilter(logging.Filter):
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.request_id = request_id.get()
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Keeps a random `rate` of the records below WARNING from the loggers
+    in `rates`. The most specific logger name wins
+    """
+
+    def __init__(self, rates: Dict[str, float]):
+        super().__init__()
+        self.rates = rates
+        self.dropped = 0
+        # Logger name -> rate, loggers are few and long-lived
+        self._resolved: Dict[str, float] = {}
+
+    def rate_for(self, name: str) -> float:
+        rate = self._resolved.get(name)
+        if rate is None:
+            rate = 1.0
+            parts = name.split(".")
+            for end in range(len(parts), 0, -1):
+                prefix = ".".join(parts[:end])
+                if prefix in self.rates:
+                    rate = self.rates[prefix]
+                    break
+            self._resolved[name] = rate
+        return rate
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING:
+            return True
+        rate = self.rate_for(record.name)
+        if rate >= 1.0 or random.random() < rate:
+            return True
+        self.dropped += 1
+        return False
+
+
+class NonBlockingQueueHandler(QueueHandler):
+    def __init__(self, maxsize: int = LOG_QUEUE_SIZE):
+        super().__init__(queue.Queue(maxsize))
+        self.dropped = 0
+        self._exception_formatter = logging.Formatter()
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Resolve the message and traceback now, the arguments may
+        # change before the writer thread gets to them. Unlike the
+        # default this leaves them in separate fields for the formatter
+        record = logging.makeLogRecord(vars(record))
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = self._exception_formatter.formatException(
+                record.exc_info
+            )
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class JSONFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": time.strftime(
+                "%Y-%m-%dT%H:%M:%S", time.gmtime(record.created)
+            )
+            + f".{int(record.msecs):03d}Z",
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        if getattr(record, "request_id", None):
+            entry["request_id"] = record.request_id
+        for key, value in vars(record).items():
+            if key not in RECORD_ATTRIBUTES:
+                entry[key] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry["exception"] = record.exc_text
+        return orjson.dumps(entry, default=str).decode()
+
+
+class TextFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        if not getattr(record, "request_id", None):
+            record.request_id = "-"
+        return super().format(record)
+
+
+log_sampling = SamplingFilter(parse_sample_rates(LOG_SAMPLE_RATES))
+log_queue_handler = NonBlockingQueueHandler()
+log_queue_handler.addFilter(log_sampling)
+# Handler filters run before the record is queued, so in the context of
+# the request that logged it
+log_queue_handler.addFilter(RequestIDFilter())
+
+_listener: Optional[QueueListener] = None
+
+
+def configure_logging(
+    level: str = LOG_LEVEL, fmt: str = LOG_FORMAT, stream=None
+) -> QueueListener:
+    """
+    Routes the root logger through the queue and starts the writer
+    thread, once per process. It's stopped, and the queue drained, at
+    exit
+    """
+    global _listener
+    if _listener is not None:
+        return _listener
+    output = logging.StreamHandler(stream or sys.stdout)
+    output.setFormatter(
+        JSONFormatter() if fmt == "json" else TextFormatter(TEXT_FORMAT)
+    )
+    root = logging.getLogger()
+    for existing in root.handlers[:]:
+        root.removeHandler(existing)
+    root.addHandler(log_queue_handler)
+    root.setLevel(level)
+    _listener = QueueListener(log_queue_handler.queue, output)
+    _listener.start()
+    atexit.register(_listener.stop)
+    return _listener
+
+
+class RequestIDMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        incoming = next(
+            (
+                value.decode("latin-1")
+                for name, value in scope["headers"]
+                if name == REQUEST_ID_HEADER
+            ),
+            "",
+        )
+        current = (
+            incoming
+            if VALID_REQUEST_ID.fullmatch(incoming)
+            else uuid.uuid4().hex
+        )
+
+        async def send_with_id(message):
+            if message["type"] == "http.response.start":
+                message["headers"] = list(message.get("headers", [])) + [
+                    (REQUEST_ID_HEADER, current.encode())
+                ]
+            await send(message)
+
+        token = request_id.set(current)
+        try:
+            await self.app(scope, receive, send_with_id)
+        finally:
+            request_id.reset(token)
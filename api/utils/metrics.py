@@ -0,0 +1,250 @@
+"""
+In-process metrics in the Prometheus text format
+
+A small registry of counters and histograms, plus collectors read at
+scrape time for numbers other modules already keep (pool, cache and
+password hashing stats). routers/metrics.py serves it as /metrics.
+Every worker keeps its own, so scrape each worker or sum across them,
+the usual setup for multi-process Prometheus targets.
+
+Recorded here:
+- http_request_duration_seconds and http_responses_total, per route
+  template (never the raw path, which would explode the label set) by
+  MetricsMiddleware
+- rate_limit_rejections_total, by the app's RateLimitExceeded handler
+- db_pool_checkout_seconds, by queries/pool.py, time spent waiting for
+  a connection
+- db_repository_call_seconds, per repository method, by
+  traced_repository in queries/tracing.py
+
+Comparing the last two tells pool starvation apart from slow queries.
+"""
+
+import bisect
+import math
+import time
+from collections import defaultdict
+from typing import Callable, Dict, Iterable, List, Sequence, Tuple
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+# (metric name, type, help, [(name suffix, labels, value), ...])
+Sample = Tuple[str, Dict[str, str], float]
+Family = Tuple[str, str, str, List[Sample]]
+
+
+def _escape(value: str) -> str:
+    return (
+        str(value)
+        .replace("\\", "\\\\")
+        .replace("\n", "\\n")
+        .replace('"', '\\"')
+    )
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _format_labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ""
+    pairs = ",".join(
+        f'{key}="{_escape(value)}"' for key, value in labels.items()
+    )
+    return "{" + pairs + "}"
+
+
+def single(
+    name: str, kind: str, help: str, value: float, **labels: str
+) -> Family:
+    """
+    A family with one sample, for collectors
+    """
+    return name, kind, help, [("", labels, value)]
+
+
+class Counter:
+    type = "counter"
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self._values: Dict[Tuple[str, ...], float] = defaultdict(float)
+
+    def inc(self, *label_values: str, amount: float = 1):
+        self._values[label_values] += amount
+
+    def value(self, *label_values: str) -> float:
+        return self._values.get(label_values, 0)
+
+    def collect(self) -> Iterable[Family]:
+        yield self.name, self.type, self.help, [
+            ("", dict(zip(self.labels, key)), value)
+            for key, value in self._values.items()
+        ]
+
+
+class Histogram:
+    type = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        labels: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.buckets = tuple(sorted(buckets))
+        # labels -> [count per bucket (last is +Inf), sum]
+        self._series: Dict[Tuple[str, ...], list] = {}
+
+    def observe(self, value: float, *label_values: str):
+        series = self._series.get(label_values)
+        if series is None:
+            series = [[0] * (len(self.buckets) + 1), 0.0]
+            self._series[label_values] = series
+        series[0][bisect.bisect_left(self.buckets, value)] += 1
+        series[1] += value
+
+    def count(self, *label_values: str) -> int:
+        series = self._series.get(label_values)
+        return sum(series[0]) if series else 0
+
+    def collect(self) -> Iterable[Family]:
+        samples = []
+        for key, (counts, total) in self._series.items():
+            labels = dict(zip(self.labels, key))
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), counts):
+                cumulative += count
+                samples.append(
+                    (
+                        "_bucket",
+                        {**labels, "le": _format_value(bound)},
+                        cumulative,
+                    )
+                )
+            samples.append(("_sum", labels, total))
+            samples.append(("_count", labels, cumulative))
+        yield self.name, self.type, self.help, samples
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: list = []
+        self._collectors: List[Callable[[], Iterable[Family]]] = []
+
+    def counter(self, *args, **kwargs) -> Counter:
+        metric = Counter(*args, **kwargs)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, *args, **kwargs) -> Histogram:
+        metric = Histogram(*args, **kwargs)
+        self._metrics.append(metric)
+        return metric
+
+    def collector(self, collect: Callable[[], Iterable[Family]]):
+        """
+        Registers a function called on every scrape, for gauges read
+        from stats other modules keep. Usable as a decorator
+        """
+        self._collectors.append(collect)
+        return collect
+
+    def render(self) -> str:
+        lines = []
+        families = [family for m in self._metrics for family in m.collect()]
+        for collect in self._collectors:
+            families.extend(collect())
+        for name, kind, help, samples in families:
+            lines.append(f"# HELP {name} {help}")
+            lines.append(f"# TYPE {name} {kind}")
+            for suffix, labels, value in samples:
+                lines.append(
+                    f"{name}{suffix}{_format_labels(labels)} "
+                    f"{_format_value(value)}"
+                )
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+request_duration = registry.histogram(
+    "http_request_duration_seconds",
+    "Time from request to the end of the response body",
+    ["method", "route"],
+)
+responses = registry.counter(
+    "http_responses_total", "Responses sent", ["method", "route", "status"]
+)
+rate_limit_rejections = registry.counter(
+    "rate_limit_rejections_total",
+    "Requests turned away by the rate limiter",
+    ["method", "route"],
+)
+pool_checkout = registry.histogram(
+    "db_pool_checkout_seconds",
+    "Time spent waiting for a connection from the shared pool",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 5.0, 30.0),
+)
+repository_calls = registry.histogram(
+    "db_repository_call_seconds",
+    "Repository method latency, including waiting for a connection",
+    ["method"],
+)
+
+
+def route_label(scope) -> str:
+    """
+    The matched route's path template, or "unmatched" for 404s and
+    requests answered before routing (CORS preflights)
+    """
+    route = scope.get("route")
+    if route is not None and hasattr(route, "path"):
+        return route.path
+    endpoint = scope.get("endpoint")
+    if endpoint is None:
+        return "unmatched"
+    # Older Starlette only records the endpoint
+    for candidate in scope["app"].routes:
+        if getattr(candidate, "endpoint", None) is endpoint:
+            return candidate.path
+    return "unmatched"
+
+
+class MetricsMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = "500"
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = str(message["status"])
+            await send(message)
+
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            route = route_label(scope)
+            request_duration.observe(
+                time.perf_counter() - start, scope["method"], route
+            )
+            responses.inc(scope["method"], route, status)
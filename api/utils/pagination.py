@@ -0,0 +1,69 @@
+"""
+Keyset pagination helpers
+
+List endpoints take `limit` and an opaque `after` cursor and return the
+cursor for the following page in the X-Next-Cursor header (plus a
+rel="next" Link). The cursor encodes the sort key of the last row on the
+page, so every page is a single index range scan no matter how deep it is.
+"""
+
+import base64
+import json
+from typing import Callable, List, Optional, Sequence, Tuple, TypeVar
+
+from fastapi import HTTPException, Request, Response, status
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 500
+
+T = TypeVar("T")
+
+
+def encode_cursor(*values) -> str:
+    raw = json.dumps(values, separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, *converters: Callable) -> tuple:
+    """
+    Decodes a cursor built by encode_cursor, passing each value through
+    the matching converter (e.g. int, date.fromisoformat)
+
+    Raises a 400 for anything that isn't a cursor we handed out
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded))
+        if len(values) != len(converters):
+            raise ValueError("Cursor has the wrong number of values")
+        return tuple(
+            convert(value) for convert, value in zip(converters, values)
+        )
+    except (ValueError, TypeError):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid pagination cursor",
+        )
+
+
+def paginate(
+    rows: Sequence[T], limit: int, sort_key: Callable[[T], tuple]
+) -> Tuple[List[T], Optional[str]]:
+    """
+    Splits a `LIMIT limit + 1` fetch into the page and the next cursor
+
+    The extra row only tells us another page exists, it's never returned
+    """
+    if len(rows) > limit:
+        page = list(rows[:limit])
+        return page, encode_cursor(*sort_key(page[-1]))
+    return list(rows), None
+
+
+def set_next_page_headers(
+    request: Request, response: Response, next_cursor: Optional[str]
+):
+    if next_cursor:
+        next_url = request.url.include_query_params(after=next_cursor)
+        response.headers["X-Next-Cursor"] = next_cursor
+        response.headers["Link"] = f'<{next_url}>; rel="next"'
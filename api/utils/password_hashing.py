@@ -0,0 +1,96 @@
+"""
+Bounded executor for bcrypt
+
+bcrypt burns hundreds of milliseconds of CPU per call. Run inline in an
+async route it stalls the event loop, and with it every other request on
+the worker. Hashing and verification are pushed onto a small dedicated
+thread pool instead (bcrypt releases the GIL while it works), and once
+PASSWORD_HASH_MAX_PENDING calls are queued or running new ones are
+turned away with a 503 so a login storm can't pile up unbounded work.
+"""
+
+import asyncio
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Optional, TypeVar
+
+from fastapi import HTTPException, status
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+PASSWORD_HASH_WORKERS = int(
+    os.environ.get("PASSWORD_HASH_WORKERS", min(4, os.cpu_count() or 1))
+)
+PASSWORD_HASH_MAX_PENDING = int(
+    os.environ.get("PASSWORD_HASH_MAX_PENDING", PASSWORD_HASH_WORKERS * 8)
+)
+PASSWORD_HASH_RETRY_AFTER = int(os.environ.get("PASSWORD_HASH_RETRY_AFTER", 1))
+
+
+class PasswordHashingPool:
+    """
+    Runs password hashing calls on a fixed-size thread pool with a cap on
+    how many may be waiting or running at once
+
+    The counters are only touched from the event loop thread, so they
+    don't need a lock. The executor is started on first use, and again
+    after a shutdown, so a lifespan that runs more than once in the same
+    process (e.g. TestClient, or Mangum with its lifespan on) doesn't
+    leave hashing broken.
+    """
+
+    def __init__(self, workers: int, max_pending: int):
+        self.workers = workers
+        self.max_pending = max_pending
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self.pending = 0
+        self.completed = 0
+        self.rejected = 0
+
+    async def run(self, func: Callable[..., T], *args) -> T:
+        if self.pending >= self.max_pending:
+            self.rejected += 1
+            logger.warning(
+                "Password hashing pool saturated (%s pending), rejecting",
+                self.pending,
+            )
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Too many authentication requests, try again shortly",
+                headers={"Retry-After": str(PASSWORD_HASH_RETRY_AFTER)},
+            )
+        self.pending += 1
+        try:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.workers,
+                    thread_name_prefix="password-hash",
+                )
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._executor, func, *args)
+        finally:
+            self.pending -= 1
+            self.completed += 1
+
+    def stats(self) -> dict:
+        return {
+            "workers": self.workers,
+            "max_pending": self.max_pending,
+            "pending": self.pending,
+            "queued": max(0, self.pending - self.workers),
+            "completed": self.completed,
+            "rejected": self.rejected,
+        }
+
+    def shutdown(self):
+        executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+
+password_hashing_pool = PasswordHashingPool(
+    PASSWORD_HASH_WORKERS, PASSWORD_HASH_MAX_PENDING
+)
@@ -0,0 +1,21 @@
+"""
+Account plans
+
+Every account is on a plan (accounts.plan, carried in the JWT like the
+timezone). Rate limits in routers/ are written for the free plan, other
+plans get PLAN_QUOTA_MULTIPLIERS times as much, see
+utils/rate_limiting.py.
+"""
+
+DEFAULT_PLAN = "free"
+
+PLAN_QUOTA_MULTIPLIERS = {
+    "free": 1,
+    "plus": 3,
+    # Fleet accounts manage many vehicles and import/export in bulk
+    "fleet": 10,
+}
+
+
+def quota_multiplier(plan: str) -> int:
+    return PLAN_QUOTA_MULTIPLIERS.get(plan, 1)
@@ -0,0 +1,248 @@
+"""
+Rate limit counters shared by every worker, kept in Postgres
+
+slowapi keeps its counters in the worker by default, so with N uvicorn
+workers or Lambda containers a "5/minute" limit really allows 5 x N,
+and a restart forgets them. Setting RATE_LIMIT_STORAGE_URI=database://
+swaps in DatabaseStorage, which counts in the rate_limit_counters table
+(V14__create_rate_limit_counters_table.sql) through the shared pool.
+
+slowapi checks limits synchronously inside the request, so a database
+round trip per hit is out of the question. Instead each worker:
+
+- answers every check from memory: the total it last read from
+  Postgres plus the hits it has admitted since
+- every RATE_LIMIT_SYNC_SECONDS adds those hits to Postgres in one
+  atomic upsert for all dirty keys, reads back the new totals (which
+  include the other workers' hits) and refreshes the keys it's still
+  tracking that had no new hits
+
+The windows themselves live in Postgres, the first worker to hit a key
+starts it. A limit can be overshot by at most what each worker admits
+within one sync interval, in exchange for no database write on the
+request path.
+
+Other RATE_LIMIT_STORAGE_URI values go straight to the limits library:
+memory:// (the default, and what tests use) or redis://host:port, which
+needs the redis package.
+"""
+
+import asyncio
+import logging
+import os
+import time
+from typing import Dict, List, Optional, Set
+
+from limits.storage import Storage
+from psycopg import Error as DatabaseError
+
+from queries.rate_limits import CounterRow, RateLimitCounterRepo
+
+logger = logging.getLogger(__name__)
+
+RATE_LIMIT_SYNC_SECONDS = float(os.environ.get("RATE_LIMIT_SYNC_SECONDS", 1))
+RATE_LIMIT_PURGE_SECONDS = float(
+    os.environ.get("RATE_LIMIT_PURGE_SECONDS", 300)
+)
+
+
+class _Counter:
+    __slots__ = ("known", "pending", "in_flight", "expires_at", "expiry")
+
+    def __init__(self, expires_at: float, expiry: float):
+        # Total in Postgres as of the last sync
+        self.known = 0
+        # Hits admitted here and not yet sent
+        self.pending = 0
+        # Hits being sent by the running sync
+        self.in_flight = 0
+        self.expires_at = expires_at
+        self.expiry = expiry
+
+    @property
+    def total(self) -> int:
+        return self.known + self.in_flight + self.pending
+
+
+class DatabaseStorage(Storage):
+    STORAGE_SCHEME = ["database"]
+
+    def __init__(
+        self,
+        uri: Optional[str] = None,
+        wrap_exceptions: bool = False,
+        repo: Optional[RateLimitCounterRepo] = None,
+        **options,
+    ):
+        super().__init__(uri, wrap_exceptions, **options)
+        self.repo = repo or RateLimitCounterRepo()
+        self._counters: Dict[str, _Counter] = {}
+        self._cleared: Set[str] = set()
+        self._reset_requested = False
+        self.syncs = 0
+        self.sync_errors = 0
+        self._periodic = False
+        self._sync_task: Optional[asyncio.Task] = None
+        self._synced_at = time.monotonic()
+        self._purged_at = time.monotonic()
+
+    @property
+    def base_exceptions(self):
+        return DatabaseError
+
+    def _live(self, key: str) -> Optional[_Counter]:
+        counter = self._counters.get(key)
+        if counter is not None and counter.expires_at <= time.time():
+            del self._counters[key]
+            return None
+        return counter
+
+    def incr(
+        self,
+        key: str,
+        expiry: int,
+        amount: int = 1,
+        elastic_expiry: bool = False,
+    ) -> int:
+        counter = self._live(key)
+        if counter is None:
+            counter = _Counter(time.time() + expiry, expiry)
+            self._counters[key] = counter
+        counter.pending += amount
+        self._sync_if_due()
+        return counter.total
+
+    def get(self, key: str) -> int:
+        counter = self._live(key)
+        return counter.total if counter is not None else 0
+
+    def get_expiry(self, key: str) -> float:
+        counter = self._live(key)
+        return counter.expires_at if counter is not None else time.time()
+
+    def check(self) -> bool:
+        # Checks never touch the database, sync failures are logged and
+        # counted in sync_errors instead
+        return True
+
+    def reset(self) -> Optional[int]:
+        cleared = len(self._counters)
+        self._counters.clear()
+        self._reset_requested = True
+        return cleared
+
+    def clear(self, key: str):
+        self._counters.pop(key, None)
+        self._cleared.add(key)
+
+    def _apply(self, counter: _Counter, row: Optional[CounterRow]):
+        if row is None:
+            # The window ended in Postgres or another worker cleared it
+            counter.known = 0
+        else:
+            _, counter.known, counter.expires_at = row
+
+    async def _send(self, keys: List[str]):
+        sending = [(key, self._counters[key]) for key in keys]
+        for _, counter in sending:
+            counter.in_flight, counter.pending = counter.pending, 0
+        try:
+            rows = await self.repo.add_hits(
+                keys,
+                [counter.in_flight for _, counter in sending],
+                [counter.expiry for _, counter in sending],
+            )
+        except Exception:
+            for _, counter in sending:
+                counter.pending += counter.in_flight
+                counter.in_flight = 0
+            raise
+        totals = {row[0]: row for row in rows}
+        for key, counter in sending:
+            counter.in_flight = 0
+            self._apply(counter, totals.get(key))
+
+    async def sync(self):
+        """
+        Sends the hits admitted since the last sync and refreshes the
+        totals of every key this worker is tracking
+        """
+        now = time.time()
+        for key in [
+            key
+            for key, counter in self._counters.items()
+            if counter.expires_at <= now
+        ]:
+            del self._counters[key]
+
+        if self._reset_requested:
+            self._reset_requested = False
+            self._cleared.clear()
+            await self.repo.delete_all()
+        if self._cleared:
+            cleared, self._cleared = sorted(self._cleared), set()
+            try:
+                await self.repo.delete(cleared)
+            except Exception:
+                self._cleared.update(cleared)
+                raise
+
+        dirty: List[str] = []
+        clean: List[str] = []
+        for key in sorted(self._counters):
+            counter = self._counters[key]
+            (dirty if counter.pending else clean).append(key)
+        if not dirty and not clean:
+            return
+
+        if dirty:
+            await self._send(dirty)
+        if clean:
+            totals = {row[0]: row for row in await self.repo.get_counts(clean)}
+            for key in clean:
+                counter = self._counters.get(key)
+                if counter is not None and not counter.in_flight:
+                    self._apply(counter, totals.get(key))
+        self.syncs += 1
+
+    def _sync_if_due(self):
+        # Without a lifespan (Lambda) nothing runs sync_periodically, so
+        # the hits themselves start a sync once one is due
+        if self._periodic or (
+            self._sync_task is not None and not self._sync_task.done()
+        ):
+            return
+        if time.monotonic() - self._synced_at < RATE_LIMIT_SYNC_SECONDS:
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return
+        self._synced_at = time.monotonic()
+        self._sync_task = loop.create_task(self._sync_and_purge())
+
+    async def _sync_and_purge(self):
+        try:
+            await self.sync()
+            if (
+                self.syncs
+                and time.monotonic() - self._purged_at
+                >= RATE_LIMIT_PURGE_SECONDS
+            ):
+                self._purged_at = time.monotonic()
+                await self.repo.purge_expired()
+        except Exception as e:
+            self.sync_errors += 1
+            logger.error(f"Syncing rate limit counters failed: {e}")
+
+    async def sync_periodically(self):
+        """
+        Background task started by the app lifespan
+        """
+        self._periodic = True
+        try:
+            while True:
+                await asyncio.sleep(RATE_LIMIT_SYNC_SECONDS)
+                await self._sync_and_purge()
+        finally:
+            self._periodic = False
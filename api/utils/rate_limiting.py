@@ -0,0 +1,140 @@
+"""
+Shared slowapi limiter
+
+Lives outside main.py so routers can import it without importing the
+app module back while it's still being set up.
+
+Requests are limited per account when they carry a valid JWT and per
+client address otherwise (get_rate_limit_key), so users behind one
+carrier NAT don't share a quota. The limits written in routers/ are the
+free plan's, TieredRateLimiter scales them by the account's plan (see
+utils/plans.py).
+
+RATE_LIMIT_STORAGE_URI picks where the counters live: memory:// (the
+default, per worker), database:// for the app's Postgres, or any other
+limits storage URI such as redis://. See utils/rate_limit_storage.py.
+
+RATE_LIMIT_STRATEGY picks how they're counted. It defaults to
+token-bucket (utils/token_bucket.py) with memory:// and to slowapi's
+fixed-window otherwise, since token buckets are kept per worker.
+"""
+
+import os
+
+from fastapi import Request
+from limits import RateLimitItem
+from limits.strategies import RateLimiter
+from limits.util import WindowStats
+from slowapi import Limiter
+from slowapi.util import get_remote_address
+
+from utils.plans import DEFAULT_PLAN, quota_multiplier
+from utils.token_bucket import TokenBucketRateLimiter
+
+RATE_LIMIT_STORAGE_URI = os.environ.get("RATE_LIMIT_STORAGE_URI", "memory://")
+RATE_LIMIT_STRATEGY = os.environ.get(
+    "RATE_LIMIT_STRATEGY",
+    (
+        "token-bucket"
+        if RATE_LIMIT_STORAGE_URI.startswith("memory://")
+        else "fixed-window"
+    ),
+)
+
+if RATE_LIMIT_STORAGE_URI.startswith("database://"):
+    # Registers the database:// scheme with limits
+    import utils.rate_limit_storage  # noqa: F401
+
+
+def get_rate_limit_key(request: Request) -> str:
+    """
+    "user:<id>:<plan>" for a request with a valid JWT, otherwise the
+    client address
+
+    A revoked token falls back to the address, so it doesn't keep its
+    plan's quota. The check is the revocation store's in-memory one,
+    the auth dependency has already confirmed a revoked jti by the time
+    slowapi asks for the key
+    """
+    # Imported here so importing the limiter doesn't pull in the
+    # database layer (see LAZY_INIT)
+    from utils.authentication import extract_jwt_token, verify_jwt
+    from utils.revocation import revocation_store
+
+    token = extract_jwt_token(
+        request.cookies.get("fast_api_token"),
+        request.headers.get("authorization"),
+    )
+    payload = verify_jwt(token) if token else None
+    if payload is None or (
+        payload.jti and revocation_store.is_known_revoked(payload.jti)
+    ):
+        return get_remote_address(request)
+    return f"user:{payload.user.id}:{payload.user.plan}"
+
+
+def plan_for_key(key: str) -> str:
+    if key.startswith("user:"):
+        return key.rsplit(":", 1)[1]
+    return DEFAULT_PLAN
+
+
+class TieredRateLimiter(RateLimiter):
+    """
+    Scales every limit by the plan in the key before handing it to the
+    actual strategy
+    """
+
+    def __init__(self, strategy: RateLimiter):
+        super().__init__(strategy.storage)
+        self.strategy = strategy
+
+    def _scaled(self, item: RateLimitItem, identifiers) -> RateLimitItem:
+        multiplier = quota_multiplier(plan_for_key(identifiers[0]))
+        if multiplier == 1:
+            return item
+        return type(item)(
+            item.amount * multiplier, item.multiples, item.namespace
+        )
+
+    def hit(self, item: RateLimitItem, *identifiers: str, cost: int = 1):
+        return self.strategy.hit(
+            self._scaled(item, identifiers), *identifiers, cost=cost
+        )
+
+    def test(self, item: RateLimitItem, *identifiers: str, cost: int = 1):
+        return self.strategy.test(
+            self._scaled(item, identifiers), *identifiers, cost=cost
+        )
+
+    def get_window_stats(
+        self, item: RateLimitItem, *identifiers: str
+    ) -> WindowStats:
+        return self.strategy.get_window_stats(
+            self._scaled(item, identifiers), *identifiers
+        )
+
+    def clear(self, item: RateLimitItem, *identifiers: str):
+        return self.strategy.clear(
+            self._scaled(item, identifiers), *identifiers
+        )
+
+
+limiter = Limiter(
+    key_func=get_rate_limit_key,
+    storage_uri=RATE_LIMIT_STORAGE_URI,
+    strategy=(
+        "fixed-window"
+        if RATE_LIMIT_STRATEGY == "token-bucket"
+        else RATE_LIMIT_STRATEGY
+    ),
+)
+# slowapi only takes a URI, this is the storage it built from it
+rate_limit_storage = limiter._storage
+# slowapi only picks from the limits strategies by name, so ours is
+# swapped in after the fact
+limiter._limiter = TieredRateLimiter(
+    TokenBucketRateLimiter(rate_limit_storage)
+    if RATE_LIMIT_STRATEGY == "token-bucket"
+    else limiter._limiter
+)
@@ -0,0 +1,234 @@
+"""
+Read-through cache for repository reads
+
+ReadThroughCache.get_or_load returns a cached value or runs the loader
+and caches what it returns for READ_CACHE_TTL seconds. Entries are
+grouped by namespace (e.g. a user id) and repositories call invalidate()
+on the namespace after a write commits.
+
+Invalidation bumps a per-namespace generation that is part of every
+key, so old entries are never deleted one by one, nothing reads them
+again and they age out. That's what makes it work unchanged on a shared
+backend.
+
+Backends:
+- MemoryBackend (default): an in-process LRU of READ_CACHE_SIZE entries
+  per worker. Values are kept as the objects themselves.
+- RedisBackend: used when READ_CACHE_URL is set (needs the redis
+  package). Shared by every worker, values are serialized with the
+  cache's dumps/loads. Any client with async get/set/incr/expire
+  works, so tests can hand it a stand-in.
+- NullBackend: the default on Lambda without READ_CACHE_URL. No
+  invalidation listener runs there (see main.py), so a private cache
+  would keep serving what other containers have since changed. Every
+  read goes to the loader.
+
+A failing backend never fails the request, the read falls through to
+the loader and the error is counted.
+
+MemoryBackend entries on other workers are evicted by the
+LISTEN/NOTIFY listener in queries/invalidation.py.
+"""
+
+import logging
+import os
+import time
+from typing import Any, Awaitable, Callable, Optional, TypeVar
+
+from config import ON_LAMBDA
+from utils.cache import LRUCache
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+READ_CACHE_URL = os.environ.get("READ_CACHE_URL")
+# Writes on other workers evict through queries/invalidation.py, the TTL
+# is only a backstop
+READ_CACHE_TTL = float(os.environ.get("READ_CACHE_TTL", 300))
+READ_CACHE_SIZE = int(os.environ.get("READ_CACHE_SIZE", 10_000))
+
+
+class MemoryBackend:
+    stores_objects = True
+    shared = False
+
+    def __init__(self, maxsize: int = READ_CACHE_SIZE):
+        self._entries = LRUCache(maxsize)
+        # Bounded like the entries. Generations are drawn from one
+        # counter, and namespaces without one read the floor: the
+        # highest generation the LRU has pushed out. So a namespace that
+        # loses its generation never reads entries older than it
+        self._generations = LRUCache(maxsize, on_evict=self._raise_floor)
+        self._counter = 0
+        self._floor = 0
+
+    def _raise_floor(self, namespace: str, generation: int):
+        self._floor = max(self._floor, generation)
+
+    async def generation(self, namespace: str) -> int:
+        return self._generations.get(namespace, self._floor)
+
+    async def bump_generation(self, namespace: str, ttl: float):
+        self._counter += 1
+        # Outlives every entry written under an older generation, so
+        # letting it lapse back to the floor can't resurrect anything
+        self._generations.set(namespace, self._counter, time.time() + ttl * 2)
+
+    async def get(self, key: str) -> Any:
+        return self._entries.get(key)
+
+    async def set(self, key: str, value: Any, ttl: float):
+        self._entries.set(key, value, time.time() + ttl)
+
+    async def clear(self):
+        self._entries.clear()
+
+
+class RedisBackend:
+    stores_objects = False
+    shared = True
+
+    def __init__(self, client, prefix: str = "drivestats"):
+        self.client = client
+        self.prefix = prefix
+
+    @classmethod
+    def from_url(cls, url: str) -> "RedisBackend":
+        import redis.asyncio
+
+        return cls(redis.asyncio.Redis.from_url(url))
+
+    def _generation_key(self, namespace: str) -> str:
+        return f"{self.prefix}:gen:{namespace}"
+
+    async def generation(self, namespace: str) -> int:
+        value = await self.client.get(self._generation_key(namespace))
+        return int(value) if value is not None else 0
+
+    async def bump_generation(self, namespace: str, ttl: float):
+        key = self._generation_key(namespace)
+        await self.client.incr(key)
+        # Outlives every entry written under an older generation, so
+        # letting it lapse back to 0 can't resurrect anything
+        await self.client.expire(key, int(ttl * 2) + 1)
+
+    async def get(self, key: str) -> Optional[bytes]:
+        return await self.client.get(f"{self.prefix}:{key}")
+
+    async def clear(self):
+        # Shared by every worker and invalidated by the writer, there's
+        # nothing local to drop
+        pass
+
+    async def set(self, key: str, value: bytes, ttl: float):
+        await self.client.set(f"{self.prefix}:{key}", value, ex=int(ttl) or 1)
+
+
+class NullBackend:
+    stores_objects = True
+    # Nothing is kept, so there's nothing for other workers to evict
+    shared = True
+
+    async def generation(self, namespace: str) -> int:
+        return 0
+
+    async def bump_generation(self, namespace: str, ttl: float):
+        pass
+
+    async def get(self, key: str) -> Any:
+        return None
+
+    async def set(self, key: str, value: Any, ttl: float):
+        pass
+
+    async def clear(self):
+        pass
+
+
+def default_backend():
+    if READ_CACHE_URL:
+        return RedisBackend.from_url(READ_CACHE_URL)
+    if ON_LAMBDA:
+        return NullBackend()
+    return MemoryBackend()
+
+
+class ReadThroughCache:
+    def __init__(
+        self,
+        name: str,
+        backend=None,
+        ttl: float = READ_CACHE_TTL,
+        dumps: Optional[Callable[[Any], bytes]] = None,
+        loads: Optional[Callable[[bytes], Any]] = None,
+    ):
+        self.name = name
+        self.backend = backend or default_backend()
+        self.ttl = ttl
+        self.dumps = dumps
+        self.loads = loads
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self.errors = 0
+
+    async def get_or_load(
+        self, namespace: str, key: str, loader: Callable[[], Awaitable[T]]
+    ) -> T:
+        full_namespace = f"{self.name}:{namespace}"
+        try:
+            generation = await self.backend.generation(full_namespace)
+            cache_key = f"{full_namespace}:{generation}:{key}"
+            cached = await self.backend.get(cache_key)
+        except Exception as e:
+            self.errors += 1
+            logger.warning(f"{self.name} cache read failed: {e}")
+            return await loader()
+        if cached is not None:
+            self.hits += 1
+            return (
+                cached if self.backend.stores_objects else self.loads(cached)
+            )
+
+        self.misses += 1
+        value = await loader()
+        try:
+            await self.backend.set(
+                cache_key,
+                value if self.backend.stores_objects else self.dumps(value),
+                self.ttl,
+            )
+        except Exception as e:
+            self.errors += 1
+            logger.warning(f"{self.name} cache write failed: {e}")
+        return value
+
+    async def invalidate(self, namespace: str):
+        """
+        Drops every entry in the namespace, call it after the write has
+        committed
+        """
+        self.invalidations += 1
+        try:
+            await self.backend.bump_generation(
+                f"{self.name}:{namespace}", self.ttl
+            )
+        except Exception as e:
+            self.errors += 1
+            logger.warning(f"{self.name} cache invalidation failed: {e}")
+
+    async def clear(self):
+        """
+        Drops every entry this worker can see
+        """
+        self.invalidations += 1
+        await self.backend.clear()
+
+    def stats(self) -> dict:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "invalidations": self.invalidations,
+            "errors": self.errors,
+        }
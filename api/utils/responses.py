@@ -0,0 +1,58 @@
+"""
+orjson-backed JSON responses
+
+FastJSONResponse is the app's default_response_class, so every route's
+payload is rendered by orjson instead of json.dumps. FastAPI still runs
+response_model validation and jsonable_encoder before render() for
+routes that return plain values. List routes whose rows come straight
+from a repository (already typed by model_row) return a FastJSONResponse
+themselves, which skips both steps and hands the models to orjson as-is.
+"""
+
+from decimal import Decimal
+from functools import lru_cache
+from typing import Any, Type
+
+import orjson
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+
+
+@lru_cache(maxsize=None)
+def _is_plain_model(cls: Type[BaseModel]) -> bool:
+    """
+    True when a model dumps to exactly its __dict__: no aliases, no
+    computed fields, no custom serializers and no extra fields
+    """
+    decorators = cls.__pydantic_decorators__
+    return not (
+        cls.model_computed_fields
+        or decorators.field_serializers
+        or decorators.model_serializers
+        or cls.model_config.get("extra") == "allow"
+        or any(
+            field.alias or field.serialization_alias
+            for field in cls.model_fields.values()
+        )
+    )
+
+
+def _default(obj: Any) -> Any:
+    if isinstance(obj, BaseModel):
+        # Nested models come back through here, orjson handles the
+        # date/datetime/UUID values natively
+        if _is_plain_model(type(obj)):
+            return obj.__dict__
+        return obj.model_dump(by_alias=True)
+    if isinstance(obj, Decimal):
+        return float(obj)
+    raise TypeError(f"Type is not JSON serializable: {type(obj).__name__}")
+
+
+def dumps(content: Any) -> bytes:
+    return orjson.dumps(content, default=_default)
+
+
+class FastJSONResponse(JSONResponse):
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
@@ -0,0 +1,154 @@
+"""
+JWT revocation store
+
+Revoked tokens are recorded by jti in the revoked_tokens table, so a
+logout holds across uvicorn workers, Lambda containers and restarts. Each
+worker fronts the table with:
+
+- a bloom filter of every unexpired revoked jti. Almost every request
+  carries a token that was never revoked, and the filter answers that
+  in memory without a round trip. It's topped up with newly revoked jtis
+  every REVOCATION_REFRESH_SECONDS and rebuilt from scratch whenever
+  expired rows are purged.
+- an LRU of jtis confirmed revoked, so a client retrying with a revoked
+  token doesn't hit Postgres on every request either.
+
+Only filter hits (revoked tokens and the ~1% false positives) go to the
+database. A token revoked on another worker is honoured here from the
+next refresh, so logout propagates within REVOCATION_REFRESH_SECONDS.
+"""
+
+import asyncio
+import logging
+import os
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+
+from queries.revoked_tokens import RevokedTokenRepo
+from utils.cache import BloomFilter, LRUCache
+
+logger = logging.getLogger(__name__)
+
+REVOCATION_REFRESH_SECONDS = float(
+    os.environ.get("REVOCATION_REFRESH_SECONDS", 5)
+)
+REVOCATION_PURGE_SECONDS = float(
+    os.environ.get("REVOCATION_PURGE_SECONDS", 3600)
+)
+REVOCATION_CACHE_SIZE = int(os.environ.get("REVOCATION_CACHE_SIZE", 10_000))
+BLOOM_MIN_CAPACITY = 1024
+BLOOM_ERROR_RATE = 0.01
+# Overlap between incremental refreshes, so a revocation whose
+# transaction started just before the last refresh isn't skipped
+REFRESH_OVERLAP = timedelta(seconds=5)
+
+
+class RevocationStore:
+    def __init__(self, repo: RevokedTokenRepo):
+        self.repo = repo
+        self._revoked = LRUCache(REVOCATION_CACHE_SIZE)
+        self._bloom: Optional[BloomFilter] = None
+        self._bloom_capacity = 0
+        self._bloom_count = 0
+        self._synced_at: Optional[datetime] = None
+        self._refreshed_at = 0.0
+        self._refresh_lock = asyncio.Lock()
+
+    async def revoke(self, jti: str, exp: int) -> bool:
+        """
+        Revokes a token until its exp, returns False if it already was
+        """
+        expires_at = datetime.fromtimestamp(exp, timezone.utc)
+        revoked = await self.repo.revoke(jti, expires_at)
+        self._remember(jti, expires_at)
+        return revoked
+
+    async def is_revoked(self, jti: str) -> bool:
+        await self._maybe_refresh()
+        if self._bloom is not None and jti not in self._bloom:
+            return False
+        if jti in self._revoked:
+            return True
+        try:
+            expires_at = await self.repo.is_revoked(jti)
+        except Exception as e:
+            # Fail closed, the filter says this token may be revoked
+            logger.error(f"Revocation lookup failed for {jti}: {e}")
+            return True
+        if expires_at is not None:
+            self._remember(jti, expires_at)
+        return expires_at is not None
+
+    def is_known_revoked(self, jti: str) -> bool:
+        """
+        Memory-only check for synchronous callers such as the rate limit
+        key: True for jtis revoked on this worker or confirmed revoked
+        by is_revoked, which the auth dependency runs first
+        """
+        return jti in self._revoked
+
+    async def purge_expired(self):
+        """
+        Deletes expired rows and rebuilds the filter without them
+        """
+        purged = await self.repo.purge_expired()
+        logger.info(f"Purged {purged} expired revoked tokens")
+        async with self._refresh_lock:
+            await self._rebuild()
+
+    async def purge_periodically(self):
+        """
+        Background task started by the app lifespan
+        """
+        while True:
+            await asyncio.sleep(REVOCATION_PURGE_SECONDS)
+            try:
+                await self.purge_expired()
+            except Exception as e:
+                logger.error(f"Purging revoked tokens failed: {e}")
+
+    def _remember(self, jti: str, expires_at: datetime):
+        self._revoked.set(jti, True, expires_at.timestamp())
+        if self._bloom is not None:
+            self._bloom.add(jti)
+            self._bloom_count += 1
+
+    async def _maybe_refresh(self):
+        loop = asyncio.get_running_loop()
+        if loop.time() - self._refreshed_at < REVOCATION_REFRESH_SECONDS:
+            return
+        async with self._refresh_lock:
+            if loop.time() - self._refreshed_at < REVOCATION_REFRESH_SECONDS:
+                return
+            try:
+                if self._bloom is None or (
+                    self._bloom_count > self._bloom_capacity
+                ):
+                    await self._rebuild()
+                else:
+                    jtis, synced_at = await self.repo.get_revoked_since(
+                        self._synced_at - REFRESH_OVERLAP
+                    )
+                    for jti in jtis:
+                        self._bloom.add(jti)
+                    self._bloom_count += len(jtis)
+                    self._synced_at = synced_at
+            except Exception as e:
+                # Keep answering from the last good filter, or from
+                # Postgres on every request if there never was one
+                logger.error(f"Refreshing revoked tokens failed: {e}")
+            self._refreshed_at = loop.time()
+
+    async def _rebuild(self):
+        jtis, synced_at = await self.repo.get_revoked_since(None)
+        capacity = max(BLOOM_MIN_CAPACITY, len(jtis) * 2)
+        bloom = BloomFilter(capacity, BLOOM_ERROR_RATE)
+        for jti in jtis:
+            bloom.add(jti)
+        self._bloom = bloom
+        self._bloom_capacity = capacity
+        self._bloom_count = len(jtis)
+        self._synced_at = synced_at
+
+
+revocation_store = RevocationStore(RevokedTokenRepo())
@@ -0,0 +1,55 @@
+"""
+Local-date conversion for created/updated timestamps
+
+The database stores naive UTC timestamps. Repositories return them as
+dates in the requesting user's timezone, which try_get_jwt_user_data
+records for the request from the token. Unauthenticated routes fall
+back to DEFAULT_TIMEZONE.
+
+The conversion happens in SQL (see local_date_column), so rows arrive
+as dates and Python never touches a timezone per row.
+"""
+
+from contextvars import ContextVar
+from functools import lru_cache
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+DEFAULT_TIMEZONE = "America/Los_Angeles"
+
+request_timezone: ContextVar[str] = ContextVar(
+    "request_timezone", default=DEFAULT_TIMEZONE
+)
+
+
+@lru_cache(maxsize=None)
+def get_zone(name: str) -> ZoneInfo:
+    return ZoneInfo(name)
+
+
+def is_valid_timezone(name: str) -> bool:
+    try:
+        get_zone(name)
+        return True
+    except (ZoneInfoNotFoundError, ValueError):
+        return False
+
+
+def set_request_timezone(name: str):
+    """
+    Sets the timezone used for the rest of the current request
+    """
+    request_timezone.set(name if is_valid_timezone(name) else DEFAULT_TIMEZONE)
+
+
+def current_timezone() -> str:
+    return request_timezone.get()
+
+
+def local_date_column(column: str, alias: str = None) -> str:
+    """
+    SELECT-list expression turning a naive UTC timestamp column into a
+    local date. It takes one %s parameter, the timezone name, which
+    callers pass as current_timezone().
+    """
+    alias = alias or column
+    return f"({column} AT TIME ZONE 'UTC' AT TIME ZONE %s)::date AS {alias}"
@@ -0,0 +1,81 @@
+"""
+Token-bucket strategy for slowapi limits
+
+A limit like "5/minute" becomes a bucket holding up to 5 tokens that
+refills at 5 per minute, so a client can burst to the full amount and
+then gets a steady rate, instead of the fixed window's burst at every
+window boundary.
+
+Buckets are refilled lazily: each one is just its token count and the
+time it was last touched, topped up from the elapsed time when it's
+next hit. Nothing runs per bucket in the background, and every
+operation is O(1) whatever the number of active clients. They live in
+an OrderedDict kept in least-recently-used order, capped at
+RATE_LIMIT_MAX_BUCKETS. The bucket evicted when it's full is the one
+idle the longest, which has almost always refilled completely anyway.
+
+Buckets are per worker, like slowapi's default memory:// counters.
+"""
+
+import os
+import time
+from collections import OrderedDict
+from typing import List
+
+from limits import RateLimitItem
+from limits.storage import Storage
+from limits.strategies import RateLimiter
+from limits.util import WindowStats
+
+RATE_LIMIT_MAX_BUCKETS = int(os.environ.get("RATE_LIMIT_MAX_BUCKETS", 100_000))
+
+
+class TokenBucketRateLimiter(RateLimiter):
+    def __init__(
+        self, storage: Storage, max_buckets: int = RATE_LIMIT_MAX_BUCKETS
+    ):
+        # limits wants a storage, the buckets themselves never use it
+        super().__init__(storage)
+        self.max_buckets = max_buckets
+        # key -> [tokens, last refill time]
+        self._buckets: "OrderedDict[str, List[float]]" = OrderedDict()
+
+    def _bucket(self, item: RateLimitItem, identifiers) -> List[float]:
+        key = item.key_for(*identifiers)
+        now = time.monotonic()
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = [float(item.amount), now]
+            self._buckets[key] = bucket
+            if len(self._buckets) > self.max_buckets:
+                self._buckets.popitem(last=False)
+            return bucket
+        rate = item.amount / item.get_expiry()
+        bucket[0] = min(item.amount, bucket[0] + (now - bucket[1]) * rate)
+        bucket[1] = now
+        self._buckets.move_to_end(key)
+        return bucket
+
+    def hit(self, item: RateLimitItem, *identifiers: str, cost: int = 1):
+        bucket = self._bucket(item, identifiers)
+        if bucket[0] < cost:
+            return False
+        bucket[0] -= cost
+        return True
+
+    def test(self, item: RateLimitItem, *identifiers: str, cost: int = 1):
+        return self._bucket(item, identifiers)[0] >= cost
+
+    def get_window_stats(
+        self, item: RateLimitItem, *identifiers: str
+    ) -> WindowStats:
+        tokens = self._bucket(item, identifiers)[0]
+        # Reset is when the bucket will be full again, as a unix time
+        refill = (item.amount - tokens) * item.get_expiry() / item.amount
+        return WindowStats(time.time() + refill, int(tokens))
+
+    def clear(self, item: RateLimitItem, *identifiers: str):
+        self._buckets.pop(item.key_for(*identifiers), None)
+
+    def __len__(self) -> int:
+        return len(self._buckets)
@@ -1,6 +1,7 @@
 import React, { useState, useEffect, useContext } from 'react'
 import { useParams, useNavigate } from 'react-router-dom'
 import axios from 'axios'
+import { getAllPages } from '@/lib/pagination'
 import { UserContext } from '../../UserContext'
 import {
     Table,
@@ -46,7 +47,7 @@ const MaintenanceLogPage = () => {
             }
 
             // If the user owns the vehicle, fetch the maintenance logs
-            const response = await axios.get(
+            const logs = await getAllPages(
                 `${API_HOST}/api/vehicle-maintenance/maintenance-logs/${id}`,
                 {
                     headers: {
@@ -54,7 +55,7 @@ const MaintenanceLogPage = () => {
                     },
                 }
             )
-            setVehicleLogs(response.data)
+            setVehicleLogs(logs)
         } catch (error) {
             console.error(
                 'There was an error fetching the maintenance logs:',
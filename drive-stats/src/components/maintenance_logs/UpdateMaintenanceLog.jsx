@@ -1,6 +1,7 @@
 import React, { useContext, useState, useEffect } from 'react'
 import { useParams, useNavigate } from 'react-router-dom'
 import axios from 'axios'
+import { getAllPages } from '@/lib/pagination'
 import { UserContext } from '../../UserContext'
 import { useToast } from '@/components/ui/use-toast'
 import { Input } from '@/components/ui/input'
@@ -334,13 +335,13 @@ export default function UpdateMaintenanceLog() {
 
     const fetchVehicles = async (userId, token) => {
         try {
-            const response = await axios.get(
+            const userVehicles = await getAllPages(
                 `${API_HOST}/vehicles/user/${userId}`,
                 {
                     headers: { Authorization: `Bearer ${token}` },
                 }
             )
-            setVehicles(response.data)
+            setVehicles(userVehicles)
         } catch (error) {
             console.error('There was an error fetching the vehicles!', error)
         }
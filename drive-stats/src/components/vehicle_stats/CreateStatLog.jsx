@@ -1,6 +1,7 @@
 import React, { useContext, useState, useEffect } from 'react'
 import { UserContext } from '../../UserContext'
 import axios from 'axios'
+import { getAllPages } from '@/lib/pagination'
 import { useToast } from '@/components/ui/use-toast'
 import { Input } from '@/components/ui/input'
 import { Button } from '@/components/ui/button'
@@ -283,13 +284,13 @@ export default function VehicleStat() {
 
     const fetchVehicles = async (userId, token) => {
         try {
-            const response = await axios.get(
+            const userVehicles = await getAllPages(
                 `${API_HOST}/vehicles/user/${userId}`,
                 {
                     headers: { Authorization: `Bearer ${token}` },
                 }
             )
-            setVehicles(response.data)
+            setVehicles(userVehicles)
         } catch (error) {
             console.error('There was an error fetching the vehicles!', error)
         }
@@ -2,6 +2,7 @@ import { useContext, useState, useEffect } from 'react'
 import { UserContext } from '../../UserContext'
 import { Link } from 'react-router-dom'
 import axios from 'axios'
+import { getAllPages } from '@/lib/pagination'
 import {
     Table,
     TableBody,
@@ -43,7 +44,7 @@ export default function Garage() {
     const fetchVehicles = async (userId) => {
         const token = sessionStorage.getItem('token')
         try {
-            const response = await axios.get(
+            const userVehicles = await getAllPages(
                 `${API_HOST}/vehicles/user/${userId}`,
                 {
                     headers: {
@@ -53,10 +54,10 @@ export default function Garage() {
             )
 
             // Check if response data is an array before setting state
-            if (Array.isArray(response.data)) {
-                setVehicles(response.data)
+            if (Array.isArray(userVehicles)) {
+                setVehicles(userVehicles)
             } else {
-                console.warn('Unexpected response format:', response.data)
+                console.warn('Unexpected response format:', userVehicles)
                 setVehicles([])
             }
         } catch (error) {
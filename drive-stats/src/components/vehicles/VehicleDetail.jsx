@@ -1,6 +1,7 @@
 import React, { useState, useEffect, useContext } from 'react'
 import { useParams, useNavigate } from 'react-router-dom'
 import axios from 'axios'
+import { getAllPages } from '@/lib/pagination'
 import { UserContext } from '../../UserContext'
 import { Button } from '@/components/ui/button'
 import {
@@ -159,7 +160,7 @@ export default function VehicleDetail() {
 
     const fetchVehicleStats = async (id, token) => {
         try {
-            const response = await axios.get(
+            const allStats = await getAllPages(
                 `${API_HOST}/vehicle_stats/all/${id}`,
                 {
                     headers: {
@@ -168,7 +169,7 @@ export default function VehicleDetail() {
                 }
             )
 
-            const stats = response.data
+            const stats = allStats
                 .map((stat) => {
                     return Object.keys(stat).reduce((acc, key) => {
                         if (
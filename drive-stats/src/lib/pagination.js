@@ -0,0 +1,21 @@
+import axios from 'axios'
+
+// List endpoints return one page at a time (100 rows unless `limit` is
+// given) and put the cursor for the next page in X-Next-Cursor. This
+// follows it until the last page and returns every row.
+export async function getAllPages(url, config = {}) {
+    const rows = []
+    let after = null
+    do {
+        const response = await axios.get(url, {
+            ...config,
+            params: { ...config.params, ...(after && { after }) },
+        })
+        if (!Array.isArray(response.data)) {
+            return response.data
+        }
+        rows.push(...response.data)
+        after = response.headers['x-next-cursor']
+    } while (after)
+    return rows
+}